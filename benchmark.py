@@ -0,0 +1,334 @@
+"""
+ベンチマークスクリプト
+
+ローカルのスタブサーバー(fake_servers.py)を相手に、実際のGoogleCalendarClient → EventStorage →
+DiscordNotifierの処理を繰り返し実行し、スループット・処理時間のパーセンタイル・最大メモリ使用量を表示します。
+認証情報やネットワークは不要です。
+
+1回目は全イベントが新規のため全件を通知し、2回目以降はスタブ側でイベントを--changes件ずつ
+追加・変更・キャンセルしてから実行します(集計は2回目以降が対象)。
+
+使い方:
+    python benchmark.py --calendars 10 --events 500 --rounds 5
+    python benchmark.py --incremental --storage sqlite --calendar-latency-ms 50 --json > result.json
+    python benchmark.py --recurring 20 --days 180 --expand-recurrence
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import unicodedata
+from datetime import datetime
+from typing import Any, Dict, List
+import pytz
+from google.auth.credentials import AnonymousCredentials
+from google_calendar import GoogleCalendarClient
+from discord_notifier import DiscordNotifier
+from event_storage import EventStorage
+from sqlite_storage import SqliteEventStorage
+from fake_servers import FakeServers
+
+# 集計する処理の段階
+STAGES = ('fetch', 'diff', 'notify', 'save', 'total')
+STAGE_LABELS = {'fetch': '取得', 'diff': '差分', 'notify': '通知', 'save': '保存', 'total': '合計'}
+
+class BenchmarkCalendarClient(GoogleCalendarClient):
+    """スタブサーバー用のクライアント(認証を省略し、カレンダーごとの取得時間を記録する)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fetch_seconds = []
+
+    def _authenticate(self):
+        return AnonymousCredentials()
+
+    def _record_fetch(self, calendar_id: str, count: int, elapsed: float) -> None:
+        super()._record_fetch(calendar_id, count, elapsed)
+        self.fetch_seconds.append(elapsed)
+
+class BenchmarkNotifier(DiscordNotifier):
+    """メッセージ1件ごとの送信時間を記録する通知クラス"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.send_seconds = []
+
+    async def _send_payload(self, payload, channel_id, webhook_url) -> None:
+        started = time.perf_counter()
+        await super()._send_payload(payload, channel_id, webhook_url)
+        self.send_seconds.append(time.perf_counter() - started)
+
+def percentile(values: List[float], p: float) -> float:
+    """
+    パーセンタイルを求める(線形補間)
+
+    Args:
+        values: 値のリスト
+        p: パーセント(0〜100)
+
+    Returns:
+        パーセンタイル値(値がない場合は0)
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100
+    lower = math.floor(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """p50・p95・p99・最大値をまとめる"""
+    return {
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': max(values) if values else 0.0,
+    }
+
+def get_max_rss_mb() -> float:
+    """プロセスの最大常駐メモリ(MB、取得できない環境では0)"""
+    try:
+        import resource
+    except ImportError:
+        # Windowsにはresourceモジュールがない
+        return 0.0
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOSはバイト、Linuxはキロバイト単位
+    return max_rss / (1024 * 1024) if sys.platform == 'darwin' else max_rss / 1024
+
+async def run_round(client: BenchmarkCalendarClient, storage, notifier: BenchmarkNotifier,
+                    calendar_ids: List[str], days: int, timezone: str) -> Dict[str, Any]:
+    """
+    取得 → 差分検出 → 通知 → 保存を1回実行(main.check_calendar_changesと同じ流れ)
+
+    Returns:
+        段階ごとの処理時間(秒)と件数
+    """
+    timings = {}
+    started = time.perf_counter()
+
+    events = await client.aget_upcoming_events_from_multiple_calendars(days=days, calendar_ids=calendar_ids)
+    fetched_calendar_ids = [cid for cid in calendar_ids if cid not in client.failed_calendar_ids]
+    timings['fetch'] = time.perf_counter() - started
+
+    checkpoint = time.perf_counter()
+    diff = storage.diff_events(events, calendar_ids=fetched_calendar_ids, now=datetime.now(pytz.timezone(timezone)))
+    timings['diff'] = time.perf_counter() - checkpoint
+
+    checkpoint = time.perf_counter()
+    await notifier.send_changes(diff)
+    timings['notify'] = time.perf_counter() - checkpoint
+
+    checkpoint = time.perf_counter()
+    storage.save_events(events, calendar_ids=fetched_calendar_ids)
+    timings['save'] = time.perf_counter() - checkpoint
+
+    timings['total'] = time.perf_counter() - started
+    return {
+        'seconds': timings,
+        'events': len(events),
+        'changes': len(diff.added) + len(diff.updated) + len(diff.removed),
+        'failed_calendars': len(client.failed_calendar_ids),
+    }
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """スタブサーバーを起動してベンチマークを実行"""
+    with tempfile.TemporaryDirectory() as work_dir, FakeServers(
+        calendars=args.calendars, events=args.events, days=args.days, timezone=args.timezone,
+        calendar_latency=args.calendar_latency_ms / 1000, calendar_error_rate=args.calendar_error_rate,
+        discord_latency=args.discord_latency_ms / 1000,
+        discord_rate_limit=args.discord_rate_limit, seed=args.seed, recurring=args.recurring
+    ) as servers:
+        client = BenchmarkCalendarClient(
+            credentials_path=os.path.join(work_dir, 'credentials.json'),
+            token_path=os.path.join(work_dir, 'token.json'),
+            timezone=args.timezone,
+            sync_state_path=os.path.join(work_dir, 'sync_state') if args.incremental else None,
+            page_size=args.page_size,
+            fetch_concurrency=args.concurrency,
+            use_batch=args.batch,
+            api_endpoint=servers.calendar_endpoint,
+            qps=args.qps,
+            burst=args.burst,
+            max_retries=args.max_retries,
+            expand_recurrence=args.expand_recurrence
+        )
+        if args.storage == 'sqlite':
+            storage = SqliteEventStorage(os.path.join(work_dir, 'events.db'))
+        else:
+            storage = EventStorage(os.path.join(work_dir, 'previous_events.json'), storage_format=args.format)
+        notifier = BenchmarkNotifier(
+            bot_token='benchmark',
+            channel_id=1,
+            delivery_mode=args.delivery,
+            webhook_url=servers.discord_api_base + '/webhooks/1/benchmark',
+            use_embeds=args.embeds,
+            api_base=servers.discord_api_base
+        )
+
+        rounds = []
+        tracemalloc.start()
+        try:
+            for index in range(args.rounds):
+                if index > 0:
+                    servers.mutate(args.changes)
+                before = servers.stats()
+                fetch_count, send_count = len(client.fetch_seconds), len(notifier.send_seconds)
+                if hasattr(tracemalloc, 'reset_peak'):
+                    tracemalloc.reset_peak()
+
+                # 各モジュールのログはベンチマークの結果と混ざらないよう、--verbose以外では出力しない
+                with contextlib.ExitStack() as stack:
+                    if not args.verbose:
+                        devnull = stack.enter_context(open(os.devnull, 'w', encoding='utf-8'))
+                        stack.enter_context(contextlib.redirect_stdout(devnull))
+                    result = await run_round(client, storage, notifier, servers.calendar_ids, args.days, args.timezone)
+
+                after = servers.stats()
+                result['peak_memory_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+                result['api_requests'] = after['calendar_requests'] - before['calendar_requests']
+                result['api_errors'] = after['calendar_errors'] - before['calendar_errors']
+                result['api_kb'] = (after['calendar_bytes'] - before['calendar_bytes']) / 1024
+                result['messages'] = after['discord_messages'] - before['discord_messages']
+                result['rate_limited'] = after['discord_rate_limited'] - before['discord_rate_limited']
+                result['fetch_seconds'] = client.fetch_seconds[fetch_count:]
+                result['send_seconds'] = notifier.send_seconds[send_count:]
+                rounds.append(result)
+        finally:
+            tracemalloc.stop()
+            await notifier.close()
+            client.close()
+            if args.storage == 'sqlite':
+                storage.close()
+
+    # 1回目は全件の新規取得・通知になるため、2回目以降を集計する(1回のみの場合はそれを集計)
+    measured = rounds[1:] or rounds
+    total_seconds = sum(r['seconds']['total'] for r in measured)
+    return {
+        'options': vars(args),
+        'rounds': [
+            {key: value for key, value in r.items() if key not in ('fetch_seconds', 'send_seconds')}
+            for r in rounds
+        ],
+        'summary': {
+            'measured_rounds': len(measured),
+            'stages': {stage: summarize([r['seconds'][stage] for r in measured]) for stage in STAGES},
+            'calendar_fetch': summarize([s for r in measured for s in r['fetch_seconds']]),
+            'discord_send': summarize([s for r in measured for s in r['send_seconds']]),
+            'events_per_second': sum(r['events'] for r in measured) / total_seconds if total_seconds else 0.0,
+            'api_requests_per_second': sum(r['api_requests'] for r in measured) / total_seconds if total_seconds else 0.0,
+            'api_kb_per_round': sum(r['api_kb'] for r in measured) / len(measured),
+            'peak_memory_mb': max(r['peak_memory_mb'] for r in rounds),
+            'max_rss_mb': get_max_rss_mb(),
+        },
+    }
+
+def pad(text: str, width: int, left: bool = False) -> str:
+    """全角文字を2桁として幅を揃える"""
+    length = sum(2 if unicodedata.east_asian_width(c) in ('F', 'W') else 1 for c in text)
+    spaces = ' ' * max(width - length, 0)
+    return text + spaces if left else spaces + text
+
+def print_report(report: Dict[str, Any]) -> None:
+    """結果を表形式で表示"""
+    options = report['options']
+    summary = report['summary']
+
+    print("=" * 60)
+    print("ベンチマーク結果")
+    print("=" * 60)
+    print(f"カレンダー: {options['calendars']}個 × {options['events']}件"
+          + (f"+繰り返し予定{options['recurring']}件" if options['recurring'] else '')
+          + f" / 取得範囲: {options['days']}日間")
+    print(f"差分同期: {'有効' if options['incremental'] else '無効'} / 同時取得数: {options['concurrency']} / "
+          f"ストレージ: {options['storage']} / 送信方式: {options['delivery']}"
+          + (" / バッチリクエスト" if options['batch'] else '')
+          + (" / 繰り返し予定: ローカルで展開" if options['expand_recurrence'] else ''))
+    print(f"遅延: Calendar {options['calendar_latency_ms']:g}ms・Discord {options['discord_latency_ms']:g}ms / "
+          f"1回あたりの変更: {options['changes']}件")
+    print()
+
+    columns = [STAGE_LABELS[stage] + '(ms)' for stage in STAGES] + ['イベント', '変更', 'API', '送信', 'メモリ(MB)']
+    print(pad('回', 4) + ''.join(pad(column, 11) for column in columns))
+    for i, r in enumerate(report['rounds'], 1):
+        values = [f"{r['seconds'][stage] * 1000:.1f}" for stage in STAGES] + [
+            str(r['events']), str(r['changes']), str(r['api_requests']), str(r['messages']),
+            f"{r['peak_memory_mb']:.1f}",
+        ]
+        print(pad(str(i), 4) + ''.join(pad(value, 11) for value in values))
+    print()
+
+    print(f"集計 ({summary['measured_rounds']}回分、単位: ms)")
+    print(pad('', 16) + ''.join(pad(key, 10) for key in ('p50', 'p95', 'p99', 'max')))
+    rows = [(STAGE_LABELS[stage], summary['stages'][stage]) for stage in STAGES]
+    rows.append(('カレンダー取得', summary['calendar_fetch']))
+    rows.append(('Discord送信', summary['discord_send']))
+    for label, values in rows:
+        print(pad(label, 16, left=True)
+              + ''.join(pad(f"{values[key] * 1000:.1f}", 10) for key in ('p50', 'p95', 'p99', 'max')))
+    print()
+
+    print(f"スループット: {summary['events_per_second']:.0f}イベント/秒・{summary['api_requests_per_second']:.1f}リクエスト/秒")
+    print(f"Calendar APIの応答サイズ: {summary['api_kb_per_round']:.1f}KB/回")
+    print(f"最大メモリ使用量: {summary['peak_memory_mb']:.1f}MB (Pythonの割り当て)"
+          + (f"・{summary['max_rss_mb']:.1f}MB (プロセス全体)" if summary['max_rss_mb'] else ''))
+    if any(r['api_errors'] for r in report['rounds']):
+        print(f"Calendar APIのレート制限: {sum(r['api_errors'] for r in report['rounds'])}回")
+    if any(r['rate_limited'] for r in report['rounds']):
+        print(f"Discordのレート制限: {sum(r['rate_limited'] for r in report['rounds'])}回")
+    if any(r['failed_calendars'] for r in report['rounds']):
+        print("警告: 取得に失敗したカレンダーがあります(--verboseで詳細を確認してください)")
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='スタブサーバーを使ったオフラインのベンチマーク')
+    parser.add_argument('--calendars', type=int, default=10, help='カレンダー数')
+    parser.add_argument('--events', type=int, default=500, help='カレンダーあたりのイベント数')
+    parser.add_argument('--rounds', type=int, default=5, help='実行回数(1回目は集計対象外)')
+    parser.add_argument('--changes', type=int, default=20, help='2回目以降に各回で変更するイベント数')
+    parser.add_argument('--days', type=int, default=30, help='取得する日数')
+    parser.add_argument('--timezone', default='Asia/Tokyo', help='タイムゾーン')
+    parser.add_argument('--page-size', type=int, default=250, help='1ページあたりの取得件数')
+    parser.add_argument('--concurrency', type=int, default=4, help='カレンダーの同時取得数')
+    parser.add_argument('--qps', type=float, default=0, help='Calendar APIの1秒あたりのリクエスト数の上限(0の場合は制限なし)')
+    parser.add_argument('--burst', type=float, default=None, help='Calendar APIに連続して送信できるリクエスト数')
+    parser.add_argument('--max-retries', type=int, default=5, help='Calendar APIのエラー時に再試行する回数')
+    parser.add_argument('--recurring', type=int, default=0, help='カレンダーあたりの繰り返し予定(毎日)の数')
+    parser.add_argument('--expand-recurrence', action='store_true',
+                        help='繰り返し予定をローカルで展開する(python-dateutilが必要)')
+    parser.add_argument('--incremental', action='store_true', help='差分同期(syncToken)を使う')
+    parser.add_argument('--batch', action='store_true',
+                        help='複数カレンダーの取得をバッチリクエストにまとめる(--incremental指定時は使用されない)')
+    parser.add_argument('--storage', choices=('file', 'sqlite'), default='file', help='保存先')
+    parser.add_argument('--format', choices=('json', 'orjson', 'msgpack'), default='json',
+                        help='保存形式(--storage fileの場合)')
+    parser.add_argument('--delivery', choices=('rest', 'webhook'), default='rest', help='Discordの送信方式')
+    parser.add_argument('--embeds', action='store_true', help='Embedで送信する')
+    parser.add_argument('--calendar-latency-ms', type=float, default=0, help='Calendar APIの1リクエストごとの遅延')
+    parser.add_argument('--calendar-error-rate', type=float, default=0,
+                        help='Calendar APIがレート制限のエラー(429・403)を返す割合(0〜1)')
+    parser.add_argument('--discord-latency-ms', type=float, default=0, help='Discordの1メッセージごとの遅延')
+    parser.add_argument('--discord-rate-limit', type=int, default=0,
+                        help='Discordが1秒あたりに受け付けるメッセージ数(0の場合は制限なし)')
+    parser.add_argument('--seed', type=int, default=0, help='イベント生成の乱数シード')
+    parser.add_argument('--json', action='store_true', help='結果をJSONで出力する')
+    parser.add_argument('--verbose', action='store_true', help='各モジュールのログも表示する')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    report = asyncio.run(run_benchmark(args))
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,8 @@
 import os
 from dotenv import load_dotenv
+import pytz
+from scheduler import parse_time
+from routing import CHANGE_TYPES, load_routes
 
 load_dotenv()
 
@@ -9,6 +12,11 @@ class Config:
     # Discord設定
     DISCORD_BOT_TOKEN = os.getenv('DISCORD_BOT_TOKEN')
     DISCORD_CHANNEL_ID = os.getenv('DISCORD_CHANNEL_ID')
+    # 送信方式 (client: discord.pyクライアント / rest: REST APIに直接送信 / webhook: Webhookで送信)
+    DISCORD_DELIVERY_MODE = os.getenv('DISCORD_DELIVERY_MODE', 'client').lower()
+    DISCORD_WEBHOOK_URL = os.getenv('DISCORD_WEBHOOK_URL')
+    # Embedで送信する(1メッセージに最大約6000文字まで載せられる)
+    DISCORD_USE_EMBEDS = os.getenv('DISCORD_USE_EMBEDS', 'false').lower() == 'true'
 
     # Google Calendar設定
     GOOGLE_CREDENTIALS_PATH = os.getenv('GOOGLE_CREDENTIALS_PATH', 'credentials/credentials.json')
@@ -19,27 +27,183 @@ class Config:
     CALENDAR_IDS = [cid.strip() for cid in _CALENDAR_IDS_RAW.split(',') if cid.strip()]
 
     # スケジュール設定
+    # 通知時刻(カンマ区切りで複数指定可、'07:00@America/New_York'のようにタイムゾーンも指定可)
     NOTIFICATION_TIME = os.getenv('NOTIFICATION_TIME', '07:00')
     TIMEZONE = os.getenv('TIMEZONE', 'Asia/Tokyo')
+    # 予定の変更を確認する間隔(分、0の場合は通知時刻のみ実行)
+    POLL_INTERVAL_MINUTES = float(os.getenv('POLL_INTERVAL_MINUTES', '0'))
+    # 適応ポーリング(カレンダーごとに、変更があれば短く・なければ指数的に長い間隔で確認する)
+    ADAPTIVE_POLLING = os.getenv('ADAPTIVE_POLLING', 'false').lower() == 'true'
+    POLL_MIN_INTERVAL_MINUTES = float(os.getenv('POLL_MIN_INTERVAL_MINUTES', '1'))
+    POLL_MAX_INTERVAL_MINUTES = float(os.getenv('POLL_MAX_INTERVAL_MINUTES', '60'))
+    # 最終実行時刻の保存先(停止中に過ぎた通知を起動時に実行するため)
+    SCHEDULER_STATE_PATH = os.getenv('SCHEDULER_STATE_PATH', 'data/scheduler_state.json')
+    # 停止中に過ぎた通知を起動時に実行する
+    SCHEDULE_CATCH_UP = os.getenv('SCHEDULE_CATCH_UP', 'true').lower() == 'true'
     EVENT_FETCH_DAYS = int(os.getenv('EVENT_FETCH_DAYS', '30'))
+    # 1回のAPIリクエストで取得する件数(events().listのmaxResults、最大2500)
+    EVENT_PAGE_SIZE = int(os.getenv('EVENT_PAGE_SIZE', '250'))
+    # 複数カレンダーを同時に取得する数(1の場合は順番に取得)
+    CALENDAR_FETCH_CONCURRENCY = int(os.getenv('CALENDAR_FETCH_CONCURRENCY', '4'))
+    # 複数カレンダーの取得を1つのバッチリクエストにまとめる(差分同期が無効な場合のみ)
+    CALENDAR_BATCH_REQUESTS = os.getenv('CALENDAR_BATCH_REQUESTS', 'false').lower() == 'true'
+    # Calendar APIの1秒あたりのリクエスト数の上限(プロジェクトのクォータに合わせる、0の場合は制限しない)
+    CALENDAR_API_QPS = float(os.getenv('CALENDAR_API_QPS', '5'))
+    # 一時的に連続して送信できるリクエスト数(0の場合はCALENDAR_API_QPSと同じ)
+    CALENDAR_API_BURST = float(os.getenv('CALENDAR_API_BURST', '10')) or None
+    # レート制限・サーバーエラー時に再試行する回数
+    CALENDAR_API_MAX_RETRIES = int(os.getenv('CALENDAR_API_MAX_RETRIES', '5'))
+    # 繰り返し予定を親イベントと例外のみ取得し、ローカルで各回に展開する(python-dateutilが必要)
+    EXPAND_RECURRENCE_LOCALLY = os.getenv('EXPAND_RECURRENCE_LOCALLY', 'false').lower() == 'true'
+
+    # 差分同期設定(syncTokenで前回からの変更分のみを取得)
+    INCREMENTAL_SYNC = os.getenv('INCREMENTAL_SYNC', 'false').lower() == 'true'
+    SYNC_STATE_PATH = os.getenv('SYNC_STATE_PATH', 'data/sync_state')
+
+    # プッシュ通知設定(カレンダーの変更をGoogleから通知してもらい、数秒以内に確認する)
+    PUSH_NOTIFICATIONS = os.getenv('PUSH_NOTIFICATIONS', 'false').lower() == 'true'
+    # Googleから到達できる通知先のHTTPS URL(リバースプロキシ等で下記の待ち受けポートに転送する)
+    PUSH_WEBHOOK_URL = os.getenv('PUSH_WEBHOOK_URL')
+    PUSH_LISTEN_HOST = os.getenv('PUSH_LISTEN_HOST', '0.0.0.0')
+    PUSH_LISTEN_PORT = int(os.getenv('PUSH_LISTEN_PORT', '8080'))
+    # 通知の検証用トークン(任意の文字列、一致しない通知は拒否する)
+    PUSH_CHANNEL_TOKEN = os.getenv('PUSH_CHANNEL_TOKEN')
+    # 続けて届いた通知をまとめる待機時間(秒)
+    PUSH_DEBOUNCE_SECONDS = float(os.getenv('PUSH_DEBOUNCE_SECONDS', '5'))
+    # チャンネルの有効期間(秒、0の場合はAPIの既定値)。期限の1時間前に自動で更新する
+    PUSH_CHANNEL_TTL_SECONDS = int(os.getenv('PUSH_CHANNEL_TTL_SECONDS', '0')) or None
+
+    # 通知する変更の種類(カンマ区切り、added: 追加 / updated: 変更 / removed: 削除)
+    NOTIFY_CHANGE_TYPES = [
+        t.strip() for t in os.getenv('NOTIFY_CHANGE_TYPES', 'added,updated,removed').split(',') if t.strip()
+    ]
+
+    # ルーティング設定(JSONファイルでカレンダーごとの通知先チャンネルを指定する)
+    # 指定した場合はCALENDAR_IDS・DISCORD_CHANNEL_IDの代わりにファイル内の設定を使う
+    ROUTES_PATH = os.getenv('ROUTES_PATH')
+    ROUTES = []
+
+    # メトリクス設定
+    # /metricsでPrometheus形式のメトリクスを公開するポート(0の場合は公開しない)
+    METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+    METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+    # 取得・送信・保存などの結果を1行のJSONでも出力する(ログ収集用)
+    METRICS_JSON_LOGS = os.getenv('METRICS_JSON_LOGS', 'false').lower() == 'true'
 
     # ストレージ設定
+    # 保存先 (file: STORAGE_PATHのファイル / sqlite: SQLITE_STORAGE_PATHのSQLiteデータベース)
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'file').lower()
+    SQLITE_STORAGE_PATH = os.getenv('SQLITE_STORAGE_PATH', 'data/events.db')
     STORAGE_PATH = os.getenv('STORAGE_PATH', 'data/previous_events.json')
+    # 保存形式 (json / orjson / msgpack ※orjson・msgpackは別途インストールが必要)
+    STORAGE_FORMAT = os.getenv('STORAGE_FORMAT', 'json').lower()
+
+    @classmethod
+    def get_notification_times(cls) -> dict:
+        """
+        通知時刻をタイムゾーンごとにまとめる
+
+        Returns:
+            {タイムゾーン: [HH:MM, ...], ...}
+        """
+        schedules = {}
+        for entry in cls.NOTIFICATION_TIME.split(','):
+            entry = entry.strip()
+            if not entry:
+                continue
+            target_time, _, timezone = entry.partition('@')
+            schedules.setdefault(timezone.strip() or cls.TIMEZONE, []).append(target_time.strip())
+        return schedules
+
+    @classmethod
+    def _load_routes(cls):
+        """ルーティング設定を読み込み、監視カレンダーを全ルートのカレンダーにする"""
+        cls.ROUTES = load_routes(cls.ROUTES_PATH, default_change_types=cls.NOTIFY_CHANGE_TYPES)
+
+        for route in cls.ROUTES:
+            if cls.DISCORD_DELIVERY_MODE == 'webhook':
+                if not (route.webhook_url or cls.DISCORD_WEBHOOK_URL):
+                    raise ValueError(f"ルート '{route.name}' にwebhook_urlが設定されていません")
+            elif route.channel_id is None:
+                raise ValueError(f"ルート '{route.name}' にchannel_idが設定されていません")
+
+        # 同じカレンダーを複数のルートが参照していても、取得・差分検出は1回だけ行う
+        calendar_ids = []
+        for route in cls.ROUTES:
+            for calendar_id in route.calendar_ids:
+                if calendar_id not in calendar_ids:
+                    calendar_ids.append(calendar_id)
+        cls.CALENDAR_IDS = calendar_ids
 
     @classmethod
     def validate(cls):
         """必須環境変数のバリデーション"""
-        required = {
-            'DISCORD_BOT_TOKEN': cls.DISCORD_BOT_TOKEN,
-            'DISCORD_CHANNEL_ID': cls.DISCORD_CHANNEL_ID,
-        }
+        if cls.DISCORD_DELIVERY_MODE not in ('client', 'rest', 'webhook'):
+            raise ValueError("DISCORD_DELIVERY_MODEは client, rest, webhook のいずれかである必要があります")
+
+        if cls.STORAGE_BACKEND not in ('file', 'sqlite'):
+            raise ValueError("STORAGE_BACKENDは file, sqlite のいずれかである必要があります")
+
+        schedules = cls.get_notification_times()
+        if not schedules:
+            raise ValueError("NOTIFICATION_TIMEを設定してください")
+        for timezone, times in schedules.items():
+            try:
+                pytz.timezone(timezone)
+            except pytz.UnknownTimeZoneError:
+                raise ValueError(f"不明なタイムゾーンです: {timezone}")
+            for target_time in times:
+                try:
+                    parse_time(target_time)
+                except ValueError:
+                    raise ValueError(f"NOTIFICATION_TIMEはHH:MM形式である必要があります: {target_time}")
+
+        if cls.PUSH_NOTIFICATIONS:
+            if not cls.PUSH_WEBHOOK_URL or not cls.PUSH_WEBHOOK_URL.startswith('https://'):
+                raise ValueError("PUSH_NOTIFICATIONSを有効にする場合はPUSH_WEBHOOK_URLにHTTPSのURLを設定してください")
+            if not cls.INCREMENTAL_SYNC:
+                # 変更のあったカレンダー以外は差分同期のキャッシュを使うため
+                raise ValueError("PUSH_NOTIFICATIONSを有効にする場合はINCREMENTAL_SYNC=trueにしてください")
+
+        if cls.CALENDAR_API_QPS < 0 or cls.CALENDAR_API_MAX_RETRIES < 0:
+            raise ValueError("CALENDAR_API_QPSとCALENDAR_API_MAX_RETRIESは0以上である必要があります")
+
+        if cls.POLL_INTERVAL_MINUTES < 0:
+            raise ValueError("POLL_INTERVAL_MINUTESは0以上である必要があります")
+
+        if cls.ADAPTIVE_POLLING:
+            if not 0 < cls.POLL_MIN_INTERVAL_MINUTES <= cls.POLL_MAX_INTERVAL_MINUTES:
+                raise ValueError("POLL_MIN_INTERVAL_MINUTESは0より大きく、POLL_MAX_INTERVAL_MINUTES以下である必要があります")
+            if not cls.INCREMENTAL_SYNC:
+                # 変更のあったカレンダー以外は差分同期のキャッシュを使うため(ないと確認のたびに全カレンダーを取得する)
+                raise ValueError("ADAPTIVE_POLLINGを有効にする場合はINCREMENTAL_SYNC=trueにしてください")
+
+        invalid = [t for t in cls.NOTIFY_CHANGE_TYPES if t not in CHANGE_TYPES]
+        if invalid:
+            raise ValueError(f"NOTIFY_CHANGE_TYPESが不正です(added・updated・removedから指定してください): {', '.join(invalid)}")
+
+        if cls.ROUTES_PATH:
+            cls._load_routes()
+
+        if cls.DISCORD_DELIVERY_MODE == 'webhook':
+            # Webhook送信ではBotトークンとチャンネルIDは不要(ルーティング設定では各ルートのWebhook URLを使う)
+            required = {} if cls.ROUTES else {
+                'DISCORD_WEBHOOK_URL': cls.DISCORD_WEBHOOK_URL,
+            }
+        else:
+            required = {
+                'DISCORD_BOT_TOKEN': cls.DISCORD_BOT_TOKEN,
+            }
+            if not cls.ROUTES:
+                required['DISCORD_CHANNEL_ID'] = cls.DISCORD_CHANNEL_ID
 
         missing = [var for var, value in required.items() if not value]
         if missing:
             raise ValueError(f"必須環境変数が設定されていません: {', '.join(missing)}")
 
         # チャンネルIDを整数に変換して検証
-        try:
-            cls.DISCORD_CHANNEL_ID = int(cls.DISCORD_CHANNEL_ID)
-        except (ValueError, TypeError):
-            raise ValueError("DISCORD_CHANNEL_IDは数値である必要があります")
+        if cls.DISCORD_CHANNEL_ID:
+            try:
+                cls.DISCORD_CHANNEL_ID = int(cls.DISCORD_CHANNEL_ID)
+            except (ValueError, TypeError):
+                raise ValueError("DISCORD_CHANNEL_IDは数値である必要があります")
@@ -1,18 +1,56 @@
+import time
 from datetime import datetime
-from typing import List, Dict, Any
-import discord
+from typing import List, Dict, Any, Optional
+import metrics
+from discord_rest import API_BASE, DiscordRestClient, DiscordRestError
+from event_diff import EventDiff
+from event_model import Event
+
+# 送信方式
+# client: discord.pyのクライアントでRESTログインして送信
+# rest: Botトークンで REST API (channels/{id}/messages) に直接送信
+# webhook: Webhook URLに送信(Botトークン不要)
+DELIVERY_MODES = ('client', 'rest', 'webhook')
+
+# Discordのメッセージサイズ制限
+MESSAGE_MAX_LENGTH = 2000          # メッセージ本文の最大文字数
+EMBED_DESCRIPTION_MAX_LENGTH = 4096  # Embed説明文の最大文字数
+EMBEDS_PER_MESSAGE = 10            # 1メッセージあたりのEmbed数
+EMBED_TOTAL_MAX_LENGTH = 6000      # 1メッセージ内の全Embedの合計文字数
+
+# 変更通知で表示するフィールド名
+FIELD_LABELS = {'title': 'タイトル', 'start': '開始', 'end': '終了'}
 
 class DiscordNotifier:
     """Discord通知機能を提供するクラス"""
 
-    def __init__(self, bot_token: str, channel_id: int):
+    def __init__(self, bot_token: Optional[str], channel_id: Optional[int],
+                 delivery_mode: str = 'client', webhook_url: Optional[str] = None,
+                 use_embeds: bool = False, api_base: str = API_BASE):
         """
         Args:
             bot_token: Discord Botトークン
             channel_id: 通知先チャンネルID
+            delivery_mode: 送信方式('client', 'rest', 'webhook')
+            webhook_url: Webhook URL(delivery_modeが'webhook'の場合)
+            use_embeds: Embedで送信するか(1メッセージに多くの予定を載せられる)
+            api_base: REST APIのベースURL(restの場合、ローカルのスタブサーバーで検証する場合に指定)
         """
+        if delivery_mode not in DELIVERY_MODES:
+            raise ValueError(f"不明な送信方式です: {delivery_mode}")
+
         self.bot_token = bot_token
         self.channel_id = channel_id
+        self.delivery_mode = delivery_mode
+        self.webhook_url = webhook_url
+        self.use_embeds = use_embeds
+        # プロセス全体で使い回すクライアントと送信先チャンネル {チャンネルID: チャンネル}
+        self._client = None
+        self._channels = {}
+        # REST・Webhook送信用(ゲートウェイ・discord.pyのログインを使わない)
+        self._rest = None
+        if delivery_mode != 'client':
+            self._rest = DiscordRestClient(bot_token=bot_token, webhook_url=webhook_url, api_base=api_base)
 
     def _format_datetime(self, dt_str: str) -> str:
         """
@@ -37,6 +75,54 @@ class DiscordNotifier:
             print(f"日時のフォーマットエラー: {e}")
             return dt_str
 
+    def _format_start(self, event: Any) -> str:
+        """
+        イベントの開始日時をフォーマット
+
+        Eventは解析済みの日時をそのまま使い、辞書(保存済みのイベント)の場合のみ文字列を解析する。
+
+        Args:
+            event: Eventまたはイベント辞書
+
+        Returns:
+            フォーマットされた日時文字列 (例: 2026/02/05 14:00)
+        """
+        if isinstance(event, Event):
+            if event.all_day:
+                return event.start_dt.strftime('%Y/%m/%d (終日)')
+            return event.start_dt.strftime('%Y/%m/%d %H:%M')
+        return self._format_datetime(event.get('start', ''))
+
+    def _format_event_line(self, event: Any) -> str:
+        """
+        イベント1件を1行にフォーマット
+
+        Args:
+            event: Eventまたはイベント辞書
+
+        Returns:
+            フォーマットされた行 (例: • **定例会議** - 2026/02/10 10:00)
+        """
+        title = event.get('title', '(タイトルなし)')
+        return f"• **{title}** - {self._format_start(event)}"
+
+    def _format_update_line(self, update: Dict[str, Any]) -> str:
+        """
+        変更されたイベント1件を変更内容付きの1行にフォーマット
+
+        Args:
+            update: {'event': 現在, 'previous': 前回, 'changes': {field: (前, 後)}}
+
+        Returns:
+            フォーマットされた行 (例: • **定例会議** - 2026/02/10 11:00 (開始: 2026/02/10 10:00 → 2026/02/10 11:00))
+        """
+        details = []
+        for field, (old, new) in update['changes'].items():
+            if field in ('start', 'end'):
+                old, new = self._format_datetime(old or ''), self._format_datetime(new or '')
+            details.append(f"{FIELD_LABELS.get(field, field)}: {old} → {new}")
+        return f"{self._format_event_line(update['event'])} ({', '.join(details)})"
+
     def _format_events(self, events: List[Dict[str, Any]]) -> str:
         """
         イベントリストをメッセージ形式にフォーマット
@@ -54,13 +140,222 @@ class DiscordNotifier:
         message_parts = ["📅 **新しい予定が追加されました**\n"]
 
         # 各イベントをフォーマット
-        for event in events:
-            title = event.get('title', '(タイトルなし)')
-            start = self._format_datetime(event.get('start', ''))
-            message_parts.append(f"• **{title}** - {start}")
+        message_parts.extend(self._format_event_line(event) for event in events)
 
         return "\n".join(message_parts)
 
+    def _pack_lines(self, lines: List[str], max_length: int) -> List[str]:
+        """
+        行を上限文字数に収まるように改行区切りでまとめる
+
+        1行だけで上限を超える場合はその行を切り詰める(行自体は落とさない)。
+
+        Args:
+            lines: 行のリスト
+            max_length: 1まとまりの最大文字数
+
+        Returns:
+            まとめた文字列のリスト(元の順序を保つ)
+        """
+        chunks = []
+        current = []
+        current_length = 0
+
+        for line in lines:
+            if len(line) > max_length:
+                line = line[:max_length - 1] + '…'
+
+            # 改行1文字分を含めて上限を超える場合は次のまとまりへ
+            added_length = len(line) + (1 if current else 0)
+            if current and current_length + added_length > max_length:
+                chunks.append("\n".join(current))
+                current = []
+                current_length = 0
+                added_length = len(line)
+
+            current.append(line)
+            current_length += added_length
+
+        if current:
+            chunks.append("\n".join(current))
+        return chunks
+
+    def _build_payloads(self, emoji: str, header: str, lines: List[str]) -> List[Dict[str, Any]]:
+        """
+        Discordのサイズ制限内に収まるようにメッセージを分割
+
+        Embedを使う場合は説明文4096文字ごとにEmbedを作り、1メッセージに
+        最大10個(合計6000文字以内)まで詰めて送信回数を減らす。
+
+        Args:
+            emoji: 見出しの絵文字
+            header: 見出し(Markdownの太字記法は除いた文字列)
+            lines: 各予定の行
+
+        Returns:
+            送信するメッセージのリスト [{'content': str} または {'embeds': [dict, ...]}, ...]
+        """
+        if not self.use_embeds:
+            contents = self._pack_lines([f"{emoji} **{header}**\n"] + lines, MESSAGE_MAX_LENGTH)
+            return [{'content': content} for content in contents]
+
+        payloads = []
+        embeds = []
+        total_length = 0
+        for i, description in enumerate(self._pack_lines(lines, EMBED_DESCRIPTION_MAX_LENGTH)):
+            embed = {'description': description}
+            if i == 0:
+                embed['title'] = f"{emoji} {header}"
+            length = len(description) + len(embed.get('title', ''))
+
+            if embeds and (len(embeds) >= EMBEDS_PER_MESSAGE or total_length + length > EMBED_TOTAL_MAX_LENGTH):
+                payloads.append({'embeds': embeds})
+                embeds = []
+                total_length = 0
+
+            embeds.append(embed)
+            total_length += length
+
+        if embeds:
+            payloads.append({'embeds': embeds})
+        return payloads
+
+    async def _get_channel(self, channel_id: int):
+        """
+        送信先チャンネルを取得(初回のみログインとチャンネル取得を行い、以降はキャッシュを使う)
+
+        ゲートウェイには接続せず、REST APIのみでログインする。複数のチャンネルに送る場合も
+        ログインは1回だけ行う。
+
+        Args:
+            channel_id: チャンネルID
+
+        Returns:
+            送信先チャンネル
+        """
+        if self._client is None:
+            # discord.pyは読み込みに時間がかかるため、client方式で初めて送信するときに読み込む
+            import discord
+            intents = discord.Intents.default()
+            # このBotは送信のみで、メッセージ読み取りは不要
+            intents.message_content = False
+            client = discord.Client(intents=intents)
+            try:
+                await client.login(self.bot_token)
+            except Exception:
+                await client.close()
+                raise
+            self._client = client
+
+        if channel_id not in self._channels:
+            self._channels[channel_id] = await self._client.fetch_channel(channel_id)
+
+        return self._channels[channel_id]
+
+    async def close(self) -> None:
+        """クライアントをクローズ(プロセス終了時に呼び出す)"""
+        if self._client is not None and not self._client.is_closed():
+            await self._client.close()
+        self._client = None
+        self._channels.clear()
+        if self._rest is not None:
+            await self._rest.close()
+
+    async def _send_payload(self, payload: Dict[str, Any], channel_id: Optional[int],
+                            webhook_url: Optional[str]) -> None:
+        """
+        設定された送信方式でメッセージを1件送信
+
+        Args:
+            payload: メッセージ {'content': str} または {'embeds': [dict, ...]}
+            channel_id: 送信先チャンネルID
+            webhook_url: 送信先Webhook URL(webhookの場合)
+        """
+        if self.delivery_mode == 'webhook':
+            await self._rest.execute_webhook(payload, webhook_url)
+        elif self.delivery_mode == 'rest':
+            await self._rest.send_message(channel_id, payload)
+        else:
+            import discord
+            channel = await self._get_channel(channel_id)
+            await channel.send(
+                content=payload.get('content'),
+                embeds=[discord.Embed.from_dict(embed) for embed in payload.get('embeds', [])]
+            )
+
+    async def _handle_send_error(self, error: Exception, channel_id: Optional[int]) -> None:
+        """
+        送信エラーを表示し、次回の送信に備えて接続・チャンネルのキャッシュを破棄
+
+        Args:
+            error: 送信時の例外(DiscordRestError以外)
+            channel_id: 送信先チャンネルID
+        """
+        if self.delivery_mode == 'client':
+            # client方式では送信時に読み込み済み
+            import discord
+            if isinstance(error, discord.errors.LoginFailure):
+                print("エラー: Discord Botトークンが無効です")
+                await self.close()
+                return
+            if isinstance(error, discord.errors.NotFound):
+                print(f"エラー: チャンネルID {channel_id} が見つかりません")
+                self._channels.pop(channel_id, None)
+                return
+            if isinstance(error, discord.errors.Forbidden):
+                print("エラー: メッセージ送信の権限がありません")
+                self._channels.pop(channel_id, None)
+                return
+
+        print(f"Discord送信エラー: {error}")
+        # 次回は接続からやり直す
+        await self.close()
+
+    async def _send_payloads(self, payloads: List[Dict[str, Any]], channel_id: Optional[int] = None,
+                             webhook_url: Optional[str] = None) -> int:
+        """
+        分割したメッセージを順番に送信(レート制限は送信側で待機する)
+
+        送信に失敗した場合は、それ以降のメッセージは送信しない。
+
+        Args:
+            payloads: 送信するメッセージのリスト
+            channel_id: 送信先チャンネルID(省略時は初期化時のチャンネル)
+            webhook_url: 送信先Webhook URL(省略時は初期化時のURL)
+
+        Returns:
+            先頭から送信できたメッセージ数
+        """
+        channel_id = channel_id or self.channel_id
+        webhook_url = webhook_url or self.webhook_url
+        sent = 0
+        try:
+            for payload in payloads:
+                started = time.perf_counter()
+                await self._send_payload(payload, channel_id, webhook_url)
+                elapsed = time.perf_counter() - started
+                sent += 1
+                metrics.DISCORD_SEND_SECONDS.observe(elapsed, mode=self.delivery_mode)
+                metrics.DISCORD_MESSAGES.inc(mode=self.delivery_mode, result='sent')
+                metrics.log('discord_send', mode=self.delivery_mode, channel_id=channel_id,
+                            seconds=round(elapsed, 4))
+        except DiscordRestError as e:
+            if e.status == 401:
+                print("エラー: Discord BotトークンまたはWebhook URLが無効です")
+            elif e.status == 404:
+                print(f"エラー: 送信先(チャンネルID {channel_id} またはWebhook)が見つかりません")
+            elif e.status == 403:
+                print("エラー: メッセージ送信の権限がありません")
+            else:
+                print(f"Discord送信エラー: {e}")
+        except Exception as e:
+            await self._handle_send_error(e, channel_id)
+
+        if sent < len(payloads):
+            print(f"警告: {len(payloads)}件中{sent}件のメッセージのみ送信しました")
+            metrics.DISCORD_MESSAGES.inc(len(payloads) - sent, mode=self.delivery_mode, result='failed')
+        return sent
+
     async def send_notification(self, events: List[Dict[str, Any]]) -> None:
         """
         新規イベントをDiscordに通知
@@ -73,39 +368,48 @@ class DiscordNotifier:
             print("新規イベントがないため、通知をスキップします")
             return
 
-        # メッセージをフォーマット
-        message = self._format_events(events)
+        # Discordの文字数制限に収まるようにメッセージを分割
+        lines = [self._format_event_line(event) for event in events]
+        payloads = self._build_payloads("📅", "新しい予定が追加されました", lines)
 
-        # Discordクライアントを作成して送信
-        intents = discord.Intents.default()
-        # このBotは送信のみで、メッセージ読み取りは不要
-        intents.message_content = False
-        client = discord.Client(intents=intents)
+        if await self._send_payloads(payloads) == len(payloads):
+            print(f"{len(events)}件の新規予定を通知しました ({len(payloads)}メッセージ)")
 
-        @client.event
-        async def on_ready():
-            try:
-                channel = await client.fetch_channel(self.channel_id)
-                await channel.send(message)
-                print(f"{len(events)}件の新規予定を通知しました")
-            except discord.errors.NotFound:
-                print(f"エラー: チャンネルID {self.channel_id} が見つかりません")
-            except discord.errors.Forbidden:
-                print("エラー: メッセージ送信の権限がありません")
-            except Exception as e:
-                print(f"Discord送信エラー: {e}")
-            finally:
-                # クライアントを適切にクローズ
-                if not client.is_closed():
-                    await client.close()
+    async def send_changes(self, diff: EventDiff, channel_id: Optional[int] = None,
+                           webhook_url: Optional[str] = None) -> EventDiff:
+        """
+        追加・変更・削除されたイベントを種類ごとにDiscordに通知
 
-        try:
-            await client.start(self.bot_token)
-        except discord.errors.LoginFailure:
-            print("エラー: Discord Botトークンが無効です")
-        except Exception as e:
-            print(f"Discord接続エラー: {e}")
-        finally:
-            # 万が一クローズされていない場合の保険
-            if not client.is_closed():
-                await client.close()
+        Args:
+            diff: 前回からの変更
+            channel_id: 送信先チャンネルID(省略時は初期化時のチャンネル)
+            webhook_url: 送信先Webhook URL(省略時は初期化時のURL)
+
+        Returns:
+            送信できなかった変更(種類ごとに、メッセージを1件でも送信できなかった種類の変更すべて)。
+            すべて送信できた場合(変更がない場合を含む)は空のEventDiff
+        """
+        if diff.is_empty:
+            print("予定の変更がないため、通知をスキップします")
+            return EventDiff()
+
+        sections = [
+            ('added', "📅", "新しい予定が追加されました", [self._format_event_line(event) for event in diff.added]),
+            ('updated', "✏️", "予定が変更されました", [self._format_update_line(update) for update in diff.updated]),
+            ('removed', "🗑️", "予定が削除されました", [self._format_event_line(event) for event in diff.removed]),
+        ]
+        payloads = []
+        # 種類ごとに、その種類の最後のメッセージまでのメッセージ数
+        section_ends = {}
+        for change_type, emoji, header, lines in sections:
+            if lines:
+                payloads.extend(self._build_payloads(emoji, header, lines))
+                section_ends[change_type] = len(payloads)
+
+        sent = await self._send_payloads(payloads, channel_id, webhook_url)
+        if sent < len(payloads):
+            # 途中まで送信した種類も、次回に通知し直すよう未送信として扱う
+            return diff.only(change_type for change_type, end in section_ends.items() if end > sent)
+        print(f"予定の変更を通知しました (追加{len(diff.added)}件・変更{len(diff.updated)}件・"
+              f"削除{len(diff.removed)}件、{len(payloads)}メッセージ)")
+        return EventDiff()
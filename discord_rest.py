@@ -0,0 +1,181 @@
+import asyncio
+import json
+import random
+import time
+from typing import TYPE_CHECKING, Dict, Any, Optional
+import metrics
+
+if TYPE_CHECKING:
+    import aiohttp
+
+# Discord REST APIのベースURL
+API_BASE = 'https://discord.com/api/v10'
+
+# 429(レート制限)・サーバーエラー(5xx)・通信エラー時に再送する最大回数
+MAX_RETRIES = 5
+
+# サーバーエラー・通信エラーの再送の待機時間(秒)。1回ごとに2倍にし、上限を超えない
+BACKOFF_BASE_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 30.0
+
+class DiscordRestError(Exception):
+    """Discord REST APIがエラーを返した場合の例外"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+
+class DiscordRestClient:
+    """ゲートウェイに接続せず、REST API(Webhook・チャンネルへの送信)のみでメッセージを送るクラス"""
+
+    def __init__(self, bot_token: Optional[str] = None, webhook_url: Optional[str] = None,
+                 api_base: str = API_BASE):
+        """
+        Args:
+            bot_token: Discord Botトークン(チャンネルへ直接送信する場合)
+            webhook_url: Webhook URL(Webhookで送信する場合)
+            api_base: REST APIのベースURL
+        """
+        self.bot_token = bot_token
+        self.webhook_url = webhook_url
+        self.api_base = api_base.rstrip('/')
+        self._session = None
+        # レート制限の状態 {URL: (残り回数, リセット時刻(time.monotonic基準))}
+        self._rate_limits = {}
+
+    def _get_session(self) -> 'aiohttp.ClientSession':
+        """HTTPセッションを取得(接続はプロセス内で使い回す、aiohttpは初回の送信時に読み込む)"""
+        if self._session is None or self._session.closed:
+            import aiohttp
+
+            headers = {}
+            if self.bot_token:
+                headers['Authorization'] = f"Bot {self.bot_token}"
+            self._session = aiohttp.ClientSession(headers=headers)
+        return self._session
+
+    async def _wait_for_rate_limit(self, url: str) -> None:
+        """前回のレスポンスで残り回数が0になっている場合はリセットまで待機"""
+        remaining, reset_at = self._rate_limits.get(url, (1, 0.0))
+        wait_seconds = reset_at - time.monotonic()
+        if remaining <= 0 and wait_seconds > 0:
+            print(f"Discordのレート制限のため{wait_seconds:.2f}秒待機します")
+            metrics.DISCORD_RATE_LIMIT_WAIT_SECONDS.inc(wait_seconds, reason='bucket')
+            metrics.log('discord_rate_limit', reason='bucket', seconds=round(wait_seconds, 4))
+            await asyncio.sleep(wait_seconds)
+
+    def _update_rate_limit(self, url: str, headers) -> None:
+        """X-RateLimit-*ヘッダーからレート制限の状態を更新"""
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset_after = headers.get('X-RateLimit-Reset-After')
+        if remaining is not None and reset_after is not None:
+            self._rate_limits[url] = (int(remaining), time.monotonic() + float(reset_after))
+
+    async def _get_retry_after(self, response) -> float:
+        """
+        429の再送までの待機時間(秒)を取得
+
+        ボディのretry_afterを使い、ボディが空・JSONでない場合(プロキシなどが返した429)は
+        Retry-After・X-RateLimit-Reset-Afterヘッダーを使う。
+
+        Args:
+            response: 429のレスポンス
+
+        Returns:
+            待機時間(どれもない場合は1秒)
+        """
+        try:
+            data = json.loads(await response.text() or 'null')
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            data = {}
+
+        for value in (data.get('retry_after'), response.headers.get('Retry-After'),
+                      response.headers.get('X-RateLimit-Reset-After')):
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                continue
+        return 1.0
+
+    async def _post(self, url: str, payload: Dict[str, Any]) -> None:
+        """
+        レート制限に従ってPOSTリクエストを送信
+
+        429はretry_after秒後に、サーバーエラー(5xx)・通信エラーは指数バックオフで待機して再送する。
+
+        Args:
+            url: 送信先URL
+            payload: JSONボディ
+
+        Raises:
+            DiscordRestError: 4xxが返された場合、または再送回数の上限に達した場合
+            aiohttp.ClientError: 再送回数の上限まで通信エラーが続いた場合
+        """
+        import aiohttp
+
+        session = self._get_session()
+
+        for attempt in range(MAX_RETRIES + 1):
+            await self._wait_for_rate_limit(url)
+
+            try:
+                async with session.post(url, json=payload) as response:
+                    self._update_rate_limit(url, response.headers)
+
+                    if response.status == 429:
+                        # レート制限を超えた場合はretry_after秒待って再送
+                        retry_after = await self._get_retry_after(response)
+                        print(f"Discordのレート制限のため{retry_after:.2f}秒後に再送します")
+                        metrics.DISCORD_RATE_LIMIT_WAIT_SECONDS.inc(retry_after, reason='429')
+                        metrics.log('discord_rate_limit', reason='429', seconds=round(retry_after, 4))
+                        await asyncio.sleep(retry_after)
+                        continue
+
+                    if response.status >= 500:
+                        error = DiscordRestError(response.status, await response.text())
+                    elif response.status >= 400:
+                        raise DiscordRestError(response.status, await response.text())
+                    else:
+                        return
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # 接続の切断・タイムアウト(届いていた場合は同じメッセージが2回送られることがある)
+                error = e
+
+            if attempt >= MAX_RETRIES:
+                raise error
+            # 同時に失敗した送信がそろって再送しないよう揺らす
+            delay = random.uniform(0, min(MAX_BACKOFF_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+            reason = str(error.status) if isinstance(error, DiscordRestError) else type(error).__name__
+            print(f"Discordへの送信エラー({reason})のため{delay:.2f}秒後に再送します ({attempt + 1}/{MAX_RETRIES})")
+            metrics.log('discord_retry', reason=reason, seconds=round(delay, 4))
+            await asyncio.sleep(delay)
+
+        raise DiscordRestError(429, "レート制限により再送回数の上限に達しました")
+
+    async def send_message(self, channel_id: int, payload: Dict[str, Any]) -> None:
+        """
+        チャンネルにメッセージを送信(POST /channels/{id}/messages)
+
+        Args:
+            channel_id: 送信先チャンネルID
+            payload: メッセージ {'content': str, ...}
+        """
+        await self._post(f"{self.api_base}/channels/{channel_id}/messages", payload)
+
+    async def execute_webhook(self, payload: Dict[str, Any], webhook_url: Optional[str] = None) -> None:
+        """
+        Webhookでメッセージを送信
+
+        Args:
+            payload: メッセージ {'content': str, ...}
+            webhook_url: 送信先のWebhook URL(省略時は初期化時のURL)
+        """
+        await self._post(webhook_url or self.webhook_url, payload)
+
+    async def close(self) -> None:
+        """HTTPセッションをクローズ"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
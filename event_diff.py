@@ -0,0 +1,264 @@
+import hashlib
+import json
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Iterable, Optional
+
+# 変更検出の対象とするフィールド
+DIFF_FIELDS = ('title', 'start', 'end')
+
+def event_key(event: Dict[str, Any]) -> str:
+    """
+    イベントの保存キーを作成
+
+    イベントIDはカレンダーごとに一意なため、別カレンダーの同じIDと衝突しないよう
+    カレンダーIDと組み合わせる。
+
+    Args:
+        event: イベント
+
+    Returns:
+        'カレンダーID/イベントID'
+    """
+    return f"{event.get('calendar_id', '')}/{event['id']}"
+
+def _start_instant(event: Dict[str, Any]) -> str:
+    """開始を比較用にそろえる(同じ時刻でもカレンダーごとにタイムゾーンの表記が異なるため、UTCにする)"""
+    start = event.get('start') or ''
+    if 'T' not in start:
+        return start
+    try:
+        return datetime.fromisoformat(start.replace('Z', '+00:00')).astimezone(timezone.utc).isoformat()
+    except ValueError:
+        return start
+
+def is_same_occurrence(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    """
+    2つのイベントが複数のカレンダーに共有された同じ予定か判定(重複をまとめる処理と同じくiCalUIDと開始で判定)
+
+    Args:
+        a: イベント
+        b: イベント
+
+    Returns:
+        iCalUIDと開始時刻が同じ場合True
+    """
+    return bool(a.get('ical_uid')) and a.get('ical_uid') == b.get('ical_uid') and _start_instant(a) == _start_instant(b)
+
+def compute_event_hash(event: Dict[str, Any]) -> str:
+    """
+    イベントの内容ハッシュを計算
+
+    Args:
+        event: イベント
+
+    Returns:
+        DIFF_FIELDSの内容から計算したハッシュ値
+    """
+    content = json.dumps([event.get(field) for field in DIFF_FIELDS], ensure_ascii=False)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+def compare_fields(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, tuple]:
+    """
+    フィールド単位で変更点を比較
+
+    Args:
+        previous: 前回のイベント
+        current: 現在のイベント
+
+    Returns:
+        変更されたフィールド {'field': (変更前, 変更後), ...}
+    """
+    return {
+        field: (previous.get(field), current.get(field))
+        for field in DIFF_FIELDS
+        if previous.get(field) != current.get(field)
+    }
+
+def is_past_event(event: Dict[str, Any], now: datetime) -> bool:
+    """
+    イベントが終了済みか判定(取得範囲から外れただけのイベントを削除扱いしないため)
+
+    Args:
+        event: イベント
+        now: 現在時刻(タイムゾーン付き)
+
+    Returns:
+        終了済みの場合True
+    """
+    end = event.get('end') or ''
+    try:
+        if 'T' in end:
+            return datetime.fromisoformat(end.replace('Z', '+00:00')) <= now
+        # 終日イベントの終了日は翌日(排他的)
+        return end <= now.date().isoformat()
+    except ValueError:
+        return False
+
+class EventDiff:
+    """前回からの変更(追加・変更・削除)をまとめたクラス"""
+
+    def __init__(self, added: List[Dict[str, Any]] = None, updated: List[Dict[str, Any]] = None,
+                 removed: List[Dict[str, Any]] = None):
+        """
+        Args:
+            added: 追加されたイベントリスト
+            updated: 変更されたイベントリスト [{'event': 現在, 'previous': 前回, 'changes': {field: (前, 後)}}, ...]
+            removed: 削除されたイベントリスト(前回のイベント)
+        """
+        self.added = added or []
+        self.updated = updated or []
+        self.removed = removed or []
+
+    @property
+    def is_empty(self) -> bool:
+        """変更がない場合True"""
+        return not (self.added or self.updated or self.removed)
+
+    def only(self, change_types: Iterable[str]) -> 'EventDiff':
+        """
+        指定した種類の変更のみを残す
+
+        Args:
+            change_types: 'added', 'updated', 'removed' のいずれか
+
+        Returns:
+            絞り込んだEventDiff
+        """
+        change_types = set(change_types)
+        return EventDiff(
+            added=self.added if 'added' in change_types else [],
+            updated=self.updated if 'updated' in change_types else [],
+            removed=self.removed if 'removed' in change_types else [],
+        )
+
+    def extend(self, other: 'EventDiff') -> None:
+        """
+        別の変更を追加(複数の送信先で送信できなかった変更をまとめる場合など)
+
+        Args:
+            other: 追加する変更
+        """
+        self.added.extend(other.added)
+        self.updated.extend(other.updated)
+        self.removed.extend(other.removed)
+
+    def __repr__(self) -> str:
+        return f"EventDiff(added={len(self.added)}, updated={len(self.updated)}, removed={len(self.removed)})"
+
+def match_shared_events(diff: EventDiff, current_by_uid: Dict[str, List[Dict[str, Any]]],
+                        previous_by_uid: Dict[str, List[Dict[str, Any]]]) -> EventDiff:
+    """
+    共有された予定を、まとめる元のカレンダーが変わっても同じ予定として扱う
+
+    重複をまとめた予定は先頭のカレンダーのキーで保存されるため、そのカレンダーの取得に失敗すると
+    別のカレンダーのキーで返される。前回にiCalUIDと開始が同じ予定があれば追加とせず、
+    今回にiCalUIDと開始が同じ予定があれば削除としない。
+
+    Args:
+        diff: キー(カレンダーID/イベントID)で比較した変更
+        current_by_uid: 今回のイベント {iCalUID: [event, ...]} (削除された予定のiCalUIDの分のみでよい)
+        previous_by_uid: 前回のイベント {iCalUID: [event, ...]} (追加された予定のiCalUIDの分のみでよい)
+
+    Returns:
+        絞り込んだEventDiff(diff自体を書き換える)
+    """
+    diff.added = [
+        event for event in diff.added
+        if not any(is_same_occurrence(event, previous) for previous in previous_by_uid.get(event.get('ical_uid'), ()))
+    ]
+    diff.removed = [
+        previous for previous in diff.removed
+        if not any(is_same_occurrence(previous, event) for event in current_by_uid.get(previous.get('ical_uid'), ()))
+    ]
+    return diff
+
+def exclude_changes(current_events: Iterable[Dict[str, Any]], changes: EventDiff) -> List[Dict[str, Any]]:
+    """
+    現在のイベントから指定した変更を取り消す(通知できなかった変更を次回も検出させるため)
+
+    追加されたイベントは除き、変更されたイベントは前回の内容に戻し、削除されたイベントは前回の内容で残す。
+
+    Args:
+        current_events: 現在のイベント
+        changes: 取り消す変更
+
+    Returns:
+        保存するイベントのリスト
+    """
+    added_keys = {event_key(event) for event in changes.added}
+    previous_events = {event_key(update['event']): update['previous'] for update in changes.updated}
+
+    events = []
+    for event in current_events:
+        key = event_key(event)
+        if key in added_keys:
+            continue
+        events.append(previous_events.pop(key, event))
+    # 取得範囲の外へ移動した予定(今回のイベントに含まれない変更)も前回の内容で残す
+    events.extend(previous_events.values())
+    events.extend(changes.removed)
+    return events
+
+def diff_events(previous_events: Dict[str, Dict[str, Any]], current_events: Iterable[Dict[str, Any]],
+                calendar_ids: Optional[Iterable[str]] = None, now: Optional[datetime] = None) -> EventDiff:
+    """
+    前回のスナップショットと現在のイベントを比較
+
+    内容ハッシュが前回と同じイベントはハッシュの比較のみで済ませ、
+    ハッシュが異なる場合のみフィールド単位で比較する。
+
+    Args:
+        previous_events: 前回のイベント辞書 {event_key: event(hashを含む), ...}
+        current_events: 現在のイベント(1回だけ走査する)
+        calendar_ids: 削除の判定対象とするカレンダーID(Noneの場合は全カレンダー)
+        now: 終了済み判定に使う現在時刻(タイムゾーン付き、省略時は現在のローカル時刻)
+
+    Returns:
+        EventDiff
+    """
+    if now is None:
+        now = datetime.now(timezone.utc).astimezone()
+
+    diff = EventDiff()
+    seen_keys = set()
+    current_by_uid = {}
+
+    for event in current_events:
+        key = event_key(event)
+        seen_keys.add(key)
+        if event.get('ical_uid'):
+            current_by_uid.setdefault(event.get('ical_uid'), []).append(event)
+        previous = previous_events.get(key)
+        if previous is None:
+            diff.added.append(event)
+            continue
+
+        previous_hash = previous.get('hash') or compute_event_hash(previous)
+        if previous_hash == compute_event_hash(event):
+            continue
+
+        changes = compare_fields(previous, event)
+        if changes:
+            diff.updated.append({'event': event, 'previous': previous, 'changes': changes})
+
+    scope = set(calendar_ids) if calendar_ids is not None else None
+    for key, previous in previous_events.items():
+        if key in seen_keys:
+            continue
+        if scope is not None and previous.get('calendar_id') not in scope:
+            continue
+        if is_past_event(previous, now):
+            continue
+        diff.removed.append(previous)
+
+    if diff.added or diff.removed:
+        # 共有された予定をまとめる元のカレンダーが変わっただけの場合は、追加・削除としない
+        added_uids = {event.get('ical_uid') for event in diff.added if event.get('ical_uid')}
+        previous_by_uid = {}
+        if added_uids:
+            for previous in previous_events.values():
+                if previous.get('ical_uid') in added_uids:
+                    previous_by_uid.setdefault(previous['ical_uid'], []).append(previous)
+        match_shared_events(diff, current_by_uid, previous_by_uid)
+
+    return diff
@@ -0,0 +1,140 @@
+from datetime import datetime, tzinfo
+from typing import Dict, Any, List, Optional
+
+# 辞書形式(保存・差分検出用)に含めるフィールド
+EVENT_FIELDS = ('id', 'title', 'start', 'end', 'calendar_id', 'ical_uid', 'calendar_ids')
+
+def parse_event_time(value: str, timezone: tzinfo) -> datetime:
+    """
+    イベントの日時文字列をタイムゾーン付きdatetimeに変換
+
+    Args:
+        value: dateTime(ISO形式)またはdate(YYYY-MM-DD)
+        timezone: 終日イベントに使うタイムゾーン(pytz)
+
+    Returns:
+        タイムゾーン付きdatetime(終日イベントは指定タイムゾーンの00:00)
+    """
+    if 'T' in value:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return timezone.localize(datetime.strptime(value, '%Y-%m-%d'))
+
+class Event:
+    """
+    カレンダーのイベント
+
+    取り込み時に開始・終了時刻を一度だけタイムゾーン付きdatetimeに変換して保持し、
+    並べ替え・範囲判定・通知のフォーマットで再解析しない。保存や差分検出のために
+    辞書と同じ読み取り方(event['title'], event.get('start'))にも対応する。
+    """
+
+    __slots__ = ('id', 'title', 'start', 'end', 'calendar_id', 'ical_uid', 'calendar_ids',
+                 'start_dt', 'end_dt', 'all_day')
+
+    def __init__(self, id: str, title: str, start: str, end: str, calendar_id: str, timezone: tzinfo,
+                 ical_uid: Optional[str] = None, calendar_ids: Optional[List[str]] = None):
+        """
+        Args:
+            id: イベントID
+            title: タイトル
+            start: 開始(dateTimeまたはdateの文字列)
+            end: 終了(dateTimeまたはdateの文字列)
+            calendar_id: カレンダーID
+            timezone: 終日イベントに使うタイムゾーン(pytz)
+            ical_uid: iCalUID
+            calendar_ids: この予定が共有されている全カレンダーID(重複をまとめた場合のみ)
+        """
+        self.id = id
+        self.title = title
+        self.start = start
+        self.end = end
+        self.calendar_id = calendar_id
+        self.ical_uid = ical_uid
+        self.calendar_ids = calendar_ids
+        self.all_day = 'T' not in start
+        self.start_dt = parse_event_time(start, timezone)
+        self.end_dt = parse_event_time(end, timezone)
+
+    @classmethod
+    def from_api(cls, item: Dict[str, Any], calendar_id: str, timezone: tzinfo) -> 'Event':
+        """
+        Calendar APIのイベントリソースから作成
+
+        Args:
+            item: Calendar APIのイベントリソース
+            calendar_id: カレンダーID
+            timezone: 終日イベントに使うタイムゾーン(pytz)
+        """
+        # 開始時刻の取得(終日イベントと時刻指定イベントに対応)
+        return cls(
+            id=item['id'],
+            title=item.get('summary', '(タイトルなし)'),
+            start=item['start'].get('dateTime', item['start'].get('date')),
+            end=item['end'].get('dateTime', item['end'].get('date')),
+            calendar_id=calendar_id,
+            timezone=timezone,
+            ical_uid=item.get('iCalUID'),  # 複数カレンダーに共有された同じ予定の判定用
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], timezone: tzinfo) -> 'Event':
+        """
+        辞書形式(to_dictの出力・保存済みデータ)から作成
+
+        Args:
+            data: イベント辞書
+            timezone: 終日イベントに使うタイムゾーン(pytz)
+        """
+        return cls(
+            id=data['id'],
+            title=data.get('title', '(タイトルなし)'),
+            start=data['start'],
+            end=data['end'],
+            calendar_id=data.get('calendar_id', ''),
+            timezone=timezone,
+            ical_uid=data.get('ical_uid'),
+            calendar_ids=data.get('calendar_ids'),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        辞書形式に変換(保存用)
+
+        Returns:
+            {'id': str, 'title': str, 'start': str, 'end': str, 'calendar_id': str, 'ical_uid': str}
+            (重複をまとめた予定のみ'calendar_ids'を含む)
+        """
+        data = {
+            'id': self.id,
+            'title': self.title,
+            'start': self.start,
+            'end': self.end,
+            'calendar_id': self.calendar_id,
+            'ical_uid': self.ical_uid,
+        }
+        if self.calendar_ids is not None:
+            data['calendar_ids'] = self.calendar_ids
+        return data
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in EVENT_FIELDS or (key == 'calendar_ids' and self.calendar_ids is None):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Event):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return f"Event(id={self.id!r}, title={self.title!r}, start={self.start!r}, calendar_id={self.calendar_id!r})"
+
+def as_dict(event: Any) -> Dict[str, Any]:
+    """Eventまたはイベント辞書を辞書形式にそろえる"""
+    return event.to_dict() if isinstance(event, Event) else event
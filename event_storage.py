@@ -1,70 +1,163 @@
 import json
 import os
-from typing import List, Dict, Any
+from datetime import datetime
+from typing import List, Dict, Any, Iterable, Optional
+import metrics
+from event_diff import EventDiff, compute_event_hash, diff_events, event_key
+from event_model import as_dict
+from state_file import write_atomic
+
+# 高速なシリアライザー(インストールされている場合のみ使用)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# 保存形式
+# json: 標準ライブラリのJSON(インデントなし)
+# orjson: orjsonによるJSON(jsonと同じ形式で高速)
+# msgpack: MessagePack(バイナリ形式でサイズが小さい)
+STORAGE_FORMATS = ('json', 'orjson', 'msgpack')
 
 class EventStorage:
     """イベントデータの永続化と差分検出を行うクラス"""
 
-    def __init__(self, storage_path: str = 'data/previous_events.json'):
+    def __init__(self, storage_path: str = 'data/previous_events.json', storage_format: str = 'json'):
         """
         Args:
-            storage_path: JSONファイルの保存パス
+            storage_path: 保存ファイルのパス
+            storage_format: 保存形式('json', 'orjson', 'msgpack')
+                読み込み時はファイルの内容から形式を判定するため、既存のJSONファイルもそのまま読める
         """
+        if storage_format not in STORAGE_FORMATS:
+            raise ValueError(f"不明な保存形式です: {storage_format}")
+
+        if storage_format == 'orjson' and orjson is None:
+            print("警告: orjsonがインストールされていないため、json形式で保存します")
+            storage_format = 'json'
+        elif storage_format == 'msgpack' and msgpack is None:
+            print("警告: msgpackがインストールされていないため、json形式で保存します")
+            storage_format = 'json'
+
         self.storage_path = storage_path
+        self.storage_format = storage_format
+
+    def _serialize(self, data: Dict[str, Any]) -> bytes:
+        """設定された形式でバイト列に変換"""
+        if self.storage_format == 'msgpack':
+            return msgpack.packb(data, use_bin_type=True)
+        if self.storage_format == 'orjson':
+            return orjson.dumps(data)
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def _deserialize(self, raw: bytes) -> Dict[str, Any]:
+        """バイト列から復元(JSONかMessagePackかは内容から判定)"""
+        if raw.lstrip()[:1] == b'{':
+            data = orjson.loads(raw) if orjson is not None else json.loads(raw.decode('utf-8'))
+        elif msgpack is None:
+            raise ValueError("MessagePack形式のファイルですが、msgpackがインストールされていません")
+        else:
+            data = msgpack.unpackb(raw, raw=False)
 
-    def save_events(self, events: List[Dict[str, Any]]) -> None:
+        if not isinstance(data, dict):
+            raise ValueError("イベント辞書の形式ではありません")
+        if not all(isinstance(event, dict) and 'id' in event for event in data.values()):
+            raise ValueError("イベントの形式ではない値が含まれています")
+        return data
+
+    def _write_atomic(self, raw: bytes) -> None:
+        """一時ファイルに書き込んでからリネームで置き換える(書き込み途中でクラッシュしても既存のファイルは壊れない)"""
+        write_atomic(self.storage_path, raw)
+
+    def save_events(self, events: Iterable[Dict[str, Any]], calendar_ids: Optional[Iterable[str]] = None) -> None:
         """
-        イベントリストをJSONファイルに保存
+        イベントリストをファイルに保存
 
         Args:
             events: イベントリスト [{'id': str, 'title': str, 'start': str, 'end': str}, ...]
+            calendar_ids: 置き換えるカレンダーID(指定時は他のカレンダーの保存内容はそのまま残す)
         """
-        # ディレクトリが存在しない場合は作成
-        os.makedirs(os.path.dirname(self.storage_path), exist_ok=True)
+        events_dict = {}
+        if calendar_ids is not None:
+            scope = set(calendar_ids)
+            events_dict = {
+                key: event for key, event in self.load_events().items()
+                if event.get('calendar_id') not in scope
+            }
 
-        # イベントIDをキーとした辞書形式で保存
-        events_dict = {event['id']: event for event in events}
+        # 'カレンダーID/イベントID'をキーとした辞書形式で、次回の変更検出用の内容ハッシュと一緒に保存
+        for event in events:
+            events_dict[event_key(event)] = dict(as_dict(event), hash=compute_event_hash(event))
 
-        with open(self.storage_path, 'w', encoding='utf-8') as f:
-            json.dump(events_dict, f, ensure_ascii=False, indent=2)
+        with metrics.STORAGE_SECONDS.time(backend='file', operation='write'):
+            self._write_atomic(self._serialize(events_dict))
 
-    def load_events(self) -> Dict[str, Dict[str, Any]]:
+    def _read_snapshot(self) -> Optional[Dict[str, Dict[str, Any]]]:
         """
         前回保存したイベントを読み込み
 
         Returns:
-            イベント辞書 {'event_id': {'id': str, 'title': str, 'start': str, 'end': str}, ...}
-            ファイルが存在しない場合は空辞書を返す
+            イベント辞書(ファイルが存在しない場合は空辞書、破損している場合はNone)
         """
         if not os.path.exists(self.storage_path):
             return {}
 
         try:
-            with open(self.storage_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            # JSONファイルが破損している場合は空辞書を返す
-            print(f"警告: {self.storage_path}が破損しています。空データで初期化します。")
-            return {}
+            with metrics.STORAGE_SECONDS.time(backend='file', operation='read'):
+                with open(self.storage_path, 'rb') as f:
+                    events = self._deserialize(f.read())
+        except (ValueError, UnicodeDecodeError) as e:
+            # orjson.JSONDecodeError・msgpackの例外もValueErrorのサブクラス
+            print(f"警告: {self.storage_path}が破損しています: {e}")
+            return None
 
-    def get_new_events(self, current_events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # イベントIDのみをキーにしていた旧形式のファイルは'カレンダーID/イベントID'に読み替える
+        return {event_key(event): event for event in events.values()}
+
+    def load_events(self) -> Dict[str, Dict[str, Any]]:
         """
-        前回のイベントと比較して新規追加されたイベントのみを抽出
+        前回保存したイベントを読み込み
+
+        Returns:
+            イベント辞書 {'カレンダーID/イベントID': {'id': str, 'title': str, 'start': str, 'end': str}, ...}
+            ファイルが存在しない場合・破損している場合は空辞書を返す
+        """
+        return self._read_snapshot() or {}
+
+    def diff_events(self, current_events: Iterable[Dict[str, Any]], calendar_ids: Optional[Iterable[str]] = None,
+                    now: Optional[datetime] = None) -> EventDiff:
+        """
+        前回のイベントと比較して追加・変更・削除されたイベントを抽出
 
         Args:
-            current_events: 現在のイベントリスト
+            current_events: 現在のイベント(リストまたはジェネレーター、1回だけ走査する)
+            calendar_ids: 削除の判定対象とするカレンダーID(Noneの場合は全カレンダー)
+            now: 終了済み判定に使う現在時刻(タイムゾーン付き)
 
         Returns:
-            新規イベントリスト
+            EventDiff
         """
-        previous_events = self.load_events()
-        previous_ids = set(previous_events.keys())
-        current_ids = {event['id'] for event in current_events}
+        previous_events = self._read_snapshot()
+        if previous_events is None:
+            # 破損時に全イベントを新規として通知しないよう、今回は現在の予定を基準とするだけにする
+            print("前回のデータが読み込めないため、今回は通知せず現在の予定を基準として保存します")
+            return EventDiff()
 
-        # 新規追加されたイベントIDを特定
-        new_ids = current_ids - previous_ids
+        return diff_events(previous_events, current_events, calendar_ids=calendar_ids, now=now)
 
-        # 新規イベントのみを抽出
-        new_events = [event for event in current_events if event['id'] in new_ids]
+    def get_new_events(self, current_events: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        前回のイベントと比較して新規追加されたイベントのみを抽出
+
+        Args:
+            current_events: 現在のイベント(リストまたはジェネレーター、1回だけ走査する)
 
-        return new_events
+        Returns:
+            新規イベントリスト
+        """
+        return self.diff_events(current_events).added
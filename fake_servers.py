@@ -0,0 +1,520 @@
+"""
+ベンチマーク用のスタブサーバー
+
+Google Calendar API v3(events().list・バッチリクエスト)とDiscord REST API(メッセージ送信)の必要な部分だけを
+ローカルで再現し、認証情報やネットワークなしで実際のクライアントの処理時間を計測できるようにする。
+計測するプロセスのメモリ使用量に含めないよう、サーバーは別プロセスで起動する。
+"""
+
+import email.parser
+import json
+import multiprocessing
+import random
+import re
+import sys
+import threading
+import time
+import urllib.request
+import uuid
+from datetime import datetime, timedelta
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+import pytz
+
+# events().listのパス(api_endpointを指定した場合は/calendar/v3が付かない)
+EVENTS_PATH = re.compile(r'^(?:/calendar/v3)?/calendars/([^/]+)/events$')
+# バッチリクエストの送信先
+BATCH_PATH = re.compile(r'^/batch(?:/calendar/v3)?$')
+# Discordのメッセージ送信先(チャンネル・Webhook)
+DISCORD_PATH = re.compile(r'^/api/v10/(channels/[^/]+/messages|webhooks/[^/]+/[^/]+)$')
+
+# events().listの1ページあたりの件数(maxResults省略時・上限)
+DEFAULT_PAGE_SIZE = 250
+MAX_PAGE_SIZE = 2500
+
+# Discordのレート制限の集計期間(秒)
+RATE_LIMIT_WINDOW = 1.0
+
+class FakeCalendarData:
+    """
+    スタブのカレンダーとイベント
+
+    イベントは変更されたときのバージョンと一緒に保持し、syncTokenには発行時のバージョンを使う。
+    syncToken付きのリクエストには、そのバージョン以降に変更・キャンセルされたイベントのみを返す。
+    繰り返し予定(毎日)は、singleEvents=trueの場合のみ各回に展開して返す。
+    """
+
+    def __init__(self, calendar_count: int, events_per_calendar: int, days: int = 30,
+                 timezone: str = 'Asia/Tokyo', seed: int = 0, recurring_per_calendar: int = 0):
+        """
+        Args:
+            calendar_count: カレンダー数
+            events_per_calendar: カレンダーあたりのイベント数
+            days: イベントを配置する日数(今日から)
+            timezone: タイムゾーン
+            seed: 乱数のシード(同じ値なら同じイベントを生成する)
+            recurring_per_calendar: カレンダーあたりの繰り返し予定(毎日)の数
+        """
+        self.timezone = pytz.timezone(timezone)
+        self.days = days
+        self.version = 1
+        self.calendar_ids = [f"calendar{i}@benchmark.local" for i in range(calendar_count)]
+        # カレンダーID → {イベントID: (バージョン, イベント, 開始, 終了)}
+        self.calendars = {}
+        self._random = random.Random(seed)
+        self._next_id = 0
+        self._origin = self.timezone.localize(datetime.combine(datetime.now(self.timezone).date(), datetime.min.time()))
+        # ページングのたびに絞り込み・並べ替えをしないよう、結果をバージョンごとにキャッシュする
+        self._results = {}
+        self._lock = threading.Lock()
+
+        for calendar_id in self.calendar_ids:
+            self.calendars[calendar_id] = {}
+            for _ in range(events_per_calendar):
+                self._put(calendar_id, self._new_event())
+            for _ in range(recurring_per_calendar):
+                self._put(calendar_id, self._new_recurring_event())
+
+    def _new_event(self) -> Dict[str, Any]:
+        """イベントを1件生成(10件に1件は終日の予定)"""
+        self._next_id += 1
+        day = self._random.randrange(self.days)
+        item = {'id': f"evt{self._next_id}", 'status': 'confirmed', 'summary': f"予定{self._next_id}"}
+        if self._next_id % 10 == 0:
+            date = self._origin.date() + timedelta(days=day)
+            item['start'] = {'date': date.isoformat()}
+            item['end'] = {'date': (date + timedelta(days=1)).isoformat()}
+        else:
+            start = self._origin + timedelta(days=day, minutes=15 * self._random.randrange(96))
+            item['start'] = {'dateTime': start.isoformat()}
+            item['end'] = {'dateTime': (start + timedelta(hours=1)).isoformat()}
+        return item
+
+    def _new_recurring_event(self) -> Dict[str, Any]:
+        """毎日の繰り返し予定を1件生成(取得範囲より前から続いている)"""
+        self._next_id += 1
+        start = self._origin - timedelta(days=self._random.randrange(1, 60), minutes=-15 * self._random.randrange(96))
+        return {
+            'id': f"rec{self._next_id}", 'status': 'confirmed', 'summary': f"定例{self._next_id}",
+            'iCalUID': f"rec{self._next_id}@benchmark.local",
+            'start': {'dateTime': start.isoformat(), 'timeZone': self.timezone.zone},
+            'end': {'dateTime': (start + timedelta(minutes=30)).isoformat(), 'timeZone': self.timezone.zone},
+            'recurrence': ['RRULE:FREQ=DAILY'],
+        }
+
+    def _instances(self, item: Dict[str, Any], time_min: Optional[datetime],
+                   time_max: Optional[datetime]) -> List[Tuple[datetime, Dict[str, Any]]]:
+        """毎日の繰り返し予定を範囲内の各回に展開(範囲の指定がない場合は取得範囲の前後)"""
+        time_min = time_min or self._origin - timedelta(days=1)
+        time_max = time_max or self._origin + timedelta(days=self.days * 3)
+        first = datetime.fromisoformat(item['start']['dateTime'])
+        duration = datetime.fromisoformat(item['end']['dateTime']) - first
+        day = max(0, (time_min - first - duration).days)
+        instances = []
+        while True:
+            start = self.timezone.localize(first.replace(tzinfo=None) + timedelta(days=day))
+            day += 1
+            if start >= time_max:
+                return instances
+            if start + duration <= time_min:
+                continue
+            original = {'dateTime': start.isoformat(), 'timeZone': item['start']['timeZone']}
+            instances.append((start, {
+                'id': f"{item['id']}_{start.astimezone(pytz.utc):%Y%m%dT%H%M%SZ}",
+                'status': item['status'], 'summary': item['summary'], 'iCalUID': item['iCalUID'],
+                'start': original,
+                'end': {'dateTime': (start + duration).isoformat(), 'timeZone': item['end']['timeZone']},
+                'recurringEventId': item['id'], 'originalStartTime': original,
+            }))
+
+    def _parse(self, value: Dict[str, str]) -> datetime:
+        """イベントの開始・終了時刻を解析"""
+        if 'dateTime' in value:
+            return datetime.fromisoformat(value['dateTime'])
+        return self.timezone.localize(datetime.fromisoformat(value['date']))
+
+    def _put(self, calendar_id: str, item: Dict[str, Any]) -> None:
+        """イベントを現在のバージョンで保存"""
+        self.calendars[calendar_id][item['id']] = (
+            self.version, item, self._parse(item['start']), self._parse(item['end'])
+        )
+
+    def mutate(self, changes: int) -> None:
+        """
+        ランダムに選んだイベントを追加・変更・キャンセルする
+
+        Args:
+            changes: 変更する件数(全カレンダーの合計)
+        """
+        with self._lock:
+            self.version += 1
+            self._results.clear()
+            for _ in range(changes):
+                calendar_id = self._random.choice(self.calendar_ids)
+                action = self._random.choice(('add', 'update', 'cancel'))
+                live = [item for _, item, _, _ in self.calendars[calendar_id].values() if item['status'] != 'cancelled']
+                if action == 'add' or not live:
+                    self._put(calendar_id, self._new_event())
+                elif action == 'update':
+                    item = dict(self._random.choice(live))
+                    item['summary'] = f"{item['summary']}(変更)"
+                    self._put(calendar_id, item)
+                else:
+                    self._put(calendar_id, dict(self._random.choice(live), status='cancelled'))
+
+    def _select(self, calendar_id: str, params: Dict[str, str]) -> Optional[List[Dict[str, Any]]]:
+        """リクエストの条件に合うイベントを取得(syncTokenが不正な場合はNone)"""
+        events = self.calendars[calendar_id].values()
+        single_events = params.get('singleEvents') == 'true'
+        if params.get('syncToken'):
+            try:
+                since = int(params['syncToken'])
+            except ValueError:
+                return None
+            changed = []
+            for version, item, _, _ in events:
+                if version <= since:
+                    continue
+                if single_events and item.get('recurrence'):
+                    changed.extend(instance for _, instance in self._instances(item, None, None))
+                else:
+                    changed.append(item)
+            return changed
+
+        time_min = datetime.fromisoformat(params['timeMin']) if params.get('timeMin') else None
+        time_max = datetime.fromisoformat(params['timeMax']) if params.get('timeMax') else None
+        selected = []
+        for _, item, start, end in events:
+            if item['status'] == 'cancelled':
+                continue
+            if item.get('recurrence'):
+                # 毎日の繰り返し予定は終わりがないため、開始が範囲の終了より前なら対象になる
+                if single_events:
+                    selected.extend(self._instances(item, time_min, time_max))
+                elif time_max is None or start < time_max:
+                    selected.append((start, item))
+            elif (time_min is None or end > time_min) and (time_max is None or start < time_max):
+                selected.append((start, item))
+        selected.sort(key=lambda pair: pair[0])
+        return [item for _, item in selected]
+
+    def list_events(self, calendar_id: str, params: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:
+        """
+        events().listに応答
+
+        Args:
+            calendar_id: カレンダーID
+            params: クエリパラメーター
+
+        Returns:
+            (HTTPステータス, レスポンスボディ)
+        """
+        if calendar_id not in self.calendars:
+            return 404, {'error': {'code': 404, 'message': 'Not Found'}}
+
+        with self._lock:
+            key = (calendar_id, params.get('syncToken'), params.get('timeMin'), params.get('timeMax'),
+                   params.get('singleEvents'))
+            items = self._results.get(key)
+            if items is None:
+                items = self._results[key] = self._select(calendar_id, params)
+            version = self.version
+
+        if items is None:
+            return 410, {'error': {'code': 410, 'message': 'Sync token is no longer valid, a full sync is required.'}}
+
+        page_size = min(int(params.get('maxResults', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        offset = int(params.get('pageToken', 0))
+        body = {'kind': 'calendar#events', 'items': items[offset:offset + page_size]}
+        if offset + page_size < len(items):
+            body['nextPageToken'] = str(offset + page_size)
+        else:
+            body['nextSyncToken'] = str(version)
+        return 200, body
+
+class _JsonHandler(BaseHTTPRequestHandler):
+    """JSONで応答するハンドラーの共通処理(接続は使い回す)"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def _send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> int:
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        return self._send(status, data, 'application/json; charset=UTF-8', headers)
+
+    def _send(self, status: int, data: bytes, content_type: str, headers: Optional[Dict[str, str]] = None) -> int:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+        return len(data)
+
+class _CalendarHandler(_JsonHandler):
+    """Google Calendar APIのスタブ"""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/_bench/stats':
+            self._send_json(200, {'calendar_requests': self.server.requests, 'calendar_errors': self.server.errors,
+                                  'calendar_bytes': self.server.bytes})
+            return
+
+        if EVENTS_PATH.match(url.path) is None:
+            self._send_json(404, {'error': {'code': 404, 'message': 'Not Found'}})
+            return
+
+        time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.requests += 1
+        status, body = self._list_events(url)
+        size = self._send_json(status, body)
+        with self.server.lock:
+            self.server.bytes += size
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self._read_body()
+        if url.path == '/_bench/mutate':
+            self.server.data.mutate(int(json.loads(body or b'{}').get('changes', 0)))
+            self._send_json(200, {'version': self.server.data.version})
+            return
+        if BATCH_PATH.match(url.path) is None:
+            self._send_json(404, {'error': {'code': 404, 'message': 'Not Found'}})
+            return
+
+        # バッチリクエストは1往復として数え、遅延も1回分のみ加える
+        time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.requests += 1
+        boundary = f"batch_{uuid.uuid4().hex}"
+        parts = []
+        for content_id, request_line in self._parse_batch(body):
+            target = request_line.split(' ')[1]
+            status, payload = self._list_events(urlparse(target))
+            data = json.dumps(payload, ensure_ascii=False)
+            parts.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id[1:]}\r\n\r\n"
+                f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                "Content-Type: application/json; charset=UTF-8\r\n"
+                f"Content-Length: {len(data.encode('utf-8'))}\r\n\r\n"
+                f"{data}\r\n"
+            )
+        parts.append(f"--{boundary}--\r\n")
+        size = self._send(200, ''.join(parts).encode('utf-8'), f"multipart/mixed; boundary={boundary}")
+        with self.server.lock:
+            self.server.bytes += size
+
+    def _parse_batch(self, body: bytes) -> List[Tuple[str, str]]:
+        """
+        multipart/mixedのバッチリクエストを分解
+
+        Returns:
+            [(Content-ID, 埋め込まれたリクエストの1行目 例: GET /calendars/.../events?... HTTP/1.1), ...]
+        """
+        header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode('utf-8')
+        message = email.parser.BytesParser().parsebytes(header + body)
+        requests = []
+        for part in message.get_payload():
+            request_line = part.get_payload().lstrip().split('\n', 1)[0].strip()
+            requests.append((part['Content-ID'], request_line))
+        return requests
+
+    def _list_events(self, url) -> Tuple[int, Dict[str, Any]]:
+        """events().listに応答(error_rateの割合でレート制限のエラーを返す)"""
+        match = EVENTS_PATH.match(url.path)
+        if match is None:
+            return 404, {'error': {'code': 404, 'message': 'Not Found'}}
+
+        with self.server.lock:
+            inject_error = self.server.error_rate and self.server.random.random() < self.server.error_rate
+            if inject_error:
+                self.server.errors += 1
+                use_403 = self.server.errors % 2 == 0
+        if inject_error:
+            # Calendar APIのレート制限の応答(429と403 rateLimitExceededを交互に返す)
+            if use_403:
+                return 403, {'error': {'code': 403, 'message': 'Rate Limit Exceeded', 'errors': [
+                    {'domain': 'usageLimits', 'reason': 'rateLimitExceeded', 'message': 'Rate Limit Exceeded'}
+                ]}}
+            return 429, {'error': {'code': 429, 'message': 'Too Many Requests'}}
+
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        return self.server.data.list_events(unquote(match.group(1)), params)
+
+class _DiscordHandler(_JsonHandler):
+    """Discord REST APIのスタブ(rate_limitを指定した場合は送信先ごとにレート制限を再現する)"""
+
+    def do_GET(self):
+        if urlparse(self.path).path == '/_bench/stats':
+            self._send_json(200, {
+                'discord_messages': self.server.messages,
+                'discord_bytes': self.server.bytes,
+                'discord_rate_limited': self.server.rate_limited,
+            })
+            return
+        self._send_json(404, {'message': '404: Not Found', 'code': 0})
+
+    def do_POST(self):
+        body = self._read_body()
+        match = DISCORD_PATH.match(urlparse(self.path).path)
+        if match is None:
+            self._send_json(404, {'message': 'Unknown Channel', 'code': 10003})
+            return
+
+        time.sleep(self.server.latency)
+        headers = {}
+        with self.server.lock:
+            if self.server.rate_limit:
+                now = time.monotonic()
+                window_start, count = self.server.buckets.get(match.group(1), (now, 0))
+                if now - window_start >= RATE_LIMIT_WINDOW:
+                    window_start, count = now, 0
+                reset_after = max(RATE_LIMIT_WINDOW - (now - window_start), 0.0)
+                if count >= self.server.rate_limit:
+                    self.server.rate_limited += 1
+                    limited = True
+                else:
+                    count += 1
+                    self.server.buckets[match.group(1)] = (window_start, count)
+                    limited = False
+                headers = {
+                    'X-RateLimit-Limit': str(self.server.rate_limit),
+                    'X-RateLimit-Remaining': str(self.server.rate_limit - count),
+                    'X-RateLimit-Reset-After': f"{reset_after:.3f}",
+                }
+                if limited:
+                    self._send_json(429, {'message': 'You are being rate limited.', 'retry_after': reset_after,
+                                          'global': False}, headers)
+                    return
+            self.server.messages += 1
+            self.server.bytes += len(body)
+            message_id = self.server.messages
+
+        self._send_json(200, {'id': str(message_id), 'type': 0}, headers)
+
+class _FakeHTTPServer(ThreadingHTTPServer):
+    """クライアントが接続を切った場合のエラーは表示しないサーバー"""
+
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+def _create_server(handler, latency: float) -> ThreadingHTTPServer:
+    """ローカルの空いているポートでサーバーを作成"""
+    server = _FakeHTTPServer(('127.0.0.1', 0), handler)
+    server.latency = latency
+    server.lock = threading.Lock()
+    return server
+
+def _serve(options: Dict[str, Any], ports) -> None:
+    """スタブサーバーを起動して待ち受ける(子プロセスで実行)"""
+    calendar_server = _create_server(_CalendarHandler, options['calendar_latency'])
+    calendar_server.requests = 0
+    calendar_server.errors = 0
+    calendar_server.bytes = 0
+    calendar_server.error_rate = options['calendar_error_rate']
+    calendar_server.random = random.Random(options['seed'])
+    calendar_server.data = FakeCalendarData(
+        options['calendars'], options['events'], days=options['days'],
+        timezone=options['timezone'], seed=options['seed'], recurring_per_calendar=options['recurring']
+    )
+
+    discord_server = _create_server(_DiscordHandler, options['discord_latency'])
+    discord_server.rate_limit = options['discord_rate_limit']
+    discord_server.buckets = {}
+    discord_server.messages = 0
+    discord_server.bytes = 0
+    discord_server.rate_limited = 0
+
+    threading.Thread(target=calendar_server.serve_forever, daemon=True).start()
+    ports.put((calendar_server.server_address[1], discord_server.server_address[1]))
+    discord_server.serve_forever()
+
+class FakeServers:
+    """
+    Google CalendarとDiscordのスタブサーバーを別プロセスで起動する
+
+    使い方:
+        with FakeServers(calendars=10, events=500) as servers:
+            client = GoogleCalendarClient(..., api_endpoint=servers.calendar_endpoint)
+    """
+
+    def __init__(self, calendars: int = 10, events: int = 500, days: int = 30, timezone: str = 'Asia/Tokyo',
+                 calendar_latency: float = 0.0, calendar_error_rate: float = 0.0, discord_latency: float = 0.0,
+                 discord_rate_limit: int = 0, seed: int = 0, recurring: int = 0):
+        """
+        Args:
+            calendars: カレンダー数
+            events: カレンダーあたりのイベント数
+            days: イベントを配置する日数(今日から)
+            timezone: タイムゾーン
+            calendar_latency: Calendar APIの1リクエストごとに加える遅延(秒)
+            calendar_error_rate: Calendar APIがレート制限のエラーを返す割合(0〜1)
+            discord_latency: Discordの1メッセージごとに加える遅延(秒)
+            discord_rate_limit: 送信先ごとに1秒あたり受け付けるメッセージ数(0の場合は制限なし)
+            seed: 乱数のシード
+            recurring: カレンダーあたりの繰り返し予定(毎日)の数
+        """
+        self.options = {
+            'calendars': calendars, 'events': events, 'days': days, 'timezone': timezone,
+            'calendar_latency': calendar_latency, 'calendar_error_rate': calendar_error_rate,
+            'discord_latency': discord_latency,
+            'discord_rate_limit': discord_rate_limit, 'seed': seed, 'recurring': recurring,
+        }
+        self.calendar_ids = [f"calendar{i}@benchmark.local" for i in range(calendars)]
+        self.calendar_endpoint = None
+        self.discord_api_base = None
+        self._process = None
+
+    def start(self) -> None:
+        """サーバーを起動(ポートが決まるまで待つ)"""
+        ports = multiprocessing.Queue()
+        self._process = multiprocessing.Process(target=_serve, args=(self.options, ports), daemon=True)
+        self._process.start()
+        calendar_port, discord_port = ports.get(timeout=60)
+        self.calendar_endpoint = f"http://127.0.0.1:{calendar_port}/"
+        self.discord_api_base = f"http://127.0.0.1:{discord_port}/api/v10"
+
+    def stop(self) -> None:
+        """サーバーを停止"""
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+            self._process = None
+
+    def _request(self, url: str, body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        request = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
+
+    def mutate(self, changes: int) -> None:
+        """イベントをランダムに追加・変更・キャンセルする(全カレンダーの合計件数)"""
+        self._request(self.calendar_endpoint + '_bench/mutate', {'changes': changes})
+
+    def stats(self) -> Dict[str, int]:
+        """これまでのリクエスト数・メッセージ数"""
+        stats = self._request(self.calendar_endpoint + '_bench/stats')
+        stats.update(self._request(self.discord_api_base.rsplit('/api/', 1)[0] + '/_bench/stats'))
+        return stats
+
+    def __enter__(self) -> 'FakeServers':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
@@ -1,30 +1,101 @@
+import asyncio
+import functools
+import heapq
+import itertools
+import json
 import os
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
-from google.auth.transport.requests import Request
+from typing import List, Dict, Any, Optional, Tuple, Iterator, Iterable, Callable
 from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.http import BatchHttpRequest
+import google_auth_httplib2
+import httplib2
 import pytz
+import metrics
+from event_model import Event, parse_event_time
+from rate_limiter import TokenBucket
+from sync_state import SyncStateStore
 
 # 必要なスコープ(読み取り専用)
 SCOPES = ['https://www.googleapis.com/auth/calendar.readonly']
 
+# Calendar APIのバッチリクエストに含められるリクエスト数の上限
+CALENDAR_BATCH_LIMIT = 50
+
+# 有効期限のこの時間前になったら認証トークンを更新する
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+# フル同期時に取得範囲の先まで余分に取得する日数(この日数ごとにフル同期が発生する)
+SYNC_MARGIN_DAYS = 30
+
+# 一時的なエラーの再試行の待機時間(秒)。1回ごとに2倍にし、上限を超えない
+BACKOFF_BASE_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 32.0
+# 403でも待てば成功するエラー(レート制限)の理由
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+
 class GoogleCalendarClient:
     """Google Calendar APIとの連携を行うクラス"""
 
-    def __init__(self, credentials_path: str, token_path: str, timezone: str = 'Asia/Tokyo'):
+    def __init__(self, credentials_path: str, token_path: str, timezone: str = 'Asia/Tokyo',
+                 sync_state_path: Optional[str] = None, page_size: int = 250,
+                 fetch_concurrency: int = 1, use_batch: bool = False,
+                 api_endpoint: Optional[str] = None, qps: float = 0, burst: Optional[float] = None,
+                 max_retries: int = 5, expand_recurrence: bool = False):
         """
         Args:
             credentials_path: credentials.jsonのパス
             token_path: token.jsonのパス(自動生成される)
             timezone: タイムゾーン
+            sync_state_path: 同期状態の保存パス(指定時はsyncTokenによる差分同期を行う)
+            page_size: 1ページあたりの取得件数(events().listのmaxResults、最大2500)
+            fetch_concurrency: 複数カレンダー取得時の同時実行数(1の場合は順番に取得)
+            use_batch: 複数カレンダーのevents().listを1つのバッチリクエストにまとめるか
+            api_endpoint: APIのエンドポイント(ローカルのスタブサーバーで検証する場合に指定)
+            qps: 1秒あたりのリクエスト数の上限(全スレッド共通、0の場合は制限しない)
+            burst: 一時的に連続して送信できるリクエスト数(省略時はqps)
+            max_retries: レート制限・サーバーエラー・通信エラー時に再試行する回数
+            expand_recurrence: 繰り返し予定を親イベントと例外のみ取得し、ローカルで各回に展開するか
+                (python-dateutilが必要。ない場合はAPIで展開する)
         """
         self.credentials_path = credentials_path
         self.token_path = token_path
         self.timezone = pytz.timezone(timezone)
         self.service = None
+        self.sync_store = SyncStateStore(sync_state_path) if sync_state_path else None
+        self.page_size = page_size
+        self.fetch_concurrency = max(1, fetch_concurrency)
+        self.use_batch = use_batch
+        self.api_endpoint = api_endpoint
+        # 全リクエスト(並列取得のスレッド・バッチを含む)で共有するレート制限
+        self.rate_limiter = TokenBucket(qps, burst) if qps > 0 else None
+        self.max_retries = max(0, max_retries)
+        self.recurrence = self._create_recurrence_expander() if expand_recurrence else None
+        self.credentials = None
+        # 直近の複数カレンダー取得で失敗したカレンダーID(差分検出の対象から外すため)
+        self.failed_calendar_ids = []
+        # 認証・トークン更新は複数スレッドから同時に行わない
+        self._auth_lock = threading.RLock()
+        # httplib2.Httpはスレッドセーフではないため、スレッドごとに接続を持つ
+        self._local = threading.local()
+        # 並列取得用のスレッド(スレッドごとの接続を使い回すため、取得のたびに作り直さない)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _create_recurrence_expander(self):
+        """繰り返し予定のローカル展開を準備(dateutilは使う場合のみ読み込む)"""
+        import recurrence
+        if not recurrence.is_available():
+            print("警告: python-dateutilがインストールされていないため、繰り返し予定はAPIで展開します")
+            return None
+        return recurrence.RecurrenceExpander(self.timezone)
 
     def _authenticate(self) -> Credentials:
         """
@@ -45,7 +116,7 @@ class GoogleCalendarClient:
                 try:
                     # トークンをリフレッシュ
                     print("認証トークンを更新中...")
-                    creds.refresh(Request())
+                    creds.refresh(self._auth_request())
                 except Exception as e:
                     print(f"トークンの更新に失敗しました: {e}")
                     print("再認証が必要です。既存のトークンを削除して再認証を行います...")
@@ -63,109 +134,980 @@ class GoogleCalendarClient:
                     )
 
                 print("初回認証を開始します。ブラウザで認証してください...")
+                # ブラウザでの認証は初回のみのため、その場合だけ読み込む
+                from google_auth_oauthlib.flow import InstalledAppFlow
                 flow = InstalledAppFlow.from_client_secrets_file(
                     self.credentials_path, SCOPES
                 )
                 creds = flow.run_local_server(port=0)
 
-            # 認証情報を保存
-            os.makedirs(os.path.dirname(self.token_path), exist_ok=True)
-            with open(self.token_path, 'w') as token:
-                token.write(creds.to_json())
-            print(f"認証情報を保存しました: {self.token_path}")
+            self._save_credentials(creds)
 
         return creds
 
+    def _auth_request(self) -> google_auth_httplib2.Request:
+        """
+        トークン更新用のHTTPトランスポートを作成
+
+        APIの呼び出しと同じhttplib2を使い、読み込みに時間がかかるrequestsを使わない。
+        """
+        return google_auth_httplib2.Request(httplib2.Http())
+
+    def _save_credentials(self, creds: Credentials) -> None:
+        """認証情報をtoken.jsonに保存"""
+        os.makedirs(os.path.dirname(self.token_path), exist_ok=True)
+        with open(self.token_path, 'w') as token:
+            token.write(creds.to_json())
+        print(f"認証情報を保存しました: {self.token_path}")
+
+    def _needs_refresh(self) -> bool:
+        """保持している認証トークンが有効期限間近か判定"""
+        creds = self.credentials
+        if creds is None or not getattr(creds, 'refresh_token', None) or creds.expiry is None:
+            return False
+        # google-authのexpiryはタイムゾーンなしのUTC
+        return creds.expiry - datetime.utcnow() < TOKEN_REFRESH_MARGIN
+
     def _get_service(self):
-        """Calendar APIサービスを取得"""
-        if not self.service:
-            creds = self._authenticate()
-            self.service = build('calendar', 'v3', credentials=creds)
-        return self.service
+        """
+        Calendar APIサービスを取得
 
-    def get_upcoming_events(self, days: int = 30, calendar_id: str = 'primary') -> List[Dict[str, Any]]:
+        サービスと認証情報はインスタンスに保持して使い回し、トークンは有効期限の
+        直前にのみ更新する。ディスカバリードキュメントはライブラリ同梱のものを使う。
         """
-        今日から指定日数先までの予定を取得
+        with self._auth_lock:
+            if self.service and self._needs_refresh():
+                try:
+                    print("認証トークンを更新中...")
+                    self.credentials.refresh(self._auth_request())
+                    self._save_credentials(self.credentials)
+                except Exception as e:
+                    print(f"トークンの更新に失敗しました: {e}")
+                    # token.jsonからの認証からやり直す
+                    self.service = None
+
+            if not self.service:
+                self.credentials = self._authenticate()
+                self._local = threading.local()
+                client_options = {'api_endpoint': self.api_endpoint} if self.api_endpoint else None
+                self.service = build(
+                    'calendar', 'v3',
+                    credentials=self.credentials,
+                    client_options=client_options,
+                    static_discovery=True,
+                    cache_discovery=False
+                )
+            return self.service
+
+    def _new_batch_http_request(self, service, callback) -> BatchHttpRequest:
+        """
+        バッチリクエストを作成
+
+        ディスカバリードキュメントのバッチURIはエンドポイントの指定に追従しないため、
+        api_endpointを指定している場合はそちらのバッチURIを使う。
+        """
+        if self.api_endpoint:
+            return BatchHttpRequest(
+                callback=callback,
+                batch_uri=self.api_endpoint.rstrip('/') + '/batch/calendar/v3'
+            )
+        return service.new_batch_http_request(callback=callback)
+
+    def _execute(self, request, cost: int = 1) -> Dict[str, Any]:
+        """
+        APIリクエストを実行(スレッドごとのHTTP接続を使用)
+
+        送信前にレート制限のトークンを取得し、レート制限(429・403 rateLimitExceeded)・
+        サーバーエラー(5xx)・通信エラーの場合は指数バックオフで待機して再試行する。
+
+        Args:
+            request: googleapiclientのHttpRequest(またはBatchHttpRequest)
+            cost: 消費するトークン数(バッチリクエストでは含まれるリクエスト数)
+
+        Returns:
+            レスポンス
+        """
+        http = getattr(self._local, 'http', None)
+        if http is None and self.credentials is not None:
+            http = google_auth_httplib2.AuthorizedHttp(self.credentials, http=httplib2.Http())
+            self._local.http = http
+
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                waited = self.rate_limiter.acquire(cost)
+                if waited:
+                    metrics.CALENDAR_API_THROTTLE_SECONDS.inc(waited)
+            try:
+                return request.execute(http=http)
+            except (HttpError, ConnectionError, TimeoutError, socket.timeout) as error:
+                reason = self._retry_reason(error)
+                if reason is None or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt, error)
+                print(f"Calendar APIの一時的なエラー({reason})のため{delay:.1f}秒後に再試行します "
+                      f"({attempt + 1}/{self.max_retries})")
+                metrics.CALENDAR_API_RETRIES.inc(reason=reason)
+                time.sleep(delay)
+
+    def _retry_reason(self, error: Exception) -> Optional[str]:
+        """
+        再試行すれば成功する可能性があるエラーか判定
+
+        Args:
+            error: リクエストで発生した例外
+
+        Returns:
+            再試行する場合はその理由(ログ・メトリクス用)、しない場合はNone
+        """
+        if not isinstance(error, HttpError):
+            # 接続の切断・タイムアウト
+            return type(error).__name__
+
+        status = error.resp.status
+        # 501(未対応の機能)は再試行しても成功しない
+        if status == 429 or (status >= 500 and status != 501):
+            return str(status)
+        if status == 403:
+            # 403は権限エラーの場合もあるため、理由がレート制限のものだけ再試行する
+            try:
+                details = json.loads(error.content).get('error', {}).get('errors', [])
+            except (ValueError, AttributeError):
+                return None
+            for detail in details:
+                if detail.get('reason') in RATE_LIMIT_REASONS:
+                    return detail['reason']
+        return None
+
+    def _backoff_delay(self, attempt: int, error: Exception) -> float:
+        """
+        再試行までの待機時間を計算(指数バックオフ、同時に失敗したスレッドがそろわないよう揺らす)
+
+        Args:
+            attempt: 何回目の再試行か(0始まり)
+            error: 発生した例外(Retry-Afterヘッダーがあればそれ以上待つ)
+
+        Returns:
+            待機時間(秒)
+        """
+        delay = min(MAX_BACKOFF_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt)
+        delay = random.uniform(delay / 2, delay)
+        if isinstance(error, HttpError):
+            try:
+                delay = max(delay, float(error.resp.get('retry-after', 0)))
+            except (TypeError, ValueError):
+                # 日時形式のRetry-Afterは使わない
+                pass
+        return delay
+
+    def _get_time_window(self, days: int) -> Tuple[datetime, datetime]:
+        """
+        取得範囲を計算
 
         Args:
             days: 取得する日数
-            calendar_id: カレンダーID(デフォルトは'primary')
 
         Returns:
-            イベントリスト [{'id': str, 'title': str, 'start': str, 'end': str, 'calendar_id': str}, ...]
+            (今日の開始時刻(00:00:00), 指定日数後の終了時刻(23:59:59))
         """
-        try:
-            service = self._get_service()
+        now = datetime.now(self.timezone).replace(hour=0, minute=0, second=0, microsecond=0)
+        return now, (now + timedelta(days=days)).replace(hour=23, minute=59, second=59)
+
+    def _format_event(self, event: Dict[str, Any], calendar_id: str) -> Event:
+        """
+        APIのイベントを整形(開始・終了時刻はここで一度だけ解析する)
+
+        Args:
+            event: Calendar APIのイベントリソース
+            calendar_id: カレンダーID
+
+        Returns:
+            Event
+        """
+        return Event.from_api(event, calendar_id, self.timezone)
+
+    def _in_window(self, event: Event, time_min: datetime, time_max: datetime) -> bool:
+        """
+        イベントが範囲内にあるか判定(APIのtimeMin/timeMaxと同じく終了>timeMin かつ 開始<timeMax)
+        """
+        return event.end_dt > time_min and event.start_dt < time_max
 
-            # 今日の開始時刻(00:00:00)
-            now = datetime.now(self.timezone).replace(hour=0, minute=0, second=0, microsecond=0)
-            time_min = now.isoformat()
+    def _list_params(self) -> Dict[str, Any]:
+        """events().listで繰り返し予定をどう返させるかのパラメータ"""
+        if self.recurrence is None:
+            return {'singleEvents': True, 'orderBy': 'startTime'}
+        # 親イベントと例外のみを取得する(orderByはsingleEvents=Trueの場合のみ指定できる)
+        return {'singleEvents': False}
 
-            # 指定日数後の終了時刻(23:59:59)
-            time_max = (now + timedelta(days=days)).replace(hour=23, minute=59, second=59).isoformat()
+    def _to_events(self, calendar_id: str, items: List[Dict[str, Any]],
+                   time_min: datetime, time_max: datetime) -> List[Event]:
+        """
+        events().listで取得したイベントリソースを開始時刻順のEventのリストにする
 
-            # イベント取得
-            events_result = service.events().list(
+        Args:
+            calendar_id: カレンダーID
+            items: イベントリソース(_list_paramsで取得したもの)
+            time_min: 取得範囲の開始
+            time_max: 取得範囲の終了
+        """
+        if self.recurrence is not None:
+            return self.recurrence.expand(calendar_id, items, time_min, time_max)
+        return [self._format_event(item, calendar_id) for item in items]
+
+    def _iter_pages(self, service, **params) -> Iterator[Dict[str, Any]]:
+        """
+        events().listの結果をnextPageTokenをたどって1ページずつ返す
+
+        Args:
+            service: Calendar APIサービス
+            **params: events().listのパラメータ(pageTokenを指定した場合はそのページから取得)
+
+        Yields:
+            events().listのレスポンス(最終ページのみnextSyncTokenを含む)
+        """
+        page_token = params.pop('pageToken', None)
+        while True:
+            result = self._execute(service.events().list(
+                pageToken=page_token,
+                maxResults=self.page_size,
+                **params
+            ))
+            yield result
+
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                return
+
+    def _sync_events(self, service, calendar_id: str, time_min: datetime, time_max: datetime) -> List[Event]:
+        """
+        syncTokenを使って前回からの差分のみを取得し、キャッシュに反映する
+
+        保存済みのsyncTokenがない場合、取得範囲がキャッシュ範囲を超えた場合、
+        APIが410 Goneを返した場合はフル同期を行う。
+
+        Args:
+            service: Calendar APIサービス
+            calendar_id: カレンダーID
+            time_min: 取得範囲の開始
+            time_max: 取得範囲の終了
+
+        Returns:
+            取得範囲内のイベントリスト(開始時刻順)
+        """
+        if self.recurrence is not None:
+            return self._sync_recurring_events(service, calendar_id, time_min, time_max)
+
+        def apply_item(cache, item, synced_from, synced_until):
+            if item.get('status') == 'cancelled':
+                cache.pop(item['id'], None)
+                return
+            event = self._format_event(item, calendar_id)
+            if self._in_window(event, synced_from, synced_until):
+                cache[item['id']] = event.to_dict()
+            else:
+                cache.pop(item['id'], None)
+
+        cache = self._sync_cache(
+            service, calendar_id, time_min, time_max,
+            cache_key='events',
+            single_events=True,
+            apply_item=apply_item,
+            # 過去のイベントはキャッシュから削除
+            keep_item=lambda data: parse_event_time(data['end'], self.timezone) > time_min,
+        )
+
+        events = [Event.from_dict(data, self.timezone) for data in cache.values()]
+        upcoming = [event for event in events if self._in_window(event, time_min, time_max)]
+        upcoming.sort(key=lambda e: e.start_dt)
+        return upcoming
+
+    def _sync_recurring_events(self, service, calendar_id: str, time_min: datetime, time_max: datetime) -> List[Event]:
+        """
+        繰り返し予定をローカルで展開する場合の差分同期
+
+        各回ではなく親イベント・例外・単発のイベントのリソースをキャッシュし、範囲内の各回は
+        毎回キャッシュから展開する。キャンセルされた回(例外)は、その回を除くために残す。
+
+        Args:
+            service: Calendar APIサービス
+            calendar_id: カレンダーID
+            time_min: 取得範囲の開始
+            time_max: 取得範囲の終了
+
+        Returns:
+            取得範囲内のイベントリスト(開始時刻順)
+        """
+        def apply_item(cache, item, synced_from, synced_until):
+            if item.get('status') == 'cancelled' and not item.get('recurringEventId'):
+                # 単発の予定・繰り返し予定全体の削除
+                cache.pop(item['id'], None)
+            else:
+                cache[item['id']] = self.recurrence.compact_item(item)
+
+        items = self._sync_cache(
+            service, calendar_id, time_min, time_max,
+            cache_key='items',
+            single_events=False,
+            apply_item=apply_item,
+            # 終了した単発の予定・例外はキャッシュから削除(親イベントは展開に必要なため残す)
+            keep_item=lambda item: item.get('recurrence') or not self._is_past_item(item, time_min),
+        )
+        return self.recurrence.expand(calendar_id, items.values(), time_min, time_max)
+
+    def _sync_cache(self, service, calendar_id: str, time_min: datetime, time_max: datetime,
+                    cache_key: str, single_events: bool,
+                    apply_item: Callable[[Dict[str, Any], Dict[str, Any], datetime, datetime], None],
+                    keep_item: Callable[[Dict[str, Any]], bool]) -> Dict[str, Dict[str, Any]]:
+        """
+        差分同期の共通処理(syncTokenによる差分取得・フル同期・410 Gone時のやり直し・保存)
+
+        Args:
+            service: Calendar APIサービス
+            calendar_id: カレンダーID
+            time_min: 取得範囲の開始
+            time_max: 取得範囲の終了
+            cache_key: 同期状態にキャッシュを保存するキー(展開方法ごとに形式が異なる)
+            single_events: events().listのsingleEvents
+            apply_item: 取得したイベントリソース1件をキャッシュに反映する関数
+                (キャッシュ, リソース, キャッシュ範囲の開始, 終了)
+            keep_item: キャッシュに残すか判定する関数(過去のイベントを除く)
+
+        Returns:
+            キャッシュ {イベントID: 保存形式のデータ}
+        """
+        state = self.sync_store.get(calendar_id)
+        cache = None
+
+        if (state.get('sync_token') and cache_key in state
+                and parse_event_time(state['synced_until'], self.timezone) >= time_max):
+            synced_from = parse_event_time(state['synced_from'], self.timezone)
+            synced_until = parse_event_time(state['synced_until'], self.timezone)
+            cache = dict(state[cache_key])
+            changes = 0
+
+            try:
+                for page in self._iter_pages(
+                    service,
+                    calendarId=calendar_id,
+                    syncToken=state['sync_token'],
+                    singleEvents=single_events
+                ):
+                    # 差分(キャンセルを含む)をキャッシュに反映
+                    for item in page.get('items', []):
+                        changes += 1
+                        apply_item(cache, item, synced_from, synced_until)
+            except HttpError as error:
+                if error.resp.status != 410:
+                    raise
+                # syncTokenが失効した場合はフル同期からやり直す
+                print(f"[{calendar_id}] syncTokenが失効したため、フル同期を行います")
+                self.sync_store.clear(calendar_id)
+                cache = None
+            else:
+                print(f"[{calendar_id}] 差分同期: {changes}件の変更を反映しました")
+
+        if cache is None:
+            # フル同期(取得範囲の先まで余分に取得し、フル同期の頻度を抑える)
+            synced_until = time_max + timedelta(days=SYNC_MARGIN_DAYS)
+            cache = {}
+            for page in self._iter_pages(
+                service,
                 calendarId=calendar_id,
-                timeMin=time_min,
-                timeMax=time_max,
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-
-            events = events_result.get('items', [])
-
-            # イベント情報を整形
-            formatted_events = []
-            for event in events:
-                # 開始時刻の取得(終日イベントと時刻指定イベントに対応)
-                start = event['start'].get('dateTime', event['start'].get('date'))
-                end = event['end'].get('dateTime', event['end'].get('date'))
-
-                formatted_events.append({
-                    'id': event['id'],
-                    'title': event.get('summary', '(タイトルなし)'),
-                    'start': start,
-                    'end': end,
-                    'calendar_id': calendar_id  # どのカレンダーからのイベントか記録
-                })
-
-            print(f"[{calendar_id}] {len(formatted_events)}件のイベントを取得しました")
-            return formatted_events
+                timeMin=time_min.isoformat(),
+                timeMax=synced_until.isoformat(),
+                singleEvents=single_events
+            ):
+                for item in page.get('items', []):
+                    apply_item(cache, item, time_min, synced_until)
+            print(f"[{calendar_id}] フル同期: {len(cache)}件のイベントをキャッシュしました")
+
+        cache = {item_id: value for item_id, value in cache.items() if keep_item(value)}
+        self.sync_store.set(calendar_id, {
+            'sync_token': page.get('nextSyncToken'),
+            'synced_from': time_min.isoformat(),
+            'synced_until': synced_until.isoformat(),
+            cache_key: cache
+        })
+        return cache
+
+    def _is_past_item(self, item: Dict[str, Any], time_min: datetime) -> bool:
+        """イベントリソースが範囲の開始より前に終わっているか(キャンセルされた回は本来の開始の翌日で判定)"""
+        if 'end' in item:
+            end = item['end']
+            margin = timedelta(0)
+        else:
+            end = item.get('originalStartTime', {})
+            margin = timedelta(days=1)
+        value = end.get('dateTime', end.get('date'))
+        return value is not None and parse_event_time(value, self.timezone) + margin <= time_min
+
+    def _fetch_calendars_batch(self, days: int, calendar_ids: List[str]) -> List[Tuple[str, Any]]:
+        """
+        複数カレンダーの1ページ目をバッチリクエストでまとめて取得
+
+        バッチの上限を超える場合は分割して送信する。2ページ目以降があるカレンダーは
+        個別にnextPageTokenをたどって取得する。
+
+        Args:
+            days: 取得する日数
+            calendar_ids: カレンダーIDのリスト
+
+        Returns:
+            [(カレンダーID, イベントリストまたは例外), ...] (calendar_idsと同じ順)
+        """
+        service = self._get_service()
+        time_min, time_max = self._get_time_window(days)
+        params = {
+            'timeMin': time_min.isoformat(),
+            'timeMax': time_max.isoformat(),
+            **self._list_params(),
+        }
+        results = {}
+        next_page_tokens = {}
+        started = time.perf_counter()
+
+        retry_calendar_ids = []
+
+        def callback(request_id, response, exception):
+            calendar_id = calendar_ids[int(request_id)]
+            if exception is not None:
+                results[calendar_id] = exception
+                if self._retry_reason(exception) is not None:
+                    retry_calendar_ids.append(calendar_id)
+                return
+            results[calendar_id] = list(response.get('items', []))
+            if response.get('nextPageToken'):
+                next_page_tokens[calendar_id] = response['nextPageToken']
+
+        for offset in range(0, len(calendar_ids), CALENDAR_BATCH_LIMIT):
+            chunk = calendar_ids[offset:offset + CALENDAR_BATCH_LIMIT]
+            batch = self._new_batch_http_request(service, callback)
+            for index, calendar_id in enumerate(chunk, offset):
+                batch.add(
+                    service.events().list(calendarId=calendar_id, maxResults=self.page_size, **params),
+                    request_id=str(index)
+                )
+            try:
+                self._execute(batch, cost=len(chunk))
+            except Exception as error:
+                # バッチ全体が失敗した場合は、含まれる全カレンダーを失敗扱いにする
+                print(f"バッチリクエスト エラー: {error}")
+                for calendar_id in chunk:
+                    results.setdefault(calendar_id, error)
+
+        # バッチ内でレート制限などにより失敗したカレンダーは、個別に(待機・再試行しながら)取得し直す
+        for calendar_id in retry_calendar_ids:
+            try:
+                results[calendar_id] = [
+                    item
+                    for page in self._iter_pages(service, calendarId=calendar_id, **params)
+                    for item in page.get('items', [])
+                ]
+            except Exception as error:
+                results[calendar_id] = error
+
+        # 2ページ目以降は個別に取得
+        for calendar_id, page_token in next_page_tokens.items():
+            try:
+                for page in self._iter_pages(service, calendarId=calendar_id, pageToken=page_token, **params):
+                    results[calendar_id].extend(page.get('items', []))
+            except Exception as error:
+                results[calendar_id] = error
+
+        # 全ページがそろってからイベントにする(繰り返し予定の展開には親イベントと例外の両方が必要)
+        for calendar_id in calendar_ids:
+            if isinstance(results[calendar_id], list):
+                try:
+                    results[calendar_id] = self._to_events(calendar_id, results[calendar_id], time_min, time_max)
+                except ValueError as error:
+                    results[calendar_id] = error
+
+        # バッチでは個別の所要時間がわからないため、全体の時間を各カレンダーに記録する
+        elapsed = time.perf_counter() - started
+        for calendar_id in calendar_ids:
+            if isinstance(results[calendar_id], list):
+                self._record_fetch(calendar_id, len(results[calendar_id]), elapsed)
+            else:
+                self._record_fetch_error(calendar_id, results[calendar_id])
+        return [(calendar_id, results[calendar_id]) for calendar_id in calendar_ids]
+
+    def iter_upcoming_events(self, days: int = 30, calendar_id: str = 'primary') -> Iterator[Event]:
+        """
+        今日から指定日数先までの予定を開始時刻順に1件ずつ返す
+
+        nextPageTokenをたどって全ページを取得し、1ページ分ずつ整形して返すため、
+        大きなカレンダーでも全イベントを一度にメモリに保持しない。
+        差分同期が有効な場合は、前回のsyncTokenからの変更分のみをAPIから取得する。
+        繰り返し予定をローカルで展開する場合は、全ページを取得してから展開して返す。
+
+        Args:
+            days: 取得する日数
+            calendar_id: カレンダーID(デフォルトは'primary')
+
+        Yields:
+            Event(開始・終了時刻は解析済み)
+        """
+        started = time.perf_counter()
+        try:
+            service = self._get_service()
+            time_min, time_max = self._get_time_window(days)
+
+            if self.sync_store is not None:
+                events = self._sync_events(service, calendar_id, time_min, time_max)
+                yield from events
+                count = len(events)
+            elif self.recurrence is not None:
+                # 繰り返し予定は親イベントと例外のみを取得し、全ページを取得してから展開する
+                items = [
+                    item
+                    for page in self._iter_pages(
+                        service,
+                        calendarId=calendar_id,
+                        timeMin=time_min.isoformat(),
+                        timeMax=time_max.isoformat(),
+                        **self._list_params()
+                    )
+                    for item in page.get('items', [])
+                ]
+                events = self._to_events(calendar_id, items, time_min, time_max)
+                yield from events
+                count = len(events)
+            else:
+                count = 0
+                for page in self._iter_pages(
+                    service,
+                    calendarId=calendar_id,
+                    timeMin=time_min.isoformat(),
+                    timeMax=time_max.isoformat(),
+                    singleEvents=True,
+                    orderBy='startTime'
+                ):
+                    for event in page.get('items', []):
+                        count += 1
+                        yield self._format_event(event, calendar_id)
+
+            self._record_fetch(calendar_id, count, time.perf_counter() - started)
 
         except HttpError as error:
             print(f"Calendar API エラー [{calendar_id}]: {error}")
+            self._record_fetch_error(calendar_id, error)
             raise
         except Exception as error:
             print(f"予期しないエラー [{calendar_id}]: {error}")
+            self._record_fetch_error(calendar_id, error)
             raise
 
-    def get_upcoming_events_from_multiple_calendars(self, days: int = 30, calendar_ids: List[str] = None) -> List[Dict[str, Any]]:
+    def _record_fetch(self, calendar_id: str, count: int, elapsed: float) -> None:
+        """
+        カレンダー1つの取得結果をログとメトリクスに記録
+
+        Args:
+            calendar_id: カレンダーID
+            count: 取得したイベント数
+            elapsed: 取得にかかった時間(秒、逐次取得では呼び出し側の処理時間も含む)
+        """
+        print(f"[{calendar_id}] {count}件のイベントを取得しました")
+        metrics.CALENDAR_FETCH_SECONDS.observe(elapsed, calendar_id=calendar_id)
+        metrics.CALENDAR_EVENTS.set(count, calendar_id=calendar_id)
+        metrics.log('calendar_fetch', calendar_id=calendar_id, events=count, seconds=round(elapsed, 4))
+
+    def _record_fetch_error(self, calendar_id: str, error: Exception) -> None:
+        """カレンダーの取得失敗をメトリクスに記録"""
+        metrics.CALENDAR_FETCH_ERRORS.inc(calendar_id=calendar_id)
+        metrics.log('calendar_fetch_error', calendar_id=calendar_id, error=str(error))
+
+    def get_upcoming_events(self, days: int = 30, calendar_id: str = 'primary') -> List[Event]:
+        """
+        今日から指定日数先までの予定を取得
+
+        Args:
+            days: 取得する日数
+            calendar_id: カレンダーID(デフォルトは'primary')
+
+        Returns:
+            Eventのリスト
+        """
+        return list(self.iter_upcoming_events(days=days, calendar_id=calendar_id))
+
+    def _iter_deduplicated(self, events: Iterable[Event]) -> Iterator[Event]:
+        """
+        複数のカレンダーに共有されている同じ予定(iCalUIDと開始時刻が同じ)を1件にまとめながら返す
+
+        開始時刻順に並んだイベントを前提とし、同じ開始時刻のイベントだけを保持して判定するため、
+        全イベントをメモリに保持しない。同じ開始時刻の中では先に来たカレンダー(calendar_idsの順)の
+        イベントを残し、共有されている全カレンダーIDをcalendar_idsに記録する。
+
+        Args:
+            events: 開始時刻順のイベント
+
+        Yields:
+            重複を除いたEvent
+        """
+        duplicates = 0
+        for _, group in itertools.groupby(events, key=lambda event: event.start_dt):
+            merged = {}
+            for event in group:
+                # 繰り返し予定の各回はiCalUIDが同じなので開始時刻ごとに判定する
+                key = event.ical_uid or f"{event.calendar_id}/{event.id}"
+                first = merged.get(key)
+                if first is None:
+                    merged[key] = event
+                    continue
+                duplicates += 1
+                if event.calendar_id != first.calendar_id:
+                    if first.calendar_ids is None:
+                        first.calendar_ids = [first.calendar_id]
+                    first.calendar_ids.append(event.calendar_id)
+            yield from merged.values()
+
+        if duplicates:
+            print(f"複数のカレンダーで重複している予定を{duplicates}件まとめました")
+
+    def _guard_calendar(self, calendar_id: str, events: Iterable[Event], failed_calendar_ids: List[str]) -> Iterator[Event]:
+        """
+        1カレンダー分のイベントを返し、取得に失敗した場合はそのカレンダーを記録して打ち切る
+
+        エラーが発生しても他のカレンダーの取得は続行する。
+        """
+        try:
+            yield from events
+        except Exception as e:
+            print(f"警告: カレンダー '{calendar_id}' の取得に失敗しました: {e}")
+            failed_calendar_ids.append(calendar_id)
+
+    def _iter_future_result(self, future) -> Iterator[Event]:
+        """スレッドで取得したイベントリストを、取得完了を待ってから1件ずつ返す"""
+        yield from future.result()
+
+    def _get_cached_events(self, calendar_id: str, time_min: datetime, time_max: datetime) -> Optional[List[Event]]:
+        """
+        差分同期のキャッシュから範囲内のイベントを取得(APIは呼び出さない)
+
+        Args:
+            calendar_id: カレンダーID
+            time_min: 範囲の開始
+            time_max: 範囲の終了
+
+        Returns:
+            開始時刻順のEventのリスト(キャッシュが範囲を含まない場合はNone)
+        """
+        if self.sync_store is None:
+            return None
+        state = self.sync_store.get(calendar_id)
+        if not state.get('sync_token'):
+            return None
+        if (parse_event_time(state['synced_from'], self.timezone) > time_min
+                or parse_event_time(state['synced_until'], self.timezone) < time_max):
+            return None
+        # キャッシュの形式が現在の展開方法と異なる場合は取得し直す
+        if ('items' in state) != (self.recurrence is not None):
+            return None
+        if self.recurrence is not None:
+            return self.recurrence.expand(calendar_id, state['items'].values(), time_min, time_max)
+
+        events = [Event.from_dict(data, self.timezone) for data in state['events'].values()]
+        upcoming = [event for event in events if self._in_window(event, time_min, time_max)]
+        upcoming.sort(key=lambda e: e.start_dt)
+        return upcoming
+
+    def _iter_merged_events(self, days: int, calendar_ids: List[str], failed_calendar_ids: List[str],
+                            refresh_calendar_ids: Optional[Iterable[str]] = None) -> Iterator[Event]:
+        """
+        カレンダーごとの開始時刻順のイベントをヒープでk-wayマージし、全体の開始時刻順に返す
+
+        APIはカレンダーごとにorderBy='startTime'で返すため、全件を結合して並べ替える必要はない。
+        逐次取得の場合は各カレンダーの現在のページのみを保持し、先頭のイベントから順に返す。
+
+        Args:
+            days: 取得する日数
+            calendar_ids: カレンダーIDのリスト
+            failed_calendar_ids: 取得に失敗したカレンダーIDを追加するリスト
+            refresh_calendar_ids: APIから取得するカレンダーID(指定時は、それ以外のカレンダーは
+                差分同期のキャッシュを使う。キャッシュがない場合は取得する)
+
+        Yields:
+            Event(開始時刻順、開始時刻が同じ場合はcalendar_idsの順)
+        """
+        streams = {}
+        if refresh_calendar_ids is not None and self.sync_store is not None:
+            refresh_calendar_ids = set(refresh_calendar_ids)
+            time_min, time_max = self._get_time_window(days)
+            for calendar_id in calendar_ids:
+                if calendar_id not in refresh_calendar_ids:
+                    cached = self._get_cached_events(calendar_id, time_min, time_max)
+                    if cached is not None:
+                        streams[calendar_id] = cached
+        fetch_calendar_ids = [calendar_id for calendar_id in calendar_ids if calendar_id not in streams]
+
+        futures = []
+        if self.use_batch and self.sync_store is None:
+            # 全カレンダーのリクエストをバッチにまとめて往復回数を減らす
+            for calendar_id, result in self._fetch_calendars_batch(days, fetch_calendar_ids):
+                if isinstance(result, Exception):
+                    print(f"警告: カレンダー '{calendar_id}' の取得に失敗しました: {result}")
+                    failed_calendar_ids.append(calendar_id)
+                    continue
+                streams[calendar_id] = result
+        elif self.fetch_concurrency > 1 and len(fetch_calendar_ids) > 1:
+            # 認証(初回はブラウザ認証)はスレッドに分ける前に済ませておく
+            self._get_service()
+
+            # カレンダーごとに並列で取得(全体の所要時間は最も遅いカレンダー程度になる)
+            executor = self._get_executor()
+            for calendar_id in fetch_calendar_ids:
+                future = executor.submit(self.get_upcoming_events, days=days, calendar_id=calendar_id)
+                futures.append(future)
+                streams[calendar_id] = self._guard_calendar(
+                    calendar_id, self._iter_future_result(future), failed_calendar_ids
+                )
+        else:
+            for calendar_id in fetch_calendar_ids:
+                streams[calendar_id] = self._guard_calendar(
+                    calendar_id, self.iter_upcoming_events(days=days, calendar_id=calendar_id), failed_calendar_ids
+                )
+
+        try:
+            # heapq.mergeはキーが同じ場合に先に渡したストリームを優先する
+            yield from heapq.merge(
+                *(streams[calendar_id] for calendar_id in calendar_ids if calendar_id in streams),
+                key=lambda event: event.start_dt
+            )
+        finally:
+            # 途中で走査をやめた場合も、実行中の取得が終わるまで待つ
+            wait(futures)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """並列取得用のスレッドプールを取得(初回のみ作成し、closeまで使い回す)"""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.fetch_concurrency, thread_name_prefix='calendar-fetch'
+                )
+            return self._executor
+
+    def close(self) -> None:
+        """並列取得用のスレッドプールを終了(Bot終了時に呼ぶ)"""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def iter_upcoming_events_from_multiple_calendars(self, days: int = 30, calendar_ids: List[str] = None) -> Iterator[Event]:
+        """
+        複数のカレンダーの予定を全体の開始時刻順に1件ずつ返す
+
+        カレンダーごとの結果をk-wayマージするため、全カレンダーを取得し終える前から出力を始められる。
+        取得に失敗したカレンダーは、走査が終わった時点でfailed_calendar_idsに記録される
+        (途中のページで失敗した場合、それまでに返したそのカレンダーのイベントは取り消されない)。
+        そのため、1回の走査で済み、失敗したカレンダーの扱いを呼び出し側で決められる処理(ベンチマークなど)向けで、
+        変更の通知(差分検出の前に失敗したカレンダーを確定し、保存でもう一度走査する)では
+        get_upcoming_events_from_multiple_calendarsを使う。
+
+        Args:
+            days: 取得する日数
+            calendar_ids: カレンダーIDのリスト(デフォルトは['primary'])
+
+        Yields:
+            重複を除いたEvent(開始時刻順)
+        """
+        if calendar_ids is None:
+            calendar_ids = ['primary']
+
+        self.failed_calendar_ids = []
+        yield from self._iter_deduplicated(
+            self._iter_merged_events(days, calendar_ids, self.failed_calendar_ids)
+        )
+
+    def get_upcoming_events_from_multiple_calendars(self, days: int = 30, calendar_ids: List[str] = None,
+                                                    refresh_calendar_ids: Optional[List[str]] = None) -> List[Event]:
         """
         複数のカレンダーから今日から指定日数先までの予定を取得
 
         Args:
             days: 取得する日数
             calendar_ids: カレンダーIDのリスト(デフォルトは['primary'])
+            refresh_calendar_ids: 変更があったカレンダーID(指定時は、それ以外のカレンダーは
+                APIを呼び出さず差分同期のキャッシュを使う)
 
         Returns:
-            全カレンダーのイベントリスト [{'id': str, 'title': str, 'start': str, 'end': str, 'calendar_id': str}, ...]
+            全カレンダーのEventのリスト(開始時刻順)
         """
         if calendar_ids is None:
             calendar_ids = ['primary']
 
-        all_events = []
+        failed_calendar_ids = []
+        all_events = list(self._iter_merged_events(days, calendar_ids, failed_calendar_ids, refresh_calendar_ids))
+        self.failed_calendar_ids = failed_calendar_ids
 
-        for calendar_id in calendar_ids:
-            try:
-                events = self.get_upcoming_events(days=days, calendar_id=calendar_id)
-                all_events.extend(events)
-            except Exception as e:
-                print(f"警告: カレンダー '{calendar_id}' の取得に失敗しました: {e}")
-                # エラーが発生しても他のカレンダーの取得は続行
+        # 途中のページで失敗したカレンダーのイベントは取り除く(重複をまとめる前に除外する)
+        if failed_calendar_ids:
+            failed = set(failed_calendar_ids)
+            all_events = [event for event in all_events if event.calendar_id not in failed]
 
-        # 開始時刻でソート
-        all_events.sort(key=lambda x: x['start'])
+        # 複数のカレンダーに共有されている同じ予定を1件にまとめる(マージ済みのため並べ替えは不要)
+        all_events = list(self._iter_deduplicated(all_events))
 
         print(f"\n合計 {len(all_events)}件のイベントを取得しました (全{len(calendar_ids)}カレンダー)")
         return all_events
+
+    def has_changes(self, calendar_id: str, updated_since: datetime) -> bool:
+        """
+        指定時刻以降にカレンダーのイベントが変更されたか確認
+
+        updatedMinで変更(削除を含む)されたイベントを最大1件だけ、IDのみ取得するため、
+        予定の一覧を取得するより軽い。取得範囲外へ移動した予定も検出できるよう、期間では絞り込まない。
+
+        Args:
+            calendar_id: カレンダーID
+            updated_since: この時刻以降の変更を確認する(タイムゾーン付き)
+
+        Returns:
+            変更があった場合True(確認できない場合もTrue)
+        """
+        service = self._get_service()
+        try:
+            response = self._execute(service.events().list(
+                calendarId=calendar_id,
+                updatedMin=updated_since.isoformat(),
+                showDeleted=True,
+                maxResults=1,
+                fields='items(id)'
+            ))
+        except HttpError as error:
+            if error.resp.status == 410:
+                # updatedMinが古すぎる場合は変更ありとして一覧を取得し直す
+                return True
+            raise
+        return bool(response.get('items'))
+
+    async def ahas_changes(self, calendar_id: str, updated_since: datetime) -> bool:
+        """
+        has_changesの非同期版
+
+        Args:
+            calendar_id: カレンダーID
+            updated_since: この時刻以降の変更を確認する(タイムゾーン付き)
+
+        Returns:
+            変更があった場合True
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.has_changes, calendar_id, updated_since))
+
+    def get_event(self, calendar_id: str, event_id: str) -> Optional[Event]:
+        """
+        イベントを1件取得(取得範囲から消えた予定が削除されたのか、範囲外へ移動したのかの確認用)
+
+        差分同期のキャッシュ(取得範囲より先まで保持し、キャンセルは反映済み)にある場合はAPIを呼ばない。
+
+        Args:
+            calendar_id: カレンダーID
+            event_id: イベントID
+
+        Returns:
+            Event(削除・キャンセルされている場合はNone)
+        """
+        if self.sync_store is not None and self.recurrence is None:
+            cached = self.sync_store.get(calendar_id).get('events', {}).get(event_id)
+            if cached is not None:
+                return Event.from_dict(cached, self.timezone)
+
+        service = self._get_service()
+        try:
+            item = self._execute(service.events().get(calendarId=calendar_id, eventId=event_id))
+        except HttpError as error:
+            if error.resp.status in (404, 410):
+                return None
+            raise
+        if item.get('status') == 'cancelled':
+            return None
+        return self._format_event(item, calendar_id)
+
+    async def aget_event(self, calendar_id: str, event_id: str) -> Optional[Event]:
+        """
+        get_eventの非同期版
+
+        Args:
+            calendar_id: カレンダーID
+            event_id: イベントID
+
+        Returns:
+            Event(削除・キャンセルされている場合はNone)
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.get_event, calendar_id, event_id))
+
+    async def aget_upcoming_events(self, days: int = 30, calendar_id: str = 'primary') -> List[Event]:
+        """
+        get_upcoming_eventsの非同期版
+
+        googleapiclientの同期呼び出しをスレッドで実行し、イベントループをブロックしない。
+
+        Args:
+            days: 取得する日数
+            calendar_id: カレンダーID(デフォルトは'primary')
+
+        Returns:
+            イベントリスト
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(self.get_upcoming_events, days=days, calendar_id=calendar_id)
+        )
+
+    async def aget_upcoming_events_from_multiple_calendars(self, days: int = 30, calendar_ids: List[str] = None,
+                                                           refresh_calendar_ids: Optional[List[str]] = None) -> List[Event]:
+        """
+        get_upcoming_events_from_multiple_calendarsの非同期版
+
+        googleapiclientの同期呼び出しをスレッドで実行し、イベントループをブロックしない。
+
+        Args:
+            days: 取得する日数
+            calendar_ids: カレンダーIDのリスト(デフォルトは['primary'])
+            refresh_calendar_ids: 変更があったカレンダーID(それ以外は差分同期のキャッシュを使う)
+
+        Returns:
+            全カレンダーのイベントリスト
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(
+                self.get_upcoming_events_from_multiple_calendars,
+                days=days, calendar_ids=calendar_ids, refresh_calendar_ids=refresh_calendar_ids
+            )
+        )
+
+    def watch_events(self, calendar_id: str, address: str, channel_id: str, token: Optional[str] = None,
+                     ttl_seconds: Optional[int] = None) -> Dict[str, Any]:
+        """
+        カレンダーの変更通知(プッシュ通知)チャンネルを登録
+
+        Args:
+            calendar_id: カレンダーID
+            address: 通知を受け取るHTTPSのURL
+            channel_id: チャンネルID(一意な文字列)
+            token: 通知に付与される検証用トークン(X-Goog-Channel-Token)
+            ttl_seconds: チャンネルの有効期間(秒、省略時はAPIの既定値)
+
+        Returns:
+            チャンネル情報 {'id': str, 'resourceId': str, 'expiration': str(ミリ秒のUNIX時刻), ...}
+        """
+        body = {'id': channel_id, 'type': 'web_hook', 'address': address}
+        if token:
+            body['token'] = token
+        if ttl_seconds:
+            body['params'] = {'ttl': str(int(ttl_seconds))}
+
+        service = self._get_service()
+        return self._execute(service.events().watch(calendarId=calendar_id, body=body))
+
+    def stop_channel(self, channel_id: str, resource_id: str) -> None:
+        """
+        変更通知チャンネルを停止
+
+        Args:
+            channel_id: チャンネルID
+            resource_id: watch_eventsが返したresourceId
+        """
+        service = self._get_service()
+        self._execute(service.channels().stop(body={'id': channel_id, 'resourceId': resource_id}))
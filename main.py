@@ -1,54 +1,330 @@
+import argparse
 import asyncio
 import os
+import sys
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING
+from urllib.parse import urlparse
+import pytz
+import metrics
 from config import Config
-from google_calendar import GoogleCalendarClient
-from discord_notifier import DiscordNotifier
+from event_diff import EventDiff, compare_fields, exclude_changes
 from event_storage import EventStorage
-from scheduler import DailyScheduler
+from scheduler import Scheduler, ScheduleStateStore
 
-async def daily_notification_task():
-    """毎日実行されるメインタスク"""
+# Google API・Discordのライブラリは読み込みに時間がかかるため、使う処理の中で読み込む
+# (--onceで起動した場合に最初のAPI呼び出しまでの時間を短くする)
+if TYPE_CHECKING:
+    from google_calendar import GoogleCalendarClient
+    from discord_notifier import DiscordNotifier
 
-    print("カレンダーチェックを開始します...")
+# --onceで実行した場合の終了コード
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_CONFIG_ERROR = 2
+EXIT_NOTIFY_FAILED = 3
+EXIT_FETCH_FAILED = 4
 
-    try:
-        # 1. Google Calendarからイベント取得(複数カレンダー対応)
-        calendar = GoogleCalendarClient(
+class CalendarFetchError(Exception):
+    """すべてのカレンダーの取得に失敗した場合の例外(スケジューラーに実行済みとして記録させない)"""
+
+# プロセス全体で使い回すクライアント(認証情報とAPIサービスを実行ごとに作り直さない)
+_calendar_client = None
+
+def get_calendar_client() -> 'GoogleCalendarClient':
+    """プロセス共通のGoogleCalendarClientを取得(初回のみ作成)"""
+    global _calendar_client
+    if _calendar_client is None:
+        from google_calendar import GoogleCalendarClient
+        _calendar_client = GoogleCalendarClient(
             credentials_path=Config.GOOGLE_CREDENTIALS_PATH,
             token_path=Config.GOOGLE_TOKEN_PATH,
-            timezone=Config.TIMEZONE
+            timezone=Config.TIMEZONE,
+            sync_state_path=Config.SYNC_STATE_PATH if Config.INCREMENTAL_SYNC else None,
+            page_size=Config.EVENT_PAGE_SIZE,
+            fetch_concurrency=Config.CALENDAR_FETCH_CONCURRENCY,
+            use_batch=Config.CALENDAR_BATCH_REQUESTS,
+            qps=Config.CALENDAR_API_QPS,
+            burst=Config.CALENDAR_API_BURST,
+            max_retries=Config.CALENDAR_API_MAX_RETRIES,
+            expand_recurrence=Config.EXPAND_RECURRENCE_LOCALLY
         )
-        current_events = calendar.get_upcoming_events_from_multiple_calendars(
-            days=Config.EVENT_FETCH_DAYS,
-            calendar_ids=Config.CALENDAR_IDS
+    return _calendar_client
+
+# プロセス全体で使い回すDiscord通知(ログインとチャンネル取得を通知ごとに行わない)
+_notifier = None
+
+def get_notifier() -> 'DiscordNotifier':
+    """プロセス共通のDiscordNotifierを取得(初回のみ作成)"""
+    global _notifier
+    if _notifier is None:
+        from discord_notifier import DiscordNotifier
+        _notifier = DiscordNotifier(
+            bot_token=Config.DISCORD_BOT_TOKEN,
+            channel_id=Config.DISCORD_CHANNEL_ID,
+            delivery_mode=Config.DISCORD_DELIVERY_MODE,
+            webhook_url=Config.DISCORD_WEBHOOK_URL,
+            use_embeds=Config.DISCORD_USE_EMBEDS
         )
+    return _notifier
 
-        # 2. 新規イベントを検出
-        storage = EventStorage(Config.STORAGE_PATH)
-        new_events = storage.get_new_events(current_events)
+def create_storage():
+    """設定に応じたイベントストレージを作成"""
+    if Config.STORAGE_BACKEND == 'sqlite':
+        from sqlite_storage import SqliteEventStorage
+        return SqliteEventStorage(Config.SQLITE_STORAGE_PATH)
+    return EventStorage(Config.STORAGE_PATH, storage_format=Config.STORAGE_FORMAT)
 
-        # 3. Discord通知(新規イベントがある場合のみ)
-        if new_events:
-            print(f"\n{len(new_events)}件の新規予定が見つかりました:")
-            for event in new_events:
-                print(f"  - {event['title']} ({event['start']})")
+# 通知時刻のジョブと定期確認のジョブが同時に差分検出・保存を行わないようにする
+_check_lock = None
 
-            notifier = DiscordNotifier(
-                bot_token=Config.DISCORD_BOT_TOKEN,
-                channel_id=Config.DISCORD_CHANNEL_ID
-            )
-            await notifier.send_notification(new_events)
+def get_check_lock() -> asyncio.Lock:
+    """差分検出・保存を直列化するロックを取得"""
+    global _check_lock
+    if _check_lock is None:
+        _check_lock = asyncio.Lock()
+    return _check_lock
+
+async def daily_notification_task() -> bool:
+    """
+    予定の変更を確認して通知するメインタスク(通知時刻・定期確認の各ジョブ、--onceから実行)
+
+    Returns:
+        通知をすべて送信できた場合True
+    """
+    async with get_check_lock():
+        return await check_calendar_changes()
+
+async def push_notification_task(calendar_id: str):
+    """プッシュ通知を受けたカレンダーのみをAPIから取得して変更を通知する"""
+    async with get_check_lock():
+        await check_calendar_changes(refresh_calendar_ids=[calendar_id])
+
+# 変更確認(updatedMin)の基準時刻をさかのぼらせる幅(サーバーとの時計のずれで変更を取りこぼさないため)
+POLL_CLOCK_SKEW = timedelta(seconds=30)
+
+def create_calendar_poller(calendar_id: str):
+    """
+    カレンダー1つを確認するジョブの関数を作成(適応ポーリング用)
+
+    前回の確認以降に変更があった場合のみ予定を取得して通知する。
+
+    Returns:
+        変更があった場合にTrueを返す非同期関数
+    """
+    checked_since = None
+
+    async def poll_calendar() -> bool:
+        nonlocal checked_since
+        calendar = get_calendar_client()
+        started_at = datetime.now(pytz.utc)
+        # 初回は基準となる差分検出を行う
+        if checked_since is not None and not await calendar.ahas_changes(calendar_id, checked_since):
+            print(f"[{calendar_id}] 変更はありません")
+            return False
+
+        async with get_check_lock():
+            await check_calendar_changes(refresh_calendar_ids=[calendar_id])
+        checked_since = started_at - POLL_CLOCK_SKEW
+        return True
+
+    return poll_calendar
+
+def print_diff(diff):
+    """検出した変更をログに出力"""
+    print(f"\n予定の変更が見つかりました (追加{len(diff.added)}件・変更{len(diff.updated)}件・削除{len(diff.removed)}件):")
+    for event in diff.added:
+        print(f"  + {event['title']} ({event['start']})")
+    for update in diff.updated:
+        print(f"  * {update['event']['title']} ({update['event']['start']}) 変更: {', '.join(update['changes'])}")
+    for event in diff.removed:
+        print(f"  - {event['title']} ({event['start']})")
+
+def record_diff(diff, calendar_count: int):
+    """差分検出の結果(通知対象で絞り込む前の件数)をメトリクスに記録"""
+    sizes = {'added': len(diff.added), 'updated': len(diff.updated), 'removed': len(diff.removed)}
+    for change_type, size in sizes.items():
+        metrics.DIFF_SIZE.set(size, change_type=change_type)
+        metrics.EVENT_CHANGES.inc(size, change_type=change_type)
+    metrics.log('diff', calendars=calendar_count, **sizes)
+
+async def notify_routes(diff):
+    """
+    変更をルーティング設定の各チャンネルに振り分けて通知(Discordへの接続は全ルートで共有する)
+
+    Args:
+        diff: 全カレンダーの変更
+
+    Returns:
+        いずれかのルートに送信できなかった変更(全ルートに送信できた場合は空のEventDiff)
+    """
+    undelivered = EventDiff()
+    if diff.is_empty:
+        print("予定の変更はありません")
+        return undelivered
+
+    print_diff(diff)
+    notifier = get_notifier()
+    for route in Config.ROUTES:
+        routed = route.filter(diff)
+        if routed.is_empty:
+            continue
+        print(f"[{route.name}] 通知します")
+        undelivered.extend(
+            await notifier.send_changes(routed, channel_id=route.channel_id, webhook_url=route.webhook_url)
+        )
+    return undelivered
+
+async def confirm_removed_events(calendar, diff):
+    """
+    取得範囲から消えた予定が削除されたのか確認する
+
+    取得範囲(EVENT_FETCH_DAYS)の外へ移動しただけの予定は、削除ではなく変更として扱う。
+    一時的なエラーで確認できなかった予定は通知せず、次回の確認で改めて確認する。
+
+    Args:
+        calendar: GoogleCalendarClient
+        diff: 前回からの変更
+
+    Returns:
+        (削除を確認したEventDiff(diff自体を書き換える), 確認できなかった予定のリスト)
+    """
+    if not diff.removed:
+        return diff, []
+
+    results = await asyncio.gather(
+        *(calendar.aget_event(previous['calendar_id'], previous['id']) for previous in diff.removed),
+        return_exceptions=True
+    )
+    removed = []
+    unconfirmed = []
+    moved = 0
+    for previous, event in zip(diff.removed, results):
+        if isinstance(event, Exception):
+            print(f"警告: 予定 '{previous.get('title')}' が削除されたか確認できませんでした(次回改めて確認します): {event}")
+            unconfirmed.append(previous)
+            continue
+        if event is None:
+            removed.append(previous)
+            continue
+        moved += 1
+        changes = compare_fields(previous, event)
+        if changes:
+            diff.updated.append({'event': event, 'previous': previous, 'changes': changes})
+    if moved:
+        print(f"取得範囲の外へ移動した予定が{moved}件ありました(削除ではなく変更として扱います)")
+    diff.removed = removed
+    return diff, unconfirmed
+
+async def check_calendar_changes(refresh_calendar_ids=None):
+    """
+    カレンダーの変更を検出して通知し、現在の予定を保存する
+
+    エラーは呼び出し元(スケジューラー)に伝え、成功した実行のみを最終実行時刻として記録させる。
+
+    Args:
+        refresh_calendar_ids: APIから取得するカレンダーID(指定時は、それ以外のカレンダーは
+            差分同期のキャッシュを使う。Noneの場合は全カレンダーを取得)
+
+    Returns:
+        通知をすべて送信できた場合True(変更がない場合もTrue)
+
+    Raises:
+        CalendarFetchError: すべてのカレンダーの取得に失敗した場合
+    """
+
+    print("カレンダーチェックを開始します...")
+
+    # 1. Google Calendarからイベント取得(複数カレンダー対応、イベントループはブロックしない)
+    #    差分検出の前に取得に失敗したカレンダーを確定させ、保存でも使うため、ストリームではなくリストで受け取る
+    calendar = get_calendar_client()
+    current_events = await calendar.aget_upcoming_events_from_multiple_calendars(
+        days=Config.EVENT_FETCH_DAYS,
+        calendar_ids=Config.CALENDAR_IDS,
+        refresh_calendar_ids=refresh_calendar_ids
+    )
+
+    # 取得に失敗したカレンダーは削除扱いにしないよう、差分検出・保存の対象から外す
+    fetched_calendar_ids = [
+        cid for cid in Config.CALENDAR_IDS if cid not in calendar.failed_calendar_ids
+    ]
+    if not fetched_calendar_ids:
+        raise CalendarFetchError(f"すべてのカレンダーの取得に失敗しました: {', '.join(calendar.failed_calendar_ids)}")
+
+    # 2. 追加・変更・削除されたイベントを検出(全ルート分をまとめて1回だけ行う)
+    storage = create_storage()
+    diff = storage.diff_events(
+        current_events,
+        calendar_ids=fetched_calendar_ids,
+        now=datetime.now(pytz.timezone(Config.TIMEZONE))
+    )
+    diff, unconfirmed = await confirm_removed_events(calendar, diff)
+    record_diff(diff, len(fetched_calendar_ids))
+
+    # 3. Discord通知(変更がある場合のみ)
+    undelivered = EventDiff()
+    if Config.ROUTES:
+        undelivered = await notify_routes(diff)
+    else:
+        diff = diff.only(Config.NOTIFY_CHANGE_TYPES)
+        if not diff.is_empty:
+            print_diff(diff)
+            notifier = get_notifier()
+            undelivered = await notifier.send_changes(diff)
         else:
-            print("新規予定はありません")
+            print("予定の変更はありません")
+    delivered = undelivered.is_empty
+
+    # 4. 現在のイベントを保存(次回比較用)。送信できなかった変更と、削除を確認できなかった予定は、
+    #    次回も検出するよう前回の内容のまま保存する
+    if not delivered:
+        print("送信できなかった変更は次回の確認で通知し直します")
+    undelivered.extend(EventDiff(removed=unconfirmed))
+    if not undelivered.is_empty:
+        current_events = exclude_changes(current_events, undelivered)
+    storage.save_events(current_events, calendar_ids=fetched_calendar_ids)
+    print("イベントデータを保存しました")
+    return delivered
+
+async def run_once() -> int:
+    """
+    変更の確認と通知を1回だけ実行する(systemdタイマーやcronから起動する場合)
 
-        # 4. 現在のイベントを保存(次回比較用)
-        storage.save_events(current_events)
-        print("イベントデータを保存しました")
+    Returns:
+        終了コード(EXIT_OK / EXIT_ERROR / EXIT_CONFIG_ERROR / EXIT_NOTIFY_FAILED / EXIT_FETCH_FAILED)
+    """
+    try:
+        Config.validate()
+        metrics.configure(json_logs=Config.METRICS_JSON_LOGS)
+        os.makedirs('data', exist_ok=True)
+        os.makedirs('credentials', exist_ok=True)
 
+        if not await daily_notification_task():
+            print("\n通知の送信に失敗しました")
+            return EXIT_NOTIFY_FAILED
+        failed_calendar_ids = get_calendar_client().failed_calendar_ids
+        if failed_calendar_ids:
+            print(f"\n取得に失敗したカレンダーがあります: {', '.join(failed_calendar_ids)}")
+            return EXIT_FETCH_FAILED
+        return EXIT_OK
+
+    except CalendarFetchError as e:
+        print(f"\n{e}")
+        return EXIT_FETCH_FAILED
+    except ValueError as e:
+        print(f"\n設定エラー: {e}")
+        print("\n.envファイルを確認してください。")
+        return EXIT_CONFIG_ERROR
     except Exception as e:
-        print(f"エラーが発生しました: {e}")
+        print(f"\n予期しないエラー: {e}")
         import traceback
         traceback.print_exc()
+        return EXIT_ERROR
+    finally:
+        if _notifier is not None:
+            await _notifier.close()
+        if _calendar_client is not None:
+            _calendar_client.close()
 
 async def main():
     """メインエントリーポイント"""
@@ -57,32 +333,81 @@ async def main():
     print("Discord Calendar Bot")
     print("=" * 50)
 
+    receiver = None
+    watch_manager = None
+    metrics_server = None
     try:
         # 設定検証
         Config.validate()
         print("✓ 環境変数の検証が完了しました")
+        metrics.configure(json_logs=Config.METRICS_JSON_LOGS)
 
         # 必要なディレクトリを作成
         os.makedirs('data', exist_ok=True)
         os.makedirs('credentials', exist_ok=True)
         print("✓ 必要なディレクトリを作成しました")
 
-        # スケジューラー起動
-        scheduler = DailyScheduler(
-            target_time=Config.NOTIFICATION_TIME,
-            timezone=Config.TIMEZONE
+        # スケジューラーにジョブを登録(全ジョブを1つのタスクで実行する)
+        scheduler = Scheduler(
+            state_store=ScheduleStateStore(Config.SCHEDULER_STATE_PATH),
+            catch_up=Config.SCHEDULE_CATCH_UP
         )
+        for timezone, times in Config.get_notification_times().items():
+            scheduler.add_daily(f"通知 {timezone}", daily_notification_task, times, timezone=timezone)
+        if Config.POLL_INTERVAL_MINUTES > 0:
+            scheduler.add_interval("定期確認", daily_notification_task, Config.POLL_INTERVAL_MINUTES,
+                                   timezone=Config.TIMEZONE)
+        if Config.ADAPTIVE_POLLING:
+            # カレンダーごとに、変更の頻度に合わせた間隔で確認する
+            for calendar_id in Config.CALENDAR_IDS:
+                scheduler.add_adaptive(
+                    f"確認 {calendar_id}", create_calendar_poller(calendar_id),
+                    Config.POLL_MIN_INTERVAL_MINUTES, Config.POLL_MAX_INTERVAL_MINUTES,
+                    timezone=Config.TIMEZONE
+                )
 
         print(f"✓ 通知時刻: {Config.NOTIFICATION_TIME}")
+        if Config.POLL_INTERVAL_MINUTES > 0:
+            print(f"✓ 定期確認: {Config.POLL_INTERVAL_MINUTES:g}分ごと")
+        if Config.ADAPTIVE_POLLING:
+            print(f"✓ 適応ポーリング: カレンダーごとに{Config.POLL_MIN_INTERVAL_MINUTES:g}〜"
+                  f"{Config.POLL_MAX_INTERVAL_MINUTES:g}分ごと")
+        print(f"✓ Discord送信方式: {Config.DISCORD_DELIVERY_MODE}")
         print(f"✓ タイムゾーン: {Config.TIMEZONE}")
         print(f"✓ 予定取得範囲: 今日から{Config.EVENT_FETCH_DAYS}日間")
+        print(f"✓ 差分同期: {'有効' if Config.INCREMENTAL_SYNC else '無効'}")
+        if Config.EXPAND_RECURRENCE_LOCALLY:
+            print("✓ 繰り返し予定: ローカルで展開")
         print(f"✓ 監視カレンダー: {len(Config.CALENDAR_IDS)}個")
         for i, cal_id in enumerate(Config.CALENDAR_IDS, 1):
             print(f"  {i}. {cal_id}")
         print()
 
-        # 毎日定期実行
-        await scheduler.run_daily(daily_notification_task)
+        # メトリクスの公開(Prometheus形式)
+        if Config.METRICS_PORT:
+            metrics_server = metrics.MetricsServer(host=Config.METRICS_HOST, port=Config.METRICS_PORT)
+            await metrics_server.start()
+
+        # プッシュ通知モード(変更があったカレンダーのみを数秒以内に確認する)
+        if Config.PUSH_NOTIFICATIONS:
+            from push_notifications import PushNotificationReceiver, WatchChannelManager
+            receiver = PushNotificationReceiver(
+                push_notification_task,
+                host=Config.PUSH_LISTEN_HOST,
+                port=Config.PUSH_LISTEN_PORT,
+                path=urlparse(Config.PUSH_WEBHOOK_URL).path or '/',
+                token=Config.PUSH_CHANNEL_TOKEN,
+                debounce_seconds=Config.PUSH_DEBOUNCE_SECONDS
+            )
+            await receiver.start()
+            watch_manager = WatchChannelManager(
+                get_calendar_client(), receiver, Config.PUSH_WEBHOOK_URL, Config.CALENDAR_IDS,
+                ttl_seconds=Config.PUSH_CHANNEL_TTL_SECONDS
+            )
+            await watch_manager.start()
+
+        # 登録したジョブを定期実行
+        await scheduler.run()
 
     except ValueError as e:
         print(f"\n設定エラー: {e}")
@@ -94,6 +419,26 @@ async def main():
         print(f"\n予期しないエラー: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        if watch_manager is not None:
+            await watch_manager.stop()
+        if receiver is not None:
+            await receiver.stop()
+        if _notifier is not None:
+            await _notifier.close()
+        if _calendar_client is not None:
+            _calendar_client.close()
+        if metrics_server is not None:
+            await metrics_server.stop()
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(description='Discord Calendar Bot')
+    parser.add_argument('--once', action='store_true',
+                        help='変更の確認と通知を1回だけ実行して終了する(systemdタイマー・cron用)')
+    return parser.parse_args(argv)
 
 if __name__ == '__main__':
+    if parse_args().once:
+        sys.exit(asyncio.run(run_once()))
     asyncio.run(main())
@@ -0,0 +1,256 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# ヒストグラムの既定のバケット(秒)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    """ラベルをPrometheusのテキスト形式にする"""
+    if not labels:
+        return ''
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+def _format_value(value: float) -> str:
+    """数値をPrometheusのテキスト形式にする"""
+    value = float(value)
+    if value == float('inf'):
+        return '+Inf'
+    return str(int(value)) if value.is_integer() else repr(value)
+
+class _Metric:
+    """メトリクスの共通処理(ラベルごとの値を保持する)"""
+
+    metric_type = ''
+
+    def __init__(self, name: str, documentation: str):
+        """
+        Args:
+            name: メトリクス名
+            documentation: 説明(# HELPに出力)
+        """
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+        # 複数スレッド(カレンダーの並列取得)から更新されるため排他制御する
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        """Prometheusのテキスト形式の行を返す"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        with self._lock:
+            lines.extend(self._samples())
+        return lines
+
+class Counter(_Metric):
+    """増加のみする値(回数・合計)"""
+
+    metric_type = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        """値を増やす"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in self._values.items()]
+
+class Gauge(_Metric):
+    """現在の値(件数など)"""
+
+    metric_type = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        """値を設定"""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in self._values.items()]
+
+class Histogram(_Metric):
+    """値の分布(処理時間など)"""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        Args:
+            name: メトリクス名
+            documentation: 説明
+            buckets: バケットの上限値(昇順)
+        """
+        super().__init__(name, documentation)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, value: float, **labels) -> None:
+        """値を記録"""
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    state['counts'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """withブロックの処理時間を記録"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, state in self._values.items():
+            cumulative = 0
+            for upper, count in zip(self.buckets, state['counts']):
+                cumulative += count
+                bucket_labels = key + (('le', _format_value(upper)),)
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(state['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {state['count']}")
+        return lines
+
+class Registry:
+    """メトリクスをまとめて出力するクラス"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        """メトリクスを登録"""
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """全メトリクスをPrometheusのテキスト形式で出力"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+# カレンダー取得
+CALENDAR_FETCH_SECONDS = REGISTRY.register(Histogram(
+    'calendarbot_calendar_fetch_seconds', 'カレンダー1つの予定取得にかかった時間'))
+CALENDAR_FETCH_ERRORS = REGISTRY.register(Counter(
+    'calendarbot_calendar_fetch_errors_total', 'カレンダーの取得に失敗した回数'))
+CALENDAR_EVENTS = REGISTRY.register(Gauge(
+    'calendarbot_calendar_events', '前回の取得でカレンダーから取得したイベント数'))
+CALENDAR_API_RETRIES = REGISTRY.register(Counter(
+    'calendarbot_calendar_api_retries_total', 'Calendar APIのリクエストを再試行した回数(理由別)'))
+CALENDAR_API_THROTTLE_SECONDS = REGISTRY.register(Counter(
+    'calendarbot_calendar_api_throttle_seconds_total', 'Calendar APIのレート制限(QPS)で待機した合計時間'))
+RECURRENCE_EXPANSIONS = REGISTRY.register(Counter(
+    'calendarbot_recurrence_expansions_total', '繰り返し予定のローカル展開の回数(hit: キャッシュを使用、miss: 展開、error: 解析できず除外)'))
+
+# 差分検出
+EVENT_CHANGES = REGISTRY.register(Counter(
+    'calendarbot_event_changes_total', '検出した変更の件数(種類別)'))
+DIFF_SIZE = REGISTRY.register(Gauge(
+    'calendarbot_diff_size', '前回の差分検出で見つかった変更の件数(種類別)'))
+
+# ストレージ
+STORAGE_SECONDS = REGISTRY.register(Histogram(
+    'calendarbot_storage_seconds', 'イベントデータの読み書きにかかった時間'))
+
+# Discord送信
+DISCORD_SEND_SECONDS = REGISTRY.register(Histogram(
+    'calendarbot_discord_send_seconds', 'Discordへのメッセージ1件の送信にかかった時間'))
+DISCORD_MESSAGES = REGISTRY.register(Counter(
+    'calendarbot_discord_messages_total', 'Discordへの送信結果ごとのメッセージ数'))
+DISCORD_RATE_LIMIT_WAIT_SECONDS = REGISTRY.register(Counter(
+    'calendarbot_discord_rate_limit_wait_seconds_total', 'Discordのレート制限で待機した合計時間'))
+
+# スケジューラー
+SCHEDULER_LATENESS_SECONDS = REGISTRY.register(Histogram(
+    'calendarbot_scheduler_lateness_seconds', '予定時刻から実際にジョブを開始するまでの遅れ',
+    buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 3600.0)))
+SCHEDULER_RUNS = REGISTRY.register(Counter(
+    'calendarbot_scheduler_runs_total', 'ジョブの実行結果ごとの回数'))
+
+# 構造化ログ(JSON)の出力設定
+_json_logs = False
+
+def configure(json_logs: bool = False) -> None:
+    """
+    構造化ログの出力を設定
+
+    Args:
+        json_logs: TrueにするとlogでJSON形式の行を出力する
+    """
+    global _json_logs
+    _json_logs = json_logs
+
+def log(event: str, **fields) -> None:
+    """
+    処理の結果を1行のJSONで出力(configureで有効にした場合のみ)
+
+    Args:
+        event: イベント名 (例: calendar_fetch)
+        fields: 出力する値
+    """
+    if not _json_logs:
+        return
+    record = {'ts': datetime.now(timezone.utc).isoformat(), 'event': event}
+    record.update(fields)
+    print(json.dumps(record, ensure_ascii=False, default=str), flush=True)
+
+class MetricsServer:
+    """/metricsでメトリクスを公開するHTTPサーバー"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 9100, registry: Optional[Registry] = None):
+        """
+        Args:
+            host: 待ち受けアドレス
+            port: 待ち受けポート
+            registry: 公開するメトリクス(省略時はREGISTRY)
+        """
+        self.host = host
+        self.port = port
+        self.registry = registry or REGISTRY
+        self._runner = None
+
+    async def handle_metrics(self, request):
+        from aiohttp import web
+        return web.Response(text=self.registry.render(), content_type='text/plain', charset='utf-8',
+                            headers={'X-Content-Type-Options': 'nosniff'})
+
+    async def start(self) -> None:
+        """HTTPサーバーを起動(aiohttpは公開する場合のみ読み込む)"""
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle_metrics)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        print(f"メトリクスを公開しました (http://{self.host}:{self.port}/metrics)")
+
+    async def stop(self) -> None:
+        """HTTPサーバーを停止"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,234 @@
+import asyncio
+import hmac
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+from aiohttp import web
+
+# 通知の検証に使うヘッダー(Google Calendar APIのプッシュ通知)
+HEADER_CHANNEL_ID = 'X-Goog-Channel-ID'
+HEADER_CHANNEL_TOKEN = 'X-Goog-Channel-Token'
+HEADER_RESOURCE_STATE = 'X-Goog-Resource-State'
+
+# チャンネルの有効期限を確認する間隔(秒)
+RENEW_CHECK_SECONDS = 60
+
+class PushNotificationReceiver:
+    """
+    Google Calendarのプッシュ通知を受け取るHTTPサーバー
+
+    通知はカレンダーごとにまとめ(デバウンス)、最後の通知からdebounce_seconds秒
+    新しい通知がなければon_changeを呼び出す。通知自体には変更内容が含まれないため、
+    on_changeで該当カレンダーの差分を取得する。
+    """
+
+    def __init__(self, on_change: Callable[[str], Awaitable[None]], host: str = '0.0.0.0', port: int = 8080,
+                 path: str = '/calendar/notifications', token: Optional[str] = None,
+                 debounce_seconds: float = 5.0):
+        """
+        Args:
+            on_change: 変更があったカレンダーIDを受け取る非同期関数
+            host: 待ち受けアドレス
+            port: 待ち受けポート
+            path: 通知を受け取るパス
+            token: チャンネル登録時に指定した検証用トークン(一致しない通知は無視する)
+            debounce_seconds: 通知をまとめる待機時間(秒)
+        """
+        self.on_change = on_change
+        self.host = host
+        self.port = port
+        self.path = path
+        self.token = token
+        self.debounce_seconds = debounce_seconds
+        # チャンネルID → カレンダーID
+        self._channels = {}
+        # カレンダーID → デバウンス中のタイマー
+        self._pending = {}
+        # 実行中のon_change(停止時に完了を待つ)
+        self._tasks = set()
+        self._runner = None
+
+    def add_channel(self, channel_id: str, calendar_id: str) -> None:
+        """通知を受け付けるチャンネルを登録"""
+        self._channels[channel_id] = calendar_id
+
+    def remove_channel(self, channel_id: str) -> None:
+        """チャンネルの登録を解除(以降の通知は無視する)"""
+        self._channels.pop(channel_id, None)
+
+    async def handle_notification(self, request: web.Request) -> web.Response:
+        """
+        プッシュ通知を受け取る
+
+        Googleは2xx以外の応答を再送するため、処理は後回しにしてすぐに応答する。
+        """
+        channel_id = request.headers.get(HEADER_CHANNEL_ID)
+        calendar_id = self._channels.get(channel_id)
+        if calendar_id is None:
+            # 再起動前のチャンネルなど、登録していないチャンネルからの通知は無視する
+            print(f"未登録のチャンネルからの通知を無視しました: {channel_id}")
+            return web.Response(status=200)
+
+        if self.token and not hmac.compare_digest(request.headers.get(HEADER_CHANNEL_TOKEN, ''), self.token):
+            print(f"トークンが一致しない通知を拒否しました: {channel_id}")
+            return web.Response(status=403)
+
+        state = request.headers.get(HEADER_RESOURCE_STATE)
+        if state == 'sync':
+            # チャンネル登録直後の確認通知
+            print(f"[{calendar_id}] プッシュ通知の受信を開始しました")
+        else:
+            self._schedule(calendar_id)
+        return web.Response(status=200)
+
+    def _schedule(self, calendar_id: str) -> None:
+        """カレンダーの差分取得を予約(待機中に通知が来たら待ち直す)"""
+        timer = self._pending.pop(calendar_id, None)
+        if timer is not None:
+            timer.cancel()
+        loop = asyncio.get_running_loop()
+        self._pending[calendar_id] = loop.call_later(self.debounce_seconds, self._fire, calendar_id)
+
+    def _fire(self, calendar_id: str) -> None:
+        """デバウンスの待機が終わったカレンダーのon_changeを実行"""
+        self._pending.pop(calendar_id, None)
+        task = asyncio.ensure_future(self._run_on_change(calendar_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_on_change(self, calendar_id: str) -> None:
+        """on_changeを実行(例外はログに出力し、受信は止めない)"""
+        print(f"\n--- [{calendar_id}] プッシュ通知 {datetime.now().strftime('%Y/%m/%d %H:%M:%S')} ---")
+        try:
+            await self.on_change(calendar_id)
+        except Exception as e:
+            print(f"エラーが発生しました: {e}")
+            import traceback
+            traceback.print_exc()
+
+    async def start(self) -> None:
+        """HTTPサーバーを起動"""
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_notification)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        print(f"プッシュ通知の受信を開始しました (http://{self.host}:{self.port}{self.path})")
+
+    async def stop(self) -> None:
+        """HTTPサーバーを停止(予約中の差分取得は破棄し、実行中のものは完了を待つ)"""
+        for timer in self._pending.values():
+            timer.cancel()
+        self._pending.clear()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+class WatchChannelManager:
+    """
+    カレンダーごとのプッシュ通知チャンネルを登録し、有効期限の前に更新するクラス
+
+    チャンネルには有効期限があり自動では延長されないため、期限のrenew_margin前に
+    新しいチャンネルを登録してから古いチャンネルを停止する。
+    """
+
+    def __init__(self, calendar_client, receiver: PushNotificationReceiver, address: str,
+                 calendar_ids: List[str], ttl_seconds: Optional[int] = None,
+                 renew_margin: timedelta = timedelta(hours=1)):
+        """
+        Args:
+            calendar_client: GoogleCalendarClient
+            receiver: 通知を受け取るPushNotificationReceiver
+            address: Googleから到達できる通知先のHTTPS URL
+            calendar_ids: 監視するカレンダーID
+            ttl_seconds: チャンネルの有効期間(秒、省略時はAPIの既定値)
+            renew_margin: 有効期限のどれだけ前に更新するか
+        """
+        self.calendar_client = calendar_client
+        self.receiver = receiver
+        self.address = address
+        self.calendar_ids = calendar_ids
+        self.ttl_seconds = ttl_seconds
+        self.renew_margin = renew_margin
+        # カレンダーID → {'id': チャンネルID, 'resource_id': str, 'expiration': datetime}
+        self.channels = {}
+        self._renew_task = None
+
+    async def _run_sync(self, func, *args, **kwargs):
+        """googleapiclientの同期呼び出しをスレッドで実行"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: func(*args, **kwargs))
+
+    async def watch(self, calendar_id: str) -> None:
+        """
+        カレンダーのチャンネルを登録(既存のチャンネルは新しいチャンネルの登録後に停止)
+
+        Args:
+            calendar_id: カレンダーID
+        """
+        channel_id = str(uuid.uuid4())
+        # 登録直後の確認通知(sync)を受け付けられるよう、先に受信側に登録しておく
+        self.receiver.add_channel(channel_id, calendar_id)
+        try:
+            response = await self._run_sync(
+                self.calendar_client.watch_events, calendar_id, self.address, channel_id,
+                token=self.receiver.token, ttl_seconds=self.ttl_seconds
+            )
+        except Exception:
+            self.receiver.remove_channel(channel_id)
+            raise
+
+        expiration = datetime.fromtimestamp(int(response['expiration']) / 1000, tz=timezone.utc)
+        previous = self.channels.get(calendar_id)
+        self.channels[calendar_id] = {
+            'id': channel_id, 'resource_id': response['resourceId'], 'expiration': expiration
+        }
+        print(f"[{calendar_id}] プッシュ通知チャンネルを登録しました (有効期限: {expiration.astimezone().strftime('%Y/%m/%d %H:%M')})")
+
+        if previous is not None:
+            await self._stop_channel(calendar_id, previous)
+
+    async def _stop_channel(self, calendar_id: str, channel: Dict[str, object]) -> None:
+        """チャンネルを停止(失敗しても期限切れで止まるため警告のみ)"""
+        self.receiver.remove_channel(channel['id'])
+        try:
+            await self._run_sync(self.calendar_client.stop_channel, channel['id'], channel['resource_id'])
+        except Exception as e:
+            print(f"警告: [{calendar_id}] チャンネルの停止に失敗しました: {e}")
+
+    async def _renew_loop(self) -> None:
+        """有効期限が近いチャンネルを定期的に更新"""
+        while True:
+            await asyncio.sleep(RENEW_CHECK_SECONDS)
+            renew_before = datetime.now(timezone.utc) + self.renew_margin
+            for calendar_id in self.calendar_ids:
+                channel = self.channels.get(calendar_id)
+                # 登録に失敗していたカレンダーもここで再登録を試みる
+                if channel is not None and channel['expiration'] > renew_before:
+                    continue
+                try:
+                    await self.watch(calendar_id)
+                except Exception as e:
+                    print(f"警告: [{calendar_id}] プッシュ通知チャンネルの更新に失敗しました: {e}")
+
+    async def start(self) -> None:
+        """全カレンダーのチャンネルを登録し、更新タスクを開始"""
+        for calendar_id in self.calendar_ids:
+            try:
+                await self.watch(calendar_id)
+            except Exception as e:
+                # 登録できなかったカレンダーは定期実行でのみ確認される(更新タスクで再登録を試みる)
+                print(f"警告: [{calendar_id}] プッシュ通知チャンネルを登録できませんでした: {e}")
+        self._renew_task = asyncio.ensure_future(self._renew_loop())
+
+    async def stop(self) -> None:
+        """更新タスクを止め、全チャンネルを停止"""
+        if self._renew_task is not None:
+            self._renew_task.cancel()
+            self._renew_task = None
+        for calendar_id, channel in list(self.channels.items()):
+            await self._stop_channel(calendar_id, channel)
+        self.channels.clear()
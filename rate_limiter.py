@@ -0,0 +1,47 @@
+import threading
+import time
+from typing import Optional
+
+class TokenBucket:
+    """
+    トークンバケットによるレート制限(複数スレッドで共有する)
+
+    トークンは毎秒rate個ずつ最大burst個まで貯まり、リクエストのたびに消費する。
+    足りない場合は先に予約して(残りをマイナスにして)、貯まるまで待機する。
+    予約した順に待機が終わるため、バッチのように一度に多く消費するリクエストも待たされ続けない。
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        """
+        Args:
+            rate: 1秒あたりのリクエスト数
+            burst: 貯められるトークンの上限(省略時はrate、最低1)
+        """
+        if rate <= 0:
+            raise ValueError("rateは0より大きい必要があります")
+        self.rate = rate
+        self.capacity = burst if burst else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """
+        トークンを消費(足りない場合は貯まるまで待機)
+
+        Args:
+            tokens: 消費するトークン数(バッチリクエストでは含まれるリクエスト数)
+
+        Returns:
+            待機した秒数
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            wait_seconds = max(0.0, -self._tokens / self.rate)
+
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+        return wait_seconds
@@ -0,0 +1,202 @@
+import json
+import re
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Any, Dict, Iterable, List, Tuple
+import metrics
+from event_model import Event, parse_event_time
+
+try:
+    from dateutil import tz as dateutil_tz
+    from dateutil.rrule import rrulestr
+except ImportError:
+    dateutil_tz = None
+    rrulestr = None
+
+# 展開結果をキャッシュする際に、取得範囲の先まで余分に展開する日数(日付が変わっても展開し直さない)
+EXPANSION_MARGIN_DAYS = 30
+
+# キャッシュ(同期状態)に残すイベントリソースのフィールド
+ITEM_FIELDS = ('id', 'status', 'summary', 'start', 'end', 'iCalUID',
+               'recurrence', 'recurringEventId', 'originalStartTime')
+
+# RRULEのUNTIL(日付、または日付と時刻)
+UNTIL_PATTERN = re.compile(r'UNTIL=(\d{8})(T\d{6}Z?)?')
+
+def is_available() -> bool:
+    """繰り返し予定を展開できるか(python-dateutilがインストールされているか)"""
+    return rrulestr is not None
+
+def instance_id(master_id: str, original_start: Dict[str, str]) -> str:
+    """
+    繰り返し予定の各回のイベントID(APIがsingleEvents=Trueで返すIDと同じ形式)
+
+    Args:
+        master_id: 繰り返し予定(親イベント)のID
+        original_start: 本来の開始日時({'dateTime': ...} または {'date': ...})
+
+    Returns:
+        {親ID}_{UTCの開始日時 YYYYMMDDTHHMMSSZ}、終日の場合は{親ID}_{YYYYMMDD}
+    """
+    if 'dateTime' in original_start:
+        start = datetime.fromisoformat(original_start['dateTime'].replace('Z', '+00:00'))
+        return f"{master_id}_{start.astimezone(dt_timezone.utc):%Y%m%dT%H%M%SZ}"
+    return f"{master_id}_{original_start['date'].replace('-', '')}"
+
+def _normalize_until(line: str, all_day: bool) -> str:
+    """
+    UNTILの形式を開始日時に合わせる
+
+    dateutilは、開始日時がタイムゾーン付きならUTCのUNTIL、終日(日付のみ)なら日付のUNTILしか受け付けない。
+    """
+    if not line.startswith(('RRULE', 'EXRULE')):
+        return line
+    if all_day:
+        return UNTIL_PATTERN.sub(r'UNTIL=\1', line)
+    return UNTIL_PATTERN.sub(lambda m: f"UNTIL={m.group(1)}{(m.group(2) or 'T235959').rstrip('Z')}Z", line)
+
+class RecurrenceExpander:
+    """
+    繰り返し予定(RRULE)を取得範囲内の各回にローカルで展開するクラス
+
+    APIからはsingleEvents=Falseで親イベントと例外(変更・キャンセルされた回)のみを取得し、
+    各回のイベントはここで作る。親イベントごとの展開結果は、開始・終了・繰り返しルールが
+    変わるまでキャッシュする。
+    """
+
+    def __init__(self, timezone):
+        """
+        Args:
+            timezone: 終日の予定と、タイムゾーンが指定されていない予定に使うタイムゾーン(pytz)
+        """
+        self.timezone = timezone
+        # カレンダーID → {親イベントID: (ルールの内容, 展開した範囲の開始, 終了, 各回のリスト)}
+        self._cache = {}
+        # 複数カレンダーを並列に取得する場合に備えて排他制御する
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def compact_item(item: Dict[str, Any]) -> Dict[str, Any]:
+        """イベントリソースから展開・通知に使うフィールドのみを取り出す(キャッシュを小さくする)"""
+        return {key: item[key] for key in ITEM_FIELDS if key in item}
+
+    def expand(self, calendar_id: str, items: Iterable[Dict[str, Any]],
+               time_min: datetime, time_max: datetime) -> List[Event]:
+        """
+        親イベント・例外・単発のイベントから、範囲内のイベントを作る
+
+        Args:
+            calendar_id: カレンダーID
+            items: singleEvents=Falseで取得したイベントリソース
+            time_min: 範囲の開始
+            time_max: 範囲の終了
+
+        Returns:
+            範囲内のEventのリスト(開始時刻順)。繰り返しルールを解析できない親イベントは、
+            警告を表示してその繰り返し予定のみ除く
+        """
+        masters = {}
+        exceptions = {}
+        events = []
+        for item in items:
+            if item.get('recurrence'):
+                if item.get('status') != 'cancelled':
+                    masters[item['id']] = item
+            elif item.get('recurringEventId') and item.get('originalStartTime'):
+                exceptions[instance_id(item['recurringEventId'], item['originalStartTime'])] = item
+            elif item.get('status') != 'cancelled':
+                events.append(Event.from_api(item, calendar_id, self.timezone))
+
+        cache = self._cache.get(calendar_id, {})
+        new_cache = {}
+        for master_id, master in masters.items():
+            try:
+                entry = self._get_occurrences(master, cache.get(master_id), time_min, time_max)
+            except ValueError as error:
+                # 1件の繰り返し予定のためにカレンダー全体を取得失敗にしない
+                print(f"警告: 繰り返し予定を展開できないため除外します ({calendar_id}): {error}")
+                metrics.RECURRENCE_EXPANSIONS.inc(result='error')
+                metrics.log('recurrence_error', calendar_id=calendar_id, event_id=master_id, error=str(error))
+                continue
+            new_cache[master_id] = entry
+            for occurrence_id, start, end, start_dt, end_dt in entry[3]:
+                # 変更・キャンセルされた回は例外のイベントで置き換える
+                if occurrence_id in exceptions or not (end_dt > time_min and start_dt < time_max):
+                    continue
+                events.append(Event(
+                    id=occurrence_id,
+                    title=master.get('summary', '(タイトルなし)'),
+                    start=start,
+                    end=end,
+                    calendar_id=calendar_id,
+                    timezone=self.timezone,
+                    ical_uid=master.get('iCalUID'),
+                ))
+        # 削除された繰り返し予定のキャッシュは残さない
+        with self._lock:
+            self._cache[calendar_id] = new_cache
+
+        for item in exceptions.values():
+            if item.get('status') != 'cancelled':
+                events.append(Event.from_api(item, calendar_id, self.timezone))
+
+        upcoming = [event for event in events if event.end_dt > time_min and event.start_dt < time_max]
+        upcoming.sort(key=lambda e: e.start_dt)
+        return upcoming
+
+    def _get_occurrences(self, master: Dict[str, Any], cached, time_min: datetime, time_max: datetime) -> Tuple:
+        """親イベントの展開結果を取得(ルールが変わっていなければキャッシュを使う)"""
+        rule_key = json.dumps([master['start'], master['end'], master['recurrence']], sort_keys=True)
+        if cached is not None and cached[0] == rule_key and cached[1] <= time_min and cached[2] >= time_max:
+            metrics.RECURRENCE_EXPANSIONS.inc(result='hit')
+            return cached
+
+        metrics.RECURRENCE_EXPANSIONS.inc(result='miss')
+        expand_until = time_max + timedelta(days=EXPANSION_MARGIN_DAYS)
+        return rule_key, time_min, expand_until, self._expand_master(master, time_min, expand_until)
+
+    def _expand_master(self, master: Dict[str, Any], time_min: datetime,
+                       time_max: datetime) -> List[Tuple[str, str, str, datetime, datetime]]:
+        """
+        親イベントを範囲内の各回に展開
+
+        Returns:
+            [(イベントID, 開始, 終了, 開始datetime, 終了datetime), ...]
+        """
+        start = master['start']
+        all_day = 'dateTime' not in start
+        if all_day:
+            # 終日の予定は日付のみで展開する
+            dtstart = datetime.strptime(start['date'], '%Y-%m-%d')
+            duration = datetime.strptime(master['end']['date'], '%Y-%m-%d') - dtstart
+            after = time_min.astimezone(self.timezone).replace(tzinfo=None) - duration
+            before = time_max.astimezone(self.timezone).replace(tzinfo=None)
+        else:
+            # 夏時間をまたいでも同じ時刻になるよう、予定のタイムゾーンで展開する
+            zone = dateutil_tz.gettz(start.get('timeZone') or self.timezone.zone)
+            dtstart = parse_event_time(start['dateTime'], self.timezone).astimezone(zone)
+            duration = parse_event_time(master['end']['dateTime'], self.timezone) - dtstart
+            after = time_min - duration
+            before = time_max
+
+        lines = [_normalize_until(line, all_day) for line in master['recurrence']]
+        try:
+            rule = rrulestr('\n'.join(lines), dtstart=dtstart, forceset=True)
+            occurrences = rule.between(after, before, inc=True)
+        except (ValueError, TypeError) as error:
+            raise ValueError(f"繰り返しルールを解析できません [{master['id']}]: {error}") from error
+
+        results = []
+        for occurrence in occurrences:
+            end = occurrence + duration
+            if all_day:
+                start_str, end_str = occurrence.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
+                occurrence_id = instance_id(master['id'], {'date': start_str})
+                start_dt, end_dt = self.timezone.localize(occurrence), self.timezone.localize(end)
+            else:
+                start_str, end_str = occurrence.isoformat(), end.isoformat()
+                occurrence_id = instance_id(master['id'], {'dateTime': start_str})
+                # 範囲の判定で毎回タイムゾーンを計算しないよう、UTCで持つ
+                start_dt, end_dt = occurrence.astimezone(dt_timezone.utc), end.astimezone(dt_timezone.utc)
+            results.append((occurrence_id, start_str, end_str, start_dt, end_dt))
+        return results
@@ -0,0 +1,142 @@
+import json
+from typing import List, Dict, Any, Optional
+from event_diff import EventDiff
+
+# 通知できる変更の種類
+CHANGE_TYPES = ('added', 'updated', 'removed')
+
+class Route:
+    """カレンダーの変更をどのチャンネルに通知するかの設定(1チーム分)"""
+
+    def __init__(self, name: str, calendar_ids: List[str], channel_id: Optional[int] = None,
+                 webhook_url: Optional[str] = None, change_types: Optional[List[str]] = None,
+                 include_keywords: Optional[List[str]] = None, exclude_keywords: Optional[List[str]] = None):
+        """
+        Args:
+            name: ルート名(ログ表示用)
+            calendar_ids: 通知対象のカレンダーID
+            channel_id: 通知先チャンネルID(送信方式がclient・restの場合)
+            webhook_url: 通知先Webhook URL(送信方式がwebhookの場合)
+            change_types: 通知する変更の種類(Noneの場合は全種類)
+            include_keywords: タイトルにいずれかを含む予定のみ通知する
+            exclude_keywords: タイトルにいずれかを含む予定は通知しない
+        """
+        self.name = name
+        self.calendar_ids = list(calendar_ids)
+        self._calendar_id_set = set(calendar_ids)
+        self.channel_id = channel_id
+        self.webhook_url = webhook_url
+        self.change_types = list(change_types) if change_types is not None else list(CHANGE_TYPES)
+        self.include_keywords = include_keywords or []
+        self.exclude_keywords = exclude_keywords or []
+
+    def _matches_title(self, title: str) -> bool:
+        """タイトルがキーワードの条件を満たすか判定"""
+        if any(keyword in title for keyword in self.exclude_keywords):
+            return False
+        return not self.include_keywords or any(keyword in title for keyword in self.include_keywords)
+
+    def matches(self, event: Dict[str, Any], previous: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        イベントがこのルートの通知対象か判定
+
+        Args:
+            event: イベント
+            previous: 変更前のイベント(変更の場合、どちらかのタイトルが条件を満たせば対象とする)
+
+        Returns:
+            通知対象の場合True
+        """
+        # 複数カレンダーで重複をまとめた予定は、共有されているいずれかのカレンダーが対象なら通知する
+        calendar_ids = event.get('calendar_ids') or [event.get('calendar_id')]
+        if self._calendar_id_set.isdisjoint(calendar_ids):
+            return False
+
+        titles = [event.get('title', '')]
+        if previous is not None:
+            titles.append(previous.get('title', ''))
+        return any(self._matches_title(title) for title in titles)
+
+    def filter(self, diff: EventDiff) -> EventDiff:
+        """
+        変更からこのルートの通知対象のみを取り出す
+
+        Args:
+            diff: 全カレンダーの変更
+
+        Returns:
+            このルートに通知するEventDiff
+        """
+        return EventDiff(
+            added=[event for event in diff.added if self.matches(event)],
+            updated=[update for update in diff.updated if self.matches(update['event'], update['previous'])],
+            removed=[event for event in diff.removed if self.matches(event)],
+        ).only(self.change_types)
+
+    def __repr__(self) -> str:
+        return f"Route(name={self.name!r}, calendars={len(self.calendar_ids)}, channel_id={self.channel_id!r})"
+
+def load_routes(path: str, default_change_types: Optional[List[str]] = None) -> List[Route]:
+    """
+    ルーティング設定ファイルを読み込む
+
+    ファイルの形式:
+        {"routes": [{"name": "チームA", "channel_id": 123, "calendar_ids": ["..."],
+                     "change_types": ["added"], "include_keywords": ["会議"], "exclude_keywords": ["非公開"]}, ...]}
+
+    Args:
+        path: 設定ファイル(JSON)のパス
+        default_change_types: change_typesを省略したルートで通知する変更の種類
+
+    Returns:
+        ルートのリスト
+
+    Raises:
+        ValueError: ファイルが読めない、または設定が不正な場合
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        raise ValueError(f"ルーティング設定ファイルが見つかりません: {path}")
+    except json.JSONDecodeError as e:
+        raise ValueError(f"ルーティング設定ファイルの形式が正しくありません: {e}")
+
+    items = data.get('routes', []) if isinstance(data, dict) else None
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise ValueError('ルーティング設定ファイルの形式が正しくありません: {"routes": [{...}, ...]}の形式で指定してください')
+
+    routes = []
+    for i, item in enumerate(items, 1):
+        name = item.get('name') or f"route{i}"
+        calendar_ids = item.get('calendar_ids')
+        if not calendar_ids:
+            raise ValueError(f"ルート '{name}' にcalendar_idsが設定されていません")
+
+        channel_id = item.get('channel_id')
+        if channel_id is not None:
+            try:
+                channel_id = int(channel_id)
+            except (ValueError, TypeError):
+                raise ValueError(f"ルート '{name}' のchannel_idは数値である必要があります")
+        if channel_id is None and not item.get('webhook_url'):
+            raise ValueError(f"ルート '{name}' にchannel_idまたはwebhook_urlが設定されていません")
+
+        change_types = item.get('change_types', default_change_types)
+        invalid = [t for t in (change_types or []) if t not in CHANGE_TYPES]
+        if invalid:
+            raise ValueError(f"ルート '{name}' のchange_typesが不正です: {', '.join(invalid)}")
+
+        routes.append(Route(
+            name=name,
+            calendar_ids=calendar_ids,
+            channel_id=channel_id,
+            webhook_url=item.get('webhook_url'),
+            change_types=change_types,
+            include_keywords=item.get('include_keywords'),
+            exclude_keywords=item.get('exclude_keywords'),
+        ))
+
+    if not routes:
+        raise ValueError(f"ルーティング設定ファイルにルートがありません: {path}")
+    return routes
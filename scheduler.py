@@ -1,69 +1,463 @@
 import asyncio
+import heapq
+import itertools
+import random
+import time as time_module
 from datetime import datetime, time, timedelta
-from typing import Callable, Awaitable
+from typing import Callable, Awaitable, List, Optional, Union
 import pytz
+import metrics
+from state_file import JsonStateFile
 
-class DailyScheduler:
-    """毎日指定時刻に処理を実行するスケジューラー"""
+# 1回の待機の上限(秒)。長時間sleepせず、スリープ復帰や時計の変更を検出できるようにする
+MAX_SLEEP_SECONDS = 60
+# 壁時計とモノトニック時計の経過時間の差がこれを超えたら時計のずれとして記録する(秒)
+CLOCK_JUMP_THRESHOLD = 5
 
-    def __init__(self, target_time: str = '07:00', timezone: str = 'Asia/Tokyo'):
+def parse_time(value: str) -> time:
+    """
+    HH:MM形式の時刻を変換
+
+    Args:
+        value: 時刻 (HH:MM形式)
+
+    Returns:
+        time
+    """
+    hour, minute = map(int, value.strip().split(':'))
+    return time(hour=hour, minute=minute)
+
+def localize_wall_time(timezone, date, target_time: time) -> datetime:
+    """
+    日付と時刻をタイムゾーン付きdatetimeに変換(夏時間の切り替えに対応)
+
+    夏時間開始で存在しない時刻は切り替え後の同じ経過時刻(例: 2:30 → 3:30)に、
+    夏時間終了で2回ある時刻は1回目にそろえる。
+
+    Args:
+        timezone: タイムゾーン(pytz)
+        date: 日付
+        target_time: 時刻
+
+    Returns:
+        タイムゾーン付きdatetime
+    """
+    naive = datetime.combine(date, target_time)
+    try:
+        return timezone.localize(naive, is_dst=None)
+    except pytz.NonExistentTimeError:
+        return timezone.normalize(timezone.localize(naive, is_dst=False))
+    except pytz.AmbiguousTimeError:
+        return timezone.localize(naive, is_dst=True)
+
+class ScheduleStateStore:
+    """ジョブごとの最終実行時刻を永続化するクラス(再起動時に実行漏れを検出するため)"""
+
+    def __init__(self, state_path: str = 'data/scheduler_state.json'):
         """
         Args:
-            target_time: 実行時刻 (HH:MM形式)
-            timezone: タイムゾーン
+            state_path: 状態を保存するJSONファイルのパス
+        """
+        self.state_path = state_path
+        self._file = JsonStateFile(state_path, on_corrupt='実行履歴なしとして扱います。')
+
+    def get_last_run(self, name: str) -> Optional[datetime]:
         """
-        hour, minute = map(int, target_time.split(':'))
-        self.target_time = time(hour=hour, minute=minute)
+        ジョブの最終実行時刻を取得
+
+        Args:
+            name: ジョブ名
+
+        Returns:
+            最後に成功した実行の開始時刻(記録がない場合はNone)
+        """
+        value = self._file.load().get(name)
+        return datetime.fromisoformat(value) if value else None
+
+    def set_last_run(self, name: str, run_time: datetime) -> None:
+        """
+        ジョブの最終実行時刻を記録して保存
+
+        Args:
+            name: ジョブ名
+            run_time: 実行の開始時刻(タイムゾーン付き)
+        """
+        self._file.load()[name] = run_time.isoformat()
+        self._file.save()
+
+class AdaptiveInterval:
+    """
+    変更の頻度に合わせて調整する実行間隔
+
+    変更があった場合は最短間隔に戻し、変更がない間は実行のたびにfactor倍ずつ最長間隔まで延ばす。
+    多数のジョブの実行時刻が重ならないよう、間隔には±jitterの揺らぎを加える。
+    """
+
+    def __init__(self, min_interval: timedelta, max_interval: timedelta, factor: float = 2.0, jitter: float = 0.1):
+        """
+        Args:
+            min_interval: 最短間隔
+            max_interval: 最長間隔
+            factor: 変更がなかった場合に間隔を延ばす倍率
+            jitter: 揺らぎの割合(0.1の場合は±10%)
+        """
+        if min_interval <= timedelta(0) or max_interval < min_interval:
+            raise ValueError("実行間隔は 0 < 最短間隔 <= 最長間隔 である必要があります")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self.jitter = jitter
+        self.current = min_interval
+
+    def record(self, changed: bool) -> None:
+        """
+        実行結果を記録して次の間隔を調整
+
+        Args:
+            changed: 変更があった場合True
+        """
+        if changed:
+            self.current = self.min_interval
+        else:
+            self.current = min(self.current * self.factor, self.max_interval)
+
+    def next_delay(self) -> timedelta:
+        """揺らぎを加えた次回までの間隔(揺らぎを加えても最短間隔〜最長間隔に収める)"""
+        delay = self.current * random.uniform(1 - self.jitter, 1 + self.jitter)
+        return max(self.min_interval, min(delay, self.max_interval))
+
+class ScheduledJob:
+    """スケジューラーに登録する1件のジョブ(毎日の指定時刻または一定間隔で実行)"""
+
+    def __init__(self, name: str, callback: Callable[[], Awaitable[None]], timezone: str = 'Asia/Tokyo',
+                 times: Optional[List[str]] = None, interval: Optional[timedelta] = None,
+                 adaptive: Optional[AdaptiveInterval] = None):
+        """
+        Args:
+            name: ジョブ名(ログ表示用)
+            callback: 実行する非同期関数(adaptiveを指定した場合は、変更があったときTrueを返す)
+            timezone: 実行時刻のタイムゾーン
+            times: 毎日の実行時刻のリスト (HH:MM形式)
+            interval: 実行間隔(timesを指定しない場合)
+            adaptive: 変更の頻度に合わせて調整する実行間隔(times・intervalを指定しない場合)
+        """
+        if sum((bool(times), interval is not None, adaptive is not None)) != 1:
+            raise ValueError(f"ジョブ '{name}' には実行時刻・実行間隔・調整間隔のいずれか1つを指定してください")
+        if interval is not None and interval <= timedelta(0):
+            raise ValueError(f"ジョブ '{name}' の実行間隔は0より大きい必要があります")
+
+        self.name = name
+        self.callback = callback
         self.timezone = pytz.timezone(timezone)
+        self.times = sorted(parse_time(t) for t in times) if times else []
+        self.interval = interval
+        self.adaptive = adaptive
+        self.next_run = None
+        # 実行中のタスク(前回の実行が終わっていない場合は重ねて実行しない)
+        self.task = None
 
-    def _get_next_run_time(self) -> datetime:
+    def get_next_run_time(self, now: datetime) -> datetime:
         """
-        次回実行時刻を計算
+        指定時刻より後の次回実行時刻を計算
+
+        Args:
+            now: 基準時刻(タイムゾーン付き)
 
         Returns:
-            次回実行時刻
+            次回実行時刻(ジョブのタイムゾーン)
         """
-        now = datetime.now(self.timezone)
+        if self.adaptive is not None:
+            # 前回の実行が終わった時刻から、調整後の間隔だけ空ける
+            return now.astimezone(pytz.utc) + self.adaptive.next_delay()
 
-        # 今日の実行時刻を生成
-        target_datetime = self.timezone.localize(
-            datetime.combine(now.date(), self.target_time)
-        )
+        if self.interval is not None:
+            # 間隔はUTCで計算する(夏時間の切り替えで間隔がずれないように)
+            now = now.astimezone(pytz.utc)
+            if self.next_run is None:
+                return now + self.interval
+            # 前回の予定時刻から間隔を足していき、実行が遅れた分はまとめて飛ばす
+            next_run = self.next_run + self.interval
+            if next_run <= now:
+                missed = (now - next_run) // self.interval + 1
+                next_run += self.interval * missed
+            return next_run
 
-        # 今日の実行時刻を過ぎている場合は明日に設定
-        if now >= target_datetime:
-            target_datetime += timedelta(days=1)
+        # 今日と明日の実行時刻から、基準時刻より後で最も早いものを選ぶ
+        # (日付ごとにタイムゾーンを当て直すため、夏時間の切り替え日も壁時計どおりに実行される)
+        now = now.astimezone(self.timezone)
+        for days in (0, 1, 2):
+            date = now.date() + timedelta(days=days)
+            for target_time in self.times:
+                target_datetime = localize_wall_time(self.timezone, date, target_time)
+                if target_datetime > now:
+                    return target_datetime
+        raise RuntimeError("次回実行時刻を計算できませんでした")
 
-        return target_datetime
+    def describe(self) -> str:
+        """ジョブの実行条件を表示用の文字列にする"""
+        if self.adaptive is not None:
+            return (f"{self.adaptive.min_interval.total_seconds() / 60:g}〜"
+                    f"{self.adaptive.max_interval.total_seconds() / 60:g}分ごと(変更の頻度で調整)")
+        if self.interval is not None:
+            return f"{self.interval.total_seconds() / 60:g}分ごと"
+        return f"毎日 {', '.join(t.strftime('%H:%M') for t in self.times)} ({self.timezone.zone})"
 
-    async def run_daily(self, callback: Callable[[], Awaitable[None]]) -> None:
+class Scheduler:
+    """
+    複数のジョブを1つのタスクで実行するスケジューラー
+
+    ジョブは次回実行時刻をキーにした最小ヒープで管理し、最も早いジョブの時刻まで待機する。
+    ジョブごとに待機ループを持たないため、ジョブが増えてもタスクは1つで済む。
+
+    待機は最大MAX_SLEEP_SECONDSずつに区切り、そのたびに壁時計を確認するため、
+    ホストのスリープや時計の変更があっても予定の壁時計時刻に実行される。
+    state_storeを指定すると成功した実行の時刻を記録し、停止中に過ぎた実行を起動時に1回だけ行う。
+    """
+
+    def __init__(self, state_store: Optional[ScheduleStateStore] = None, catch_up: bool = True,
+                 max_sleep: float = MAX_SLEEP_SECONDS):
         """
-        毎日指定時刻にコールバック関数を実行
+        Args:
+            state_store: 最終実行時刻の保存先(Noneの場合は記録しない)
+            catch_up: 停止中に過ぎた実行を起動時に行うか
+            max_sleep: 1回の待機の上限(秒)
+        """
+        self.state_store = state_store
+        self.catch_up = catch_up
+        self.max_sleep = max_sleep
+        self._heap = []
+        # 同じ実行時刻のジョブを登録順に並べるための連番
+        self._counter = itertools.count()
+        self._jobs = []
+        # 実行中にジョブが追加されたときに待機を打ち切る
+        self._wakeup = None
+
+    @property
+    def jobs(self) -> List[ScheduledJob]:
+        """登録されているジョブ"""
+        return list(self._jobs)
+
+    def _push(self, job: ScheduledJob, now: datetime) -> None:
+        """次回実行時刻を計算してヒープに追加"""
+        job.next_run = job.get_next_run_time(now)
+        heapq.heappush(self._heap, (job.next_run, next(self._counter), job))
+
+    def add_job(self, job: ScheduledJob) -> ScheduledJob:
+        """
+        ジョブを登録
+
+        Args:
+            job: 登録するジョブ
+
+        Returns:
+            登録したジョブ
+        """
+        self._jobs.append(job)
+        now = datetime.now(pytz.utc)
+
+        last_run = None
+        if self.state_store is not None and job.adaptive is None:
+            last_run = self.state_store.get_last_run(job.name)
+        missed_run = job.get_next_run_time(last_run) if last_run is not None and self.catch_up else None
+        if missed_run is not None and missed_run <= now:
+            # 停止中に過ぎた実行は(何回分あっても)すぐに1回だけ行う
+            print(f"[{job.name}] 停止中に実行されなかった予定({missed_run.strftime('%Y/%m/%d %H:%M')})を実行します")
+            job.next_run = missed_run
+            heapq.heappush(self._heap, (missed_run, next(self._counter), job))
+        else:
+            self._push(job, now)
+
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    def add_daily(self, name: str, callback: Callable[[], Awaitable[None]], times: Union[str, List[str]],
+                  timezone: str = 'Asia/Tokyo') -> ScheduledJob:
+        """
+        毎日指定時刻に実行するジョブを登録
 
         Args:
+            name: ジョブ名
             callback: 実行する非同期関数
+            times: 実行時刻 (HH:MM形式、複数指定可)
+            timezone: 実行時刻のタイムゾーン
+
+        Returns:
+            登録したジョブ
         """
-        print(f"スケジューラーを起動しました (実行時刻: {self.target_time.strftime('%H:%M')})")
+        if isinstance(times, str):
+            times = [times]
+        return self.add_job(ScheduledJob(name, callback, timezone=timezone, times=times))
 
-        while True:
-            # 次回実行時刻を計算
-            next_run = self._get_next_run_time()
-            now = datetime.now(self.timezone)
-            wait_seconds = (next_run - now).total_seconds()
+    def add_interval(self, name: str, callback: Callable[[], Awaitable[None]], minutes: float,
+                     timezone: str = 'Asia/Tokyo') -> ScheduledJob:
+        """
+        一定間隔で実行するジョブを登録
 
-            print(f"次回実行: {next_run.strftime('%Y/%m/%d %H:%M:%S')}")
-            print(f"待機時間: {wait_seconds / 3600:.1f}時間")
+        Args:
+            name: ジョブ名
+            callback: 実行する非同期関数
+            minutes: 実行間隔(分)
+            timezone: ログ表示に使うタイムゾーン
 
-            # 次回実行時刻まで待機
-            await asyncio.sleep(wait_seconds)
+        Returns:
+            登録したジョブ
+        """
+        return self.add_job(ScheduledJob(name, callback, timezone=timezone, interval=timedelta(minutes=minutes)))
+
+    def add_adaptive(self, name: str, callback: Callable[[], Awaitable[bool]], min_minutes: float,
+                     max_minutes: float, timezone: str = 'Asia/Tokyo') -> ScheduledJob:
+        """
+        変更の頻度に合わせて間隔を調整しながら実行するジョブを登録
+
+        コールバックが変更ありを返すと最短間隔に戻り、変更なしが続くと間隔が指数的に延びる。
+
+        Args:
+            name: ジョブ名
+            callback: 実行する非同期関数(変更があった場合にTrueを返す)
+            min_minutes: 最短間隔(分)
+            max_minutes: 最長間隔(分)
+            timezone: ログ表示に使うタイムゾーン
+
+        Returns:
+            登録したジョブ
+        """
+        adaptive = AdaptiveInterval(timedelta(minutes=min_minutes), timedelta(minutes=max_minutes))
+        return self.add_job(ScheduledJob(name, callback, timezone=timezone, adaptive=adaptive))
+
+    async def _run_job(self, job: ScheduledJob) -> None:
+        """
+        ジョブを1回実行(例外はログに出力し、スケジューラーは止めない)
+
+        成功した場合は開始時刻を最終実行時刻として記録する(遅れて実行した予定もこの時刻までに済んだ扱いになる)。
+
+        Args:
+            job: 実行するジョブ
+        """
+        run_time = datetime.now(pytz.utc)
+        print(f"\n--- [{job.name}] {run_time.astimezone(job.timezone).strftime('%Y/%m/%d %H:%M:%S')} ---")
+        changed = False
+        try:
+            changed = await job.callback()
+        except Exception as e:
+            print(f"エラーが発生しました: {e}")
+            import traceback
+            traceback.print_exc()
+            metrics.SCHEDULER_RUNS.inc(job=job.name, result='error')
+        else:
+            metrics.SCHEDULER_RUNS.inc(job=job.name, result='ok')
+            # 調整間隔のジョブは頻繁に実行されるため、実行漏れの記録対象にしない
+            if self.state_store is not None and job.adaptive is None:
+                self.state_store.set_last_run(job.name, run_time)
+
+        if job.adaptive is not None:
+            # 間隔は実行結果で決まるため、終わってから次回実行時刻を決める(エラー時は間隔を延ばす)
+            job.adaptive.record(bool(changed))
+            self._push(job, datetime.now(pytz.utc))
+            if self._wakeup is not None:
+                self._wakeup.set()
+            print(f"[{job.name}] 処理が完了しました (次回実行: {job.next_run.astimezone(job.timezone).strftime('%H:%M:%S')})\n")
+            return
+
+        print(f"[{job.name}] 処理が完了しました\n")
+
+    async def _wait_until(self, run_time: datetime) -> bool:
+        """
+        指定時刻まで待機
+
+        1回の待機はmax_sleep秒までとし、待機のたびに壁時計で残り時間を計算し直す。
+        モノトニック時計と比べて壁時計が大きく進んだ(戻った)場合はスリープ復帰・時計の変更として記録する。
+
+        Returns:
+            指定時刻に達した場合True(ジョブが追加されて待機を打ち切った場合False)
+        """
+        while True:
+            wall_start = datetime.now(pytz.utc)
+            wait_seconds = (run_time - wall_start).total_seconds()
+            if wait_seconds <= 0:
+                return True
 
-            # コールバック関数を実行
-            print(f"\n--- {datetime.now(self.timezone).strftime('%Y/%m/%d %H:%M:%S')} ---")
+            monotonic_start = time_module.monotonic()
             try:
-                await callback()
-            except Exception as e:
-                print(f"エラーが発生しました: {e}")
-                import traceback
-                traceback.print_exc()
+                await asyncio.wait_for(self._wakeup.wait(), timeout=min(wait_seconds, self.max_sleep))
+            except asyncio.TimeoutError:
+                pass
+            else:
+                self._wakeup.clear()
+                return False
 
-            print("処理が完了しました\n")
+            drift = ((datetime.now(pytz.utc) - wall_start).total_seconds()
+                     - (time_module.monotonic() - monotonic_start))
+            if abs(drift) > CLOCK_JUMP_THRESHOLD:
+                print(f"時計のずれを検出しました ({drift:+.0f}秒、スリープ復帰または時刻変更)。次回実行時刻を再確認します")
+
+    async def run(self) -> None:
+        """登録されたジョブを次回実行時刻の順に実行し続ける"""
+        self._wakeup = asyncio.Event()
+        print(f"スケジューラーを起動しました (ジョブ: {len(self._jobs)}件)")
+        for job in self._jobs:
+            print(f"  - {job.name}: {job.describe()} / 次回実行: {job.next_run.strftime('%Y/%m/%d %H:%M:%S')}")
+
+        while True:
+            if not self._heap:
+                # ジョブが登録されるまで待機
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            next_run, _, job = self._heap[0]
+            if not await self._wait_until(next_run):
+                # 待機中に追加されたジョブの方が早い可能性があるため、先頭から見直す
+                continue
+
+            heapq.heappop(self._heap)
+            # 停止中の予定を実行した場合も、予定時刻からの遅れとしてそのまま記録する
+            lateness = (datetime.now(pytz.utc) - next_run).total_seconds()
+            metrics.SCHEDULER_LATENESS_SECONDS.observe(max(lateness, 0.0), job=job.name)
+            metrics.log('scheduler_fire', job=job.name, lateness_seconds=round(lateness, 3))
+            if job.task is not None and not job.task.done():
+                print(f"[{job.name}] 前回の実行が終わっていないため、今回はスキップします")
+                metrics.SCHEDULER_RUNS.inc(job=job.name, result='skipped')
+            else:
+                # 長いジョブが他のジョブの実行時刻を遅らせないよう、別タスクで実行する
+                job.task = asyncio.ensure_future(self._run_job(job))
+                if job.adaptive is not None:
+                    # 次回実行時刻は実行が終わってから決める
+                    continue
+
+            self._push(job, datetime.now(pytz.utc))
+            print(f"[{job.name}] 次回実行: {job.next_run.strftime('%Y/%m/%d %H:%M:%S')}")
+
+class DailyScheduler(Scheduler):
+    """毎日指定時刻に処理を実行するスケジューラー"""
+
+    def __init__(self, target_time: str = '07:00', timezone: str = 'Asia/Tokyo'):
+        """
+        Args:
+            target_time: 実行時刻 (HH:MM形式)
+            timezone: タイムゾーン
+        """
+        super().__init__()
+        self.target_time = parse_time(target_time)
+        self.timezone = pytz.timezone(timezone)
+
+    def _get_next_run_time(self) -> datetime:
+        """
+        次回実行時刻を計算
+
+        Returns:
+            次回実行時刻
+        """
+        job = ScheduledJob('daily', None, timezone=self.timezone.zone,
+                           times=[self.target_time.strftime('%H:%M')])
+        return job.get_next_run_time(datetime.now(self.timezone))
+
+    async def run_daily(self, callback: Callable[[], Awaitable[None]]) -> None:
+        """
+        毎日指定時刻にコールバック関数を実行
+
+        Args:
+            callback: 実行する非同期関数
+        """
+        self.add_daily('daily', callback, self.target_time.strftime('%H:%M'), timezone=self.timezone.zone)
+        await self.run()
@@ -0,0 +1,285 @@
+import json
+import os
+import sqlite3
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Iterable, Optional
+import metrics
+from event_diff import EventDiff, compute_event_hash, compare_fields, is_past_event, match_shared_events
+from event_model import as_dict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    calendar_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    title TEXT,
+    start TEXT,
+    "end" TEXT,
+    data TEXT NOT NULL,
+    hash TEXT,
+    first_seen TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    removed_at TEXT,
+    PRIMARY KEY (calendar_id, id)
+);
+CREATE INDEX IF NOT EXISTS idx_events_start ON events (start);
+CREATE INDEX IF NOT EXISTS idx_events_removed_at ON events (removed_at);
+"""
+
+# 1回のSQLに含めるパラメータ数の上限(SQLiteの既定の上限999より小さくする)
+PARAMS_PER_QUERY = 500
+
+class SqliteEventStorage:
+    """
+    イベントデータをSQLiteに保存し、差分検出を行うクラス
+
+    EventStorageと同じインターフェースを持つ。イベントは(calendar_id, id)をキーに保存し、
+    変更のあった行のみを書き換える。予定から消えたイベントは削除せずremoved_atを記録するため、
+    過去の状態も参照できる。
+    """
+
+    def __init__(self, db_path: str = 'data/events.db'):
+        """
+        Args:
+            db_path: SQLiteデータベースファイルのパス
+        """
+        self.db_path = db_path
+        self._conn = None
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """データベース接続を取得(初回のみテーブルを作成)"""
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(SCHEMA)
+            # 変更検出用のhash列がない古いデータベースには列を追加する
+            columns = {row[1] for row in self._conn.execute('PRAGMA table_info(events)')}
+            if 'hash' not in columns:
+                self._conn.execute('ALTER TABLE events ADD COLUMN hash TEXT')
+        return self._conn
+
+    def _load_current(self, conn: sqlite3.Connection, events: Iterable[Dict[str, Any]]) -> None:
+        """
+        現在のイベントを一時テーブルに読み込む
+
+        Args:
+            conn: データベース接続
+            events: 現在のイベント
+        """
+        conn.execute('DROP TABLE IF EXISTS temp.current_events')
+        conn.execute("""
+            CREATE TEMP TABLE current_events (
+                position INTEGER NOT NULL,
+                calendar_id TEXT NOT NULL,
+                id TEXT NOT NULL,
+                title TEXT,
+                start TEXT,
+                "end" TEXT,
+                data TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                PRIMARY KEY (calendar_id, id)
+            )
+        """)
+        conn.executemany(
+            'INSERT OR REPLACE INTO temp.current_events VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (
+                (
+                    position,
+                    event.get('calendar_id', ''),
+                    event['id'],
+                    event.get('title'),
+                    event.get('start'),
+                    event.get('end'),
+                    json.dumps(as_dict(event), ensure_ascii=False, separators=(',', ':')),
+                    compute_event_hash(event),
+                )
+                for position, event in enumerate(events)
+            )
+        )
+
+    def _scope_condition(self, calendar_ids: Optional[Iterable[str]]) -> tuple:
+        """
+        カレンダーIDで対象を絞り込むSQL条件を作成
+
+        Returns:
+            (SQL条件, パラメータ)
+        """
+        if calendar_ids is None:
+            return '', {}
+        calendar_ids = list(calendar_ids)
+        placeholders = ', '.join(f':scope{i}' for i in range(len(calendar_ids)))
+        return (
+            f' AND calendar_id IN ({placeholders})',
+            {f'scope{i}': calendar_id for i, calendar_id in enumerate(calendar_ids)}
+        )
+
+    def save_events(self, events: Iterable[Dict[str, Any]], calendar_ids: Optional[Iterable[str]] = None) -> None:
+        """
+        現在のイベントを保存(変更・追加・削除のあった行のみを1トランザクションで更新)
+
+        Args:
+            events: イベントリスト [{'id': str, 'title': str, 'start': str, 'end': str, 'calendar_id': str}, ...]
+            calendar_ids: 置き換えるカレンダーID(指定時は他のカレンダーの行は削除扱いにしない)
+        """
+        conn = self._get_connection()
+        now = datetime.now(timezone.utc).isoformat()
+        scope_condition, scope_params = self._scope_condition(calendar_ids)
+
+        with metrics.STORAGE_SECONDS.time(backend='sqlite', operation='write'), conn:
+            self._load_current(conn, events)
+
+            # 追加・変更されたイベントをupsert(内容が同じ行は書き換えない)
+            conn.execute("""
+                INSERT INTO events (calendar_id, id, title, start, "end", data, hash, first_seen, updated_at, removed_at)
+                SELECT calendar_id, id, title, start, "end", data, hash, :now, :now, NULL
+                FROM temp.current_events WHERE true
+                ON CONFLICT (calendar_id, id) DO UPDATE SET
+                    title = excluded.title,
+                    start = excluded.start,
+                    "end" = excluded."end",
+                    data = excluded.data,
+                    hash = excluded.hash,
+                    updated_at = excluded.updated_at,
+                    removed_at = NULL
+                WHERE events.data IS NOT excluded.data OR events.removed_at IS NOT NULL
+            """, {'now': now})
+
+            # 今回存在しなかったイベントを削除済みとして記録
+            conn.execute(f"""
+                UPDATE events SET removed_at = :now
+                WHERE removed_at IS NULL
+                  AND NOT EXISTS (
+                      SELECT 1 FROM temp.current_events c
+                      WHERE c.calendar_id = events.calendar_id AND c.id = events.id
+                  ){scope_condition}
+            """, dict(scope_params, now=now))
+
+            conn.execute('DROP TABLE temp.current_events')
+
+    def load_events(self) -> Dict[str, Dict[str, Any]]:
+        """
+        前回保存したイベント(削除済みを除く)を読み込み
+
+        Returns:
+            イベント辞書 {'カレンダーID/イベントID': {'id': str, 'title': str, 'start': str, 'end': str}, ...}
+        """
+        conn = self._get_connection()
+        with metrics.STORAGE_SECONDS.time(backend='sqlite', operation='read'):
+            rows = conn.execute('SELECT calendar_id, id, data FROM events WHERE removed_at IS NULL ORDER BY start')
+            return {f"{calendar_id}/{event_id}": json.loads(data) for calendar_id, event_id, data in rows}
+
+    def diff_events(self, current_events: Iterable[Dict[str, Any]], calendar_ids: Optional[Iterable[str]] = None,
+                    now: Optional[datetime] = None) -> EventDiff:
+        """
+        前回のイベントと比較して追加・変更・削除されたイベントを抽出
+
+        追加・削除は集合演算のSQLで求め、内容ハッシュが異なる行のみフィールド単位で比較する。
+
+        Args:
+            current_events: 現在のイベント(リストまたはジェネレーター)
+            calendar_ids: 削除の判定対象とするカレンダーID(Noneの場合は全カレンダー)
+            now: 終了済み判定に使う現在時刻(タイムゾーン付き)
+
+        Returns:
+            EventDiff
+        """
+        if now is None:
+            now = datetime.now(timezone.utc).astimezone()
+
+        conn = self._get_connection()
+        scope_condition, scope_params = self._scope_condition(calendar_ids)
+        # 結果は一時テーブル上の位置から元のイベント(Event)を参照して返す
+        current_events = list(current_events)
+
+        with metrics.STORAGE_SECONDS.time(backend='sqlite', operation='read'), conn:
+            self._load_current(conn, current_events)
+
+            added_rows = conn.execute("""
+                SELECT c.position FROM temp.current_events c
+                LEFT JOIN events e ON e.calendar_id = c.calendar_id AND e.id = c.id
+                WHERE e.id IS NULL OR e.removed_at IS NOT NULL
+                ORDER BY c.position
+            """).fetchall()
+
+            updated_rows = conn.execute("""
+                SELECT e.data, c.position FROM temp.current_events c
+                JOIN events e ON e.calendar_id = c.calendar_id AND e.id = c.id
+                WHERE e.removed_at IS NULL AND e.hash IS NOT c.hash
+                ORDER BY c.position
+            """).fetchall()
+
+            removed_rows = conn.execute(f"""
+                SELECT data FROM events
+                WHERE removed_at IS NULL
+                  AND NOT EXISTS (
+                      SELECT 1 FROM temp.current_events c
+                      WHERE c.calendar_id = events.calendar_id AND c.id = events.id
+                  ){scope_condition}
+                ORDER BY start
+            """, scope_params).fetchall()
+
+            conn.execute('DROP TABLE temp.current_events')
+
+        diff = EventDiff(added=[current_events[position] for (position,) in added_rows])
+        for previous_data, position in updated_rows:
+            previous, event = json.loads(previous_data), current_events[position]
+            changes = compare_fields(previous, event)
+            if changes:
+                diff.updated.append({'event': event, 'previous': previous, 'changes': changes})
+        for (data,) in removed_rows:
+            previous = json.loads(data)
+            # 終了して取得範囲から外れただけのイベントは削除扱いにしない
+            if not is_past_event(previous, now):
+                diff.removed.append(previous)
+
+        if diff.added or diff.removed:
+            # 共有された予定をまとめる元のカレンダーが変わっただけの場合は、追加・削除としない
+            removed_uids = {previous.get('ical_uid') for previous in diff.removed}
+            current_by_uid = {}
+            for event in current_events:
+                if event.get('ical_uid') and event.get('ical_uid') in removed_uids:
+                    current_by_uid.setdefault(event.get('ical_uid'), []).append(event)
+            added_uids = {event.get('ical_uid') for event in diff.added if event.get('ical_uid')}
+            match_shared_events(diff, current_by_uid, self._load_by_uid(conn, added_uids))
+        return diff
+
+    def _load_by_uid(self, conn: sqlite3.Connection, ical_uids: Iterable[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        指定したiCalUIDの保存済みイベント(削除済みを除く)を読み込み
+
+        Returns:
+            {iCalUID: [event, ...]}
+        """
+        ical_uids = list(ical_uids)
+        events = {}
+        for offset in range(0, len(ical_uids), PARAMS_PER_QUERY):
+            chunk = ical_uids[offset:offset + PARAMS_PER_QUERY]
+            rows = conn.execute(
+                f"SELECT data FROM events WHERE removed_at IS NULL "
+                f"AND json_extract(data, '$.ical_uid') IN ({', '.join('?' * len(chunk))})",
+                chunk
+            )
+            for (data,) in rows:
+                event = json.loads(data)
+                events.setdefault(event['ical_uid'], []).append(event)
+        return events
+
+    def get_new_events(self, current_events: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        前回のイベントと比較して新規追加されたイベントのみを抽出
+
+        Args:
+            current_events: 現在のイベント(リストまたはジェネレーター、1回だけ走査する)
+
+        Returns:
+            新規イベントリスト(current_eventsと同じ順)
+        """
+        return self.diff_events(current_events).added
+
+    def close(self) -> None:
+        """データベース接続をクローズ"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
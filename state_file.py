@@ -0,0 +1,94 @@
+import json
+import os
+import tempfile
+from typing import Any, Dict, Optional
+
+def write_atomic(path: str, raw: bytes) -> None:
+    """
+    一時ファイルに書き込んでからリネームで置き換える
+
+    書き込み途中でクラッシュしても、既存のファイルは壊れない。
+
+    Args:
+        path: 保存先のパス
+        raw: 書き込む内容
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(raw)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    # リネーム自体を永続化するためにディレクトリもfsyncする(POSIXのみ)
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+class JsonStateFile:
+    """
+    JSONファイルに保存する状態(同期状態・スケジューラーの実行履歴など)
+
+    初回のみファイルから読み込み、以降はメモリ上の辞書を更新してsaveで書き込む。
+    破損している場合は警告を表示して空の状態から始める。
+    """
+
+    def __init__(self, path: str, on_corrupt: str = '空の状態として扱います。'):
+        """
+        Args:
+            path: JSONファイルのパス
+            on_corrupt: 破損していた場合に警告に続けて表示する説明
+        """
+        self.path = path
+        self.on_corrupt = on_corrupt
+        self._data: Optional[Dict[str, Any]] = None
+
+    def load(self) -> Dict[str, Any]:
+        """状態を取得(初回のみファイルから読み込む)"""
+        if self._data is not None:
+            return self._data
+
+        self._data = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (ValueError, UnicodeDecodeError):
+                # json.JSONDecodeErrorもValueErrorのサブクラス
+                data = None
+            if isinstance(data, dict):
+                self._data = data
+            else:
+                print(f"警告: {self.path}が破損しています。{self.on_corrupt}")
+        return self._data
+
+    def save(self) -> None:
+        """状態をファイルに書き込む(一時ファイルから置き換える)"""
+        write_atomic(self.path, json.dumps(self.load(), ensure_ascii=False).encode('utf-8'))
+
+    def replace(self, data: Dict[str, Any]) -> None:
+        """
+        状態全体を置き換えて書き込む
+
+        Args:
+            data: 新しい状態
+        """
+        self._data = data
+        self.save()
+
+    def remove(self) -> None:
+        """状態を空にしてファイルを削除"""
+        self._data = {}
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,76 @@
+import os
+import threading
+from typing import Dict, Any
+from urllib.parse import quote
+from state_file import JsonStateFile
+
+class SyncStateStore:
+    """
+    カレンダーごとの同期状態(syncToken・イベントキャッシュ)を永続化するクラス
+
+    カレンダーごとに別のファイルに保存するため、1つのカレンダーを更新しても
+    他のカレンダーの状態は書き直さない。
+    """
+
+    def __init__(self, state_path: str = 'data/sync_state'):
+        """
+        Args:
+            state_path: 同期状態を保存するディレクトリのパス
+                (以前の形式の「.json」で終わるパスは、拡張子を除いたディレクトリとして扱う)
+        """
+        if state_path.endswith('.json'):
+            state_path = state_path[:-len('.json')]
+        self.state_path = state_path
+        self._files: Dict[str, JsonStateFile] = {}
+        # 同じカレンダーの読み書きのみ排他制御する(別のカレンダーは並列に保存できる)
+        self._locks: Dict[str, threading.RLock] = {}
+        self._locks_lock = threading.Lock()
+
+    def _get_file(self, calendar_id: str):
+        """カレンダーの状態ファイルと、その排他制御用のロックを取得"""
+        with self._locks_lock:
+            if calendar_id not in self._files:
+                # カレンダーIDには「@」や「#」が含まれるため、ファイル名に使える形にする
+                path = os.path.join(self.state_path, quote(calendar_id, safe='') + '.json')
+                # 破損している場合はフル同期からやり直す
+                self._files[calendar_id] = JsonStateFile(path, on_corrupt='フル同期を行います。')
+                self._locks[calendar_id] = threading.RLock()
+            return self._files[calendar_id], self._locks[calendar_id]
+
+    def get(self, calendar_id: str) -> Dict[str, Any]:
+        """
+        カレンダーの同期状態を取得
+
+        Args:
+            calendar_id: カレンダーID
+
+        Returns:
+            同期状態 {'sync_token': str, 'synced_from': str, 'synced_until': str, 'events': {event_id: event}}
+            未同期の場合は空辞書
+        """
+        state_file, lock = self._get_file(calendar_id)
+        with lock:
+            return state_file.load()
+
+    def set(self, calendar_id: str, state: Dict[str, Any]) -> None:
+        """
+        カレンダーの同期状態を更新して保存
+
+        Args:
+            calendar_id: カレンダーID
+            state: 同期状態
+        """
+        state_file, lock = self._get_file(calendar_id)
+        with lock:
+            state_file.replace(state)
+
+    def clear(self, calendar_id: str) -> None:
+        """
+        カレンダーの同期状態を破棄(410 Gone時のフル再同期用)
+
+        Args:
+            calendar_id: カレンダーID
+        """
+        state_file, lock = self._get_file(calendar_id)
+        with lock:
+            state_file.remove()
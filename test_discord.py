@@ -46,9 +46,15 @@ async def main():
         # Discord通知を送信
         notifier = DiscordNotifier(
             bot_token=Config.DISCORD_BOT_TOKEN,
-            channel_id=Config.DISCORD_CHANNEL_ID
+            channel_id=Config.DISCORD_CHANNEL_ID,
+            delivery_mode=Config.DISCORD_DELIVERY_MODE,
+            webhook_url=Config.DISCORD_WEBHOOK_URL,
+            use_embeds=Config.DISCORD_USE_EMBEDS
         )
-        await notifier.send_notification(test_events)
+        try:
+            await notifier.send_notification(test_events)
+        finally:
+            await notifier.close()
 
         print()
         print("=" * 60)
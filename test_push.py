@@ -0,0 +1,76 @@
+"""
+プッシュ通知受信テストスクリプト
+
+Googleに登録せずに、ローカルで受信サーバーを起動して疑似的な通知を送信し、
+デバウンス(続けて届いた通知をまとめる)と通知の検証が動作するか確認できます。
+"""
+
+import asyncio
+import aiohttp
+from push_notifications import (
+    PushNotificationReceiver, HEADER_CHANNEL_ID, HEADER_CHANNEL_TOKEN, HEADER_RESOURCE_STATE
+)
+
+HOST = '127.0.0.1'
+PORT = 18080
+PATH = '/calendar/notifications'
+TOKEN = 'test-token'
+DEBOUNCE_SECONDS = 1.0
+
+async def send_ping(session: aiohttp.ClientSession, channel_id: str, state: str = 'exists',
+                    token: str = TOKEN) -> int:
+    """Googleのプッシュ通知と同じヘッダーで疑似的な通知を送信"""
+    headers = {
+        HEADER_CHANNEL_ID: channel_id,
+        HEADER_CHANNEL_TOKEN: token,
+        HEADER_RESOURCE_STATE: state,
+    }
+    async with session.post(f"http://{HOST}:{PORT}{PATH}", headers=headers) as response:
+        return response.status
+
+async def main():
+    print("=" * 60)
+    print("プッシュ通知 受信テスト")
+    print("=" * 60)
+    print()
+
+    changes = []
+
+    async def on_change(calendar_id: str):
+        changes.append(calendar_id)
+        print(f"  → 差分取得: {calendar_id}")
+
+    receiver = PushNotificationReceiver(
+        on_change, host=HOST, port=PORT, path=PATH, token=TOKEN, debounce_seconds=DEBOUNCE_SECONDS
+    )
+    receiver.add_channel('channel-a', 'calendar-a')
+    receiver.add_channel('channel-b', 'calendar-b')
+    await receiver.start()
+
+    try:
+        async with aiohttp.ClientSession() as session:
+            print("\n登録直後の確認通知(sync)を送信中...")
+            await send_ping(session, 'channel-a', state='sync')
+
+            print("calendar-aに5回、calendar-bに1回通知を送信中...")
+            for _ in range(5):
+                await send_ping(session, 'channel-a')
+            await send_ping(session, 'channel-b')
+
+            print("トークンが異なる通知を送信中...")
+            rejected = await send_ping(session, 'channel-a', token='wrong')
+
+            await asyncio.sleep(DEBOUNCE_SECONDS + 0.5)
+
+        print()
+        ok = sorted(changes) == ['calendar-a', 'calendar-b'] and rejected == 403
+        if ok:
+            print("✓ 通知はカレンダーごとに1回の差分取得にまとめられました")
+            print("✓ トークンが異なる通知は拒否されました")
+        else:
+            print(f"✗ 想定と異なる結果です: 差分取得={changes}, 不正な通知の応答={rejected}")
+    finally:
+        await receiver.stop()
+
+if __name__ == '__main__':
+    asyncio.run(main())
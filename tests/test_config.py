@@ -0,0 +1,31 @@
+"""設定の検証のテスト"""
+
+import pytest
+from config import Config
+
+@pytest.fixture
+def config(monkeypatch):
+    monkeypatch.setattr(Config, 'DISCORD_DELIVERY_MODE', 'rest')
+    monkeypatch.setattr(Config, 'DISCORD_BOT_TOKEN', 'token')
+    monkeypatch.setattr(Config, 'DISCORD_CHANNEL_ID', '1')
+    monkeypatch.setattr(Config, 'ROUTES_PATH', None)
+    monkeypatch.setattr(Config, 'PUSH_NOTIFICATIONS', False)
+    monkeypatch.setattr(Config, 'ADAPTIVE_POLLING', False)
+    monkeypatch.setattr(Config, 'INCREMENTAL_SYNC', False)
+    monkeypatch.setattr(Config, 'NOTIFY_CHANGE_TYPES', ['added', 'updated', 'removed'])
+    return Config
+
+def test_valid_config(config):
+    config.validate()
+
+def test_unknown_change_type_is_rejected(config):
+    config.NOTIFY_CHANGE_TYPES = ['added', 'deleted']
+    with pytest.raises(ValueError, match='NOTIFY_CHANGE_TYPES'):
+        config.validate()
+
+def test_adaptive_polling_requires_incremental_sync(config):
+    config.ADAPTIVE_POLLING = True
+    with pytest.raises(ValueError, match='INCREMENTAL_SYNC'):
+        config.validate()
+    config.INCREMENTAL_SYNC = True
+    config.validate()
@@ -0,0 +1,66 @@
+"""Discordのサイズ制限に合わせたメッセージ分割のテスト"""
+
+import pytest
+import discord_notifier
+from discord_notifier import (
+    DiscordNotifier, EMBED_DESCRIPTION_MAX_LENGTH, EMBED_TOTAL_MAX_LENGTH, EMBEDS_PER_MESSAGE, MESSAGE_MAX_LENGTH,
+)
+
+HEADER = "📅 **新しい予定が追加されました**\n"
+
+def make_notifier(use_embeds):
+    return DiscordNotifier(None, None, delivery_mode='webhook', webhook_url='http://127.0.0.1/webhook',
+                           use_embeds=use_embeds)
+
+def make_lines(count, length=60):
+    return [f"• **予定{i}** - " + 'x' * (length - len(f"• **予定{i}** - ")) for i in range(count)]
+
+def contents_lines(payloads):
+    lines = "\n".join(payload['content'] for payload in payloads).split("\n")
+    assert lines[:2] == [HEADER.rstrip("\n"), '']
+    return lines[2:]
+
+def embeds_lines(payloads):
+    return "\n".join(embed['description'] for payload in payloads for embed in payload['embeds']).split("\n")
+
+def test_content_messages_stay_within_limit_and_keep_every_line():
+    lines = make_lines(300)
+    payloads = make_notifier(use_embeds=False)._build_payloads("📅", "新しい予定が追加されました", lines)
+
+    assert len(payloads) > 1
+    assert all(len(payload['content']) <= MESSAGE_MAX_LENGTH for payload in payloads)
+    assert payloads[0]['content'].startswith(HEADER)
+    assert contents_lines(payloads) == lines
+
+def test_embeds_stay_within_description_count_and_total_limits():
+    lines = make_lines(1000, length=100)
+    payloads = make_notifier(use_embeds=True)._build_payloads("📅", "新しい予定が追加されました", lines)
+
+    assert len(payloads) > 1
+    for payload in payloads:
+        embeds = payload['embeds']
+        assert len(embeds) <= EMBEDS_PER_MESSAGE
+        assert all(len(embed['description']) <= EMBED_DESCRIPTION_MAX_LENGTH for embed in embeds)
+        assert sum(len(embed['description']) + len(embed.get('title', '')) for embed in embeds) <= EMBED_TOTAL_MAX_LENGTH
+    # 見出しは最初のEmbedのみ
+    assert [embed.get('title') for payload in payloads for embed in payload['embeds']][:2] == \
+        ["📅 新しい予定が追加されました", None]
+    assert embeds_lines(payloads) == lines
+
+def test_embeds_per_message_limit(monkeypatch):
+    # 説明文を短くして、合計文字数より先にEmbed数の上限に達するようにする
+    monkeypatch.setattr(discord_notifier, 'EMBED_DESCRIPTION_MAX_LENGTH', 100)
+    lines = make_lines(50, length=90)
+    payloads = make_notifier(use_embeds=True)._build_payloads("📅", "新しい予定が追加されました", lines)
+
+    assert [len(payload['embeds']) for payload in payloads] == [10, 10, 10, 10, 10]
+    assert embeds_lines(payloads) == lines
+
+@pytest.mark.parametrize('use_embeds, limit', [(False, MESSAGE_MAX_LENGTH), (True, EMBED_DESCRIPTION_MAX_LENGTH)])
+def test_line_over_limit_is_truncated_not_dropped(use_embeds, limit):
+    lines = ['前', 'y' * (limit + 500), '後']
+    payloads = make_notifier(use_embeds)._build_payloads("📅", "新しい予定が追加されました", lines)
+
+    sent = embeds_lines(payloads) if use_embeds else contents_lines(payloads)
+    assert sent[0] == '前' and sent[2] == '後'
+    assert sent[1] == 'y' * (limit - 1) + '…'
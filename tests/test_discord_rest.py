@@ -0,0 +1,52 @@
+"""Discord REST APIへの送信(レート制限の再送)のテスト"""
+
+import asyncio
+from types import SimpleNamespace
+import pytest
+from aiohttp import web
+import discord_rest
+from discord_rest import DiscordRestClient
+
+async def post_with_responses(responses, monkeypatch):
+    """responsesを順番に返すサーバーに1回送信し、(待機した秒数, リクエスト数)を返す"""
+    waits = []
+
+    async def record_sleep(seconds):
+        waits.append(seconds)
+
+    # 送信側の待機のみを記録する(aiohttp内部の待機はそのまま)
+    monkeypatch.setattr(discord_rest, 'asyncio', SimpleNamespace(sleep=record_sleep, TimeoutError=asyncio.TimeoutError))
+    requests = []
+
+    async def handler(request):
+        requests.append(request)
+        return responses[min(len(requests), len(responses)) - 1]()
+
+    app = web.Application()
+    app.router.add_post('/webhook', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    client = DiscordRestClient(webhook_url=f"http://127.0.0.1:{port}/webhook")
+    try:
+        await client.execute_webhook({'content': 'テスト'})
+    finally:
+        await client.close()
+        await runner.cleanup()
+    return waits, len(requests)
+
+@pytest.mark.parametrize('response, expected_wait', [
+    (lambda: web.json_response({'retry_after': 0.25}, status=429), 0.25),
+    # プロキシなどが返す、ボディが空・JSONでない429
+    (lambda: web.Response(status=429, headers={'Retry-After': '2'}), 2.0),
+    (lambda: web.Response(status=429, text='<html>Too Many Requests</html>',
+                          headers={'X-RateLimit-Reset-After': '0.5'}), 0.5),
+    (lambda: web.Response(status=429, text='[]'), 1.0),
+])
+def test_429_waits_and_retries(response, expected_wait, monkeypatch):
+    waits, request_count = asyncio.run(post_with_responses([response, lambda: web.Response(status=204)], monkeypatch))
+    assert waits == [expected_wait]
+    assert request_count == 2
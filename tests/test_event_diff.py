@@ -0,0 +1,153 @@
+"""差分検出(追加・変更・削除)のテスト"""
+
+import asyncio
+from datetime import datetime
+import pytest
+import pytz
+from event_diff import EventDiff, compute_event_hash, diff_events, event_key, exclude_changes
+from event_storage import EventStorage
+import main
+from sqlite_storage import SqliteEventStorage
+
+TOKYO = pytz.timezone('Asia/Tokyo')
+NOW = TOKYO.localize(datetime(2026, 10, 18, 9, 0))
+
+def make_event(event_id, title='会議', day=20, calendar_id='a@example.com'):
+    return {
+        'id': event_id,
+        'title': title,
+        'start': f'2026-10-{day:02d}T10:00:00+09:00',
+        'end': f'2026-10-{day:02d}T11:00:00+09:00',
+        'calendar_id': calendar_id,
+    }
+
+def snapshot(events):
+    return {event_key(event): dict(event, hash=compute_event_hash(event)) for event in events}
+
+def test_exclude_changes_keeps_undelivered_changes_for_next_run():
+    kept, changed, removed = make_event('1'), make_event('2'), make_event('3')
+    previous = snapshot([kept, changed, removed])
+    current = [kept, make_event('2', title='変更後'), make_event('4')]
+    diff = diff_events(previous, current, now=NOW)
+
+    saved = exclude_changes(current, diff)
+
+    # 保存した内容と比べると、同じ変更がもう一度検出される
+    again = diff_events(snapshot(saved), current, now=NOW)
+    assert [e['id'] for e in again.added] == ['4']
+    assert [u['event']['title'] for u in again.updated] == ['変更後']
+    assert [e['id'] for e in again.removed] == ['3']
+
+def test_exclude_changes_only_reverts_given_changes():
+    previous = snapshot([make_event('1'), make_event('2')])
+    current = [make_event('1', title='変更後'), make_event('3')]
+    diff = diff_events(previous, current, now=NOW)
+
+    saved = exclude_changes(current, diff.only(['removed']))
+
+    again = diff_events(snapshot(saved), current, now=NOW)
+    assert again.added == [] and again.updated == []
+    assert [e['id'] for e in again.removed] == ['2']
+
+def test_exclude_changes_with_empty_diff_saves_current():
+    current = [make_event('1')]
+    assert exclude_changes(current, EventDiff()) == current
+
+@pytest.fixture(params=['file', 'sqlite'])
+def storage(request, tmp_path):
+    if request.param == 'sqlite':
+        storage = SqliteEventStorage(str(tmp_path / 'events.db'))
+        yield storage
+        storage.close()
+    else:
+        yield EventStorage(str(tmp_path / 'previous_events.json'))
+
+def shared_event(calendar_id, start='2026-10-20T10:00:00+09:00', calendar_ids=None):
+    event = dict(make_event('shared', calendar_id=calendar_id), ical_uid='uid-1', start=start)
+    if calendar_ids:
+        event['calendar_ids'] = calendar_ids
+    return event
+
+def test_shared_event_is_not_reported_when_first_calendar_fails(storage):
+    calendars = ['a@example.com', 'b@example.com']
+    merged = shared_event('a@example.com', calendar_ids=calendars)
+    storage.save_events([merged], calendar_ids=calendars)
+
+    # aの取得に失敗すると、同じ予定がbのキーで返される(bのタイムゾーンの表記で)
+    from_b = shared_event('b@example.com', start='2026-10-20T01:00:00Z')
+    diff = storage.diff_events([from_b], calendar_ids=['b@example.com'], now=NOW)
+    assert diff.is_empty
+    storage.save_events([from_b], calendar_ids=['b@example.com'])
+
+    # aが復旧すると、再びaのキーにまとめられる
+    diff = storage.diff_events([merged], calendar_ids=calendars, now=NOW)
+    assert diff.is_empty
+
+def test_different_occurrence_of_shared_event_is_reported(storage):
+    storage.save_events([shared_event('a@example.com')], calendar_ids=['a@example.com'])
+    moved = shared_event('b@example.com', start='2026-10-21T10:00:00+09:00')
+    diff = storage.diff_events([moved], calendar_ids=['a@example.com', 'b@example.com'], now=NOW)
+    assert [e['calendar_id'] for e in diff.added] == ['b@example.com']
+    assert [e['calendar_id'] for e in diff.removed] == ['a@example.com']
+
+def test_diff_detects_added_updated_and_removed():
+    previous = snapshot([make_event('1'), make_event('2'), make_event('3')])
+    current = [make_event('1'), make_event('2', title='変更後'), make_event('4')]
+
+    diff = diff_events(previous, current, now=NOW)
+
+    assert [e['id'] for e in diff.added] == ['4']
+    assert [(u['event']['id'], u['changes']) for u in diff.updated] == [('2', {'title': ('会議', '変更後')})]
+    assert [e['id'] for e in diff.removed] == ['3']
+
+def test_diff_ignores_past_events_and_calendars_out_of_scope():
+    past = make_event('past', day=17)
+    other = make_event('other', calendar_id='b@example.com')
+    previous = snapshot([past, other, make_event('1')])
+
+    diff = diff_events(previous, [make_event('1')], calendar_ids=['a@example.com'], now=NOW)
+
+    assert diff.is_empty
+
+def test_only_filters_change_types():
+    diff = EventDiff(added=[make_event('1')], removed=[make_event('2')])
+    assert diff.only(['removed']).added == []
+    assert [e['id'] for e in diff.only(['removed']).removed] == ['2']
+
+class FakeCalendar:
+    """aget_eventのみを持つカレンダー(イベントID → 現在のイベント、Noneは削除済み、例外は確認できない場合)"""
+
+    def __init__(self, events):
+        self.events = events
+
+    async def aget_event(self, calendar_id, event_id):
+        result = self.events[event_id]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+def test_event_moved_out_of_window_is_reported_as_updated():
+    previous = snapshot([make_event('moved'), make_event('deleted'), make_event('unknown')])
+    diff = diff_events(previous, [], now=NOW)
+    calendar = FakeCalendar({
+        'moved': make_event('moved', day=28),
+        'deleted': None,
+        'unknown': RuntimeError('503'),
+    })
+
+    diff, unconfirmed = asyncio.run(main.confirm_removed_events(calendar, diff))
+
+    assert [u['event']['id'] for u in diff.updated] == ['moved']
+    assert diff.updated[0]['changes']['start'][1] == '2026-10-28T10:00:00+09:00'
+    assert [e['id'] for e in diff.removed] == ['deleted']
+    # 確認できなかった予定は通知せず、次回改めて確認するよう前回の内容で保存する
+    assert [e['id'] for e in unconfirmed] == ['unknown']
+    saved = exclude_changes([], EventDiff(removed=unconfirmed))
+    assert [e['id'] for e in diff_events(snapshot(saved), [], now=NOW).removed] == ['unknown']
+
+def test_undelivered_move_out_of_window_is_kept_for_next_run():
+    previous = snapshot([make_event('moved')])
+    diff = EventDiff(updated=[{'event': make_event('moved', day=28), 'previous': previous['a@example.com/moved'],
+                               'changes': {}}])
+    saved = exclude_changes([], diff)
+    assert [e['id'] for e in saved] == ['moved']
@@ -0,0 +1,39 @@
+"""Eventモデル(解析済みの日時による並べ替え)のテスト"""
+
+import heapq
+import pytz
+from event_model import Event
+
+TOKYO = pytz.timezone('Asia/Tokyo')
+
+def make_event(event_id, start, end=None):
+    return Event(id=event_id, title=event_id, start=start, end=end or start, calendar_id='a@example.com',
+                 timezone=TOKYO)
+
+def test_all_day_and_offset_date_times_sort_chronologically():
+    events = [
+        # 文字列順では終日の予定より前に来るが、東京では2026-10-20 10:00
+        make_event('new_york', '2026-10-19T21:00:00-04:00'),
+        make_event('all_day', '2026-10-20', '2026-10-21'),
+        # 文字列順では東京の09:00より前に来るが、東京では2026-10-20 17:00
+        make_event('utc', '2026-10-20T08:00:00Z'),
+        make_event('tokyo_morning', '2026-10-20T09:00:00+09:00'),
+    ]
+
+    assert sorted(e.start for e in events)[0] == '2026-10-19T21:00:00-04:00'
+    assert [e.id for e in sorted(events, key=lambda e: e.start_dt)] == \
+        ['all_day', 'tokyo_morning', 'new_york', 'utc']
+
+def test_all_day_event_starts_at_local_midnight():
+    event = make_event('all_day', '2026-10-20', '2026-10-21')
+    assert event.all_day
+    assert event.start_dt.isoformat() == '2026-10-20T00:00:00+09:00'
+    assert not make_event('timed', '2026-10-20T00:00:00+09:00').all_day
+
+def test_merge_of_calendars_with_different_offsets_is_chronological():
+    calendar_a = [make_event('a1', '2026-10-20'), make_event('a2', '2026-10-20T12:00:00+09:00')]
+    calendar_b = [make_event('b1', '2026-10-20T01:00:00Z'), make_event('b2', '2026-10-20T02:00:00-04:00')]
+
+    merged = heapq.merge(calendar_a, calendar_b, key=lambda e: e.start_dt)
+
+    assert [e.id for e in merged] == ['a1', 'b1', 'a2', 'b2']
@@ -0,0 +1,55 @@
+"""イベントの保存(形式・破損時の扱い)のテスト"""
+
+from datetime import datetime
+import pytest
+import pytz
+from event_model import Event
+from event_storage import STORAGE_FORMATS, EventStorage
+
+TOKYO = pytz.timezone('Asia/Tokyo')
+NOW = TOKYO.localize(datetime(2026, 10, 18, 9, 0))
+
+EVENTS = [
+    {'id': '1', 'title': '定例会議', 'start': '2026-10-20T10:00:00+09:00', 'end': '2026-10-20T11:00:00+09:00',
+     'calendar_id': 'a@example.com', 'ical_uid': 'uid-1', 'calendar_ids': ['a@example.com', 'b@example.com']},
+    {'id': '2', 'title': '休暇 🌴', 'start': '2026-10-21', 'end': '2026-10-22', 'calendar_id': 'a@example.com',
+     'ical_uid': None},
+]
+
+@pytest.mark.parametrize('storage_format', STORAGE_FORMATS)
+def test_formats_round_trip_the_same_data_as_json(tmp_path, storage_format):
+    json_storage = EventStorage(str(tmp_path / 'events.json'))
+    storage = EventStorage(str(tmp_path / f"events.{storage_format}"), storage_format=storage_format)
+    for target in (json_storage, storage):
+        target.save_events(EVENTS)
+
+    assert storage.load_events() == json_storage.load_events()
+    assert storage.diff_events(EVENTS, now=NOW).is_empty
+
+def test_event_objects_are_saved_like_dicts(tmp_path):
+    storage = EventStorage(str(tmp_path / 'events.json'))
+    storage.save_events([Event.from_dict(event, TOKYO) for event in EVENTS])
+    assert storage.diff_events(EVENTS, now=NOW).is_empty
+
+@pytest.mark.parametrize('storage_format', STORAGE_FORMATS)
+@pytest.mark.parametrize('corrupt', [
+    lambda raw: raw[:len(raw) // 2],
+    lambda raw: raw[:-1],
+    lambda raw: b'',
+    lambda raw: b'\xc1garbage',
+    lambda raw: b'{"a@example.com/1": 1}',
+    lambda raw: '{"a@example.com/1": {"title": "IDなし"}}'.encode('utf-8'),
+])
+def test_corrupt_snapshot_gives_empty_diff(tmp_path, capsys, storage_format, corrupt):
+    path = tmp_path / 'events'
+    storage = EventStorage(str(path), storage_format=storage_format)
+    storage.save_events(EVENTS[:1])
+    path.write_bytes(corrupt(path.read_bytes()))
+
+    # 全予定を新規として通知しない
+    assert storage.diff_events(EVENTS, now=NOW).is_empty
+    assert '破損しています' in capsys.readouterr().out
+
+    # 現在の予定を基準として保存し直し、次回から差分を検出する
+    storage.save_events(EVENTS[1:])
+    assert [e['id'] for e in storage.diff_events(EVENTS, now=NOW).added] == ['1']
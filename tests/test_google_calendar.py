@@ -0,0 +1,146 @@
+"""Google Calendar APIクライアントの再試行・差分同期のテスト"""
+
+import json
+import socket
+from types import SimpleNamespace
+import httplib2
+import pytest
+from google.auth.credentials import AnonymousCredentials
+from googleapiclient.errors import HttpError
+import google_calendar
+from fake_servers import FakeServers
+from google_calendar import GoogleCalendarClient, MAX_BACKOFF_SECONDS, SYNC_MARGIN_DAYS
+from sync_state import SyncStateStore
+
+def make_client(**kwargs):
+    return GoogleCalendarClient(credentials_path='credentials.json', token_path='token.json', **kwargs)
+
+def http_error(status, reason=None, headers=None):
+    resp = httplib2.Response(dict(headers or {}, status=status))
+    errors = [{'reason': reason}] if reason else []
+    content = json.dumps({'error': {'code': status, 'errors': errors}}).encode('utf-8')
+    return HttpError(resp, content)
+
+class FakeRequest:
+    """execute()のたびにresultsを順番に返す(例外は送出する)リクエスト"""
+
+    def __init__(self, results):
+        self.results = list(results)
+        self.calls = 0
+
+    def execute(self, http=None):
+        self.calls += 1
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(google_calendar, 'time', SimpleNamespace(sleep=sleeps.append,
+                                                                 perf_counter=google_calendar.time.perf_counter))
+    return sleeps
+
+@pytest.mark.parametrize('error', [
+    http_error(429),
+    http_error(500),
+    http_error(503),
+    http_error(403, 'rateLimitExceeded'),
+    http_error(403, 'userRateLimitExceeded'),
+    ConnectionResetError(),
+    socket.timeout(),
+])
+def test_transient_errors_are_retried(error, sleeps):
+    request = FakeRequest([error, {'items': []}])
+    assert make_client()._execute(request) == {'items': []}
+    assert request.calls == 2
+    assert len(sleeps) == 1
+
+@pytest.mark.parametrize('error', [
+    http_error(403, 'forbidden'),
+    http_error(403),
+    http_error(404),
+    http_error(501),
+])
+def test_permanent_errors_are_not_retried(error, sleeps):
+    request = FakeRequest([error, {'items': []}])
+    with pytest.raises(HttpError):
+        make_client()._execute(request)
+    assert request.calls == 1
+    assert sleeps == []
+
+def test_retries_stop_after_max_retries(sleeps):
+    request = FakeRequest([http_error(503)] * 4)
+    with pytest.raises(HttpError):
+        make_client(max_retries=3)._execute(request)
+    assert request.calls == 4
+    assert len(sleeps) == 3
+
+def test_backoff_is_exponential_and_capped():
+    client = make_client()
+    error = http_error(503)
+    for attempt in range(10):
+        delay = client._backoff_delay(attempt, error)
+        expected = min(MAX_BACKOFF_SECONDS, 2 ** attempt)
+        assert expected / 2 <= delay <= expected
+    # Retry-Afterがあれば、上限を超えていてもその時間は待つ
+    assert client._backoff_delay(0, http_error(429, headers={'retry-after': '60'})) == 60
+
+class StubCalendarClient(GoogleCalendarClient):
+    """スタブサーバー用のクライアント(認証を省略する)"""
+
+    def _authenticate(self):
+        return AnonymousCredentials()
+
+@pytest.fixture(scope='module')
+def servers():
+    with FakeServers(calendars=1, events=100) as servers:
+        yield servers
+
+@pytest.fixture
+def sync_client(servers, tmp_path):
+    client = StubCalendarClient(credentials_path=str(tmp_path / 'credentials.json'),
+                                token_path=str(tmp_path / 'token.json'),
+                                sync_state_path=str(tmp_path / 'sync_state'),
+                                api_endpoint=servers.calendar_endpoint)
+    yield client
+    client.close()
+
+def fetch_ids(client, servers, days=7):
+    return [event.id for event in client.get_upcoming_events(days=days, calendar_id=servers.calendar_ids[0])]
+
+def test_expired_sync_token_falls_back_to_full_sync(sync_client, servers, capsys):
+    calendar_id = servers.calendar_ids[0]
+    expected = fetch_ids(sync_client, servers)
+    assert 'フル同期' in capsys.readouterr().out
+
+    # 失効したsyncTokenにはスタブが410 Goneを返す
+    state = sync_client.sync_store.get(calendar_id)
+    sync_client.sync_store.set(calendar_id, dict(state, sync_token='expired'))
+
+    assert fetch_ids(sync_client, servers) == expected
+    output = capsys.readouterr().out
+    assert 'syncTokenが失効した' in output and 'フル同期' in output
+    # 新しいsyncTokenで次回から差分同期に戻る
+    assert SyncStateStore(sync_client.sync_store.state_path).get(calendar_id)['sync_token'] != 'expired'
+    assert fetch_ids(sync_client, servers) == expected
+    assert '差分同期' in capsys.readouterr().out
+
+def test_window_beyond_synced_range_triggers_full_sync(sync_client, servers, capsys):
+    calendar_id = servers.calendar_ids[0]
+    fetch_ids(sync_client, servers, days=7)
+    synced_until = sync_client.sync_store.get(calendar_id)['synced_until']
+    capsys.readouterr()
+
+    # キャッシュした範囲(取得範囲+SYNC_MARGIN_DAYS)内なら差分同期
+    fetch_ids(sync_client, servers, days=7 + SYNC_MARGIN_DAYS)
+    assert '差分同期' in capsys.readouterr().out
+
+    # 範囲を超えたらフル同期で取り直し、範囲を延ばす
+    ids = fetch_ids(sync_client, servers, days=8 + SYNC_MARGIN_DAYS)
+    assert 'フル同期' in capsys.readouterr().out
+    assert sync_client.sync_store.get(calendar_id)['synced_until'] > synced_until
+    assert ids == [event.id for event in StubCalendarClient(
+        credentials_path='credentials.json', token_path='token.json', api_endpoint=servers.calendar_endpoint
+    ).get_upcoming_events(days=8 + SYNC_MARGIN_DAYS, calendar_id=calendar_id)]
@@ -0,0 +1,34 @@
+"""変更確認の実行結果(取得失敗時)のテスト"""
+
+import asyncio
+import pytest
+import main
+
+class FailingCalendar:
+    """すべてのカレンダーの取得に失敗するカレンダー"""
+
+    def __init__(self):
+        self.failed_calendar_ids = []
+
+    async def aget_upcoming_events_from_multiple_calendars(self, days, calendar_ids, refresh_calendar_ids=None):
+        self.failed_calendar_ids = list(calendar_ids)
+        return []
+
+def test_run_fails_when_every_calendar_fails(monkeypatch):
+    calendar_ids = ['a@example.com', 'b@example.com']
+    monkeypatch.setattr(main.Config, 'CALENDAR_IDS', calendar_ids)
+    monkeypatch.setattr(main, '_calendar_client', FailingCalendar())
+    monkeypatch.setattr(main, 'create_storage', lambda: pytest.fail('保存・差分検出は行わない'))
+
+    with pytest.raises(main.CalendarFetchError):
+        asyncio.run(main.check_calendar_changes())
+
+def test_once_exits_with_fetch_failed(monkeypatch, tmp_path):
+    async def fail():
+        raise main.CalendarFetchError('すべてのカレンダーの取得に失敗しました')
+
+    monkeypatch.setattr(main.Config, 'validate', classmethod(lambda cls: None))
+    monkeypatch.setattr(main, 'daily_notification_task', fail)
+    monkeypatch.chdir(tmp_path)
+
+    assert asyncio.run(main.run_once()) == main.EXIT_FETCH_FAILED
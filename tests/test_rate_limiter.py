@@ -0,0 +1,49 @@
+"""トークンバケットによるレート制限のテスト"""
+
+from types import SimpleNamespace
+import pytest
+import rate_limiter
+from rate_limiter import TokenBucket
+
+@pytest.fixture
+def clock(monkeypatch):
+    """time.monotonicとtime.sleepを置き換える(sleepした分だけ時計を進める)"""
+    clock = SimpleNamespace(now=1000.0)
+
+    def sleep(seconds):
+        clock.now += seconds
+
+    monkeypatch.setattr(rate_limiter, 'time', SimpleNamespace(monotonic=lambda: clock.now, sleep=sleep))
+    return clock
+
+def test_burst_is_available_without_waiting(clock):
+    bucket = TokenBucket(rate=10, burst=5)
+    assert [bucket.acquire() for _ in range(5)] == [0.0] * 5
+    assert bucket.acquire() == pytest.approx(0.1)
+
+def test_tokens_refill_at_rate_up_to_burst(clock):
+    bucket = TokenBucket(rate=10, burst=5)
+    for _ in range(5):
+        bucket.acquire()
+
+    clock.now += 0.3
+    assert [bucket.acquire() for _ in range(3)] == pytest.approx([0.0] * 3)
+    assert bucket.acquire() == pytest.approx(0.1)
+
+    # 長く空いても上限(burst)までしか貯まらない
+    clock.now += 100
+    assert [bucket.acquire() for _ in range(5)] == [0.0] * 5
+    assert bucket.acquire() == pytest.approx(0.1)
+
+def test_batch_reserves_tokens_ahead(clock):
+    bucket = TokenBucket(rate=10, burst=1)
+    bucket.acquire()
+    # 足りない分を予約して、貯まるまで待つ
+    assert bucket.acquire(3) == pytest.approx(0.3)
+    assert bucket.acquire() == pytest.approx(0.1)
+
+def test_default_burst_and_invalid_rate():
+    assert TokenBucket(rate=0.5).capacity == 1.0
+    assert TokenBucket(rate=20).capacity == 20
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
@@ -0,0 +1,117 @@
+"""繰り返し予定のローカル展開のテスト"""
+
+from datetime import datetime, timedelta
+import pytz
+from fake_servers import FakeCalendarData
+from recurrence import RecurrenceExpander, _normalize_until, instance_id
+
+TOKYO = pytz.timezone('Asia/Tokyo')
+TIME_MIN = TOKYO.localize(datetime(2026, 10, 18))
+TIME_MAX = TOKYO.localize(datetime(2026, 11, 15))
+
+def master(recurrence, start='2026-10-20T10:00:00+09:00', end='2026-10-20T11:00:00+09:00',
+           timezone='Asia/Tokyo', event_id='m'):
+    if 'T' in start:
+        start_field = {'dateTime': start, 'timeZone': timezone}
+        end_field = {'dateTime': end, 'timeZone': timezone}
+    else:
+        start_field, end_field = {'date': start}, {'date': end}
+    return {'id': event_id, 'status': 'confirmed', 'summary': '定例', 'iCalUID': f"{event_id}@example.com",
+            'start': start_field, 'end': end_field, 'recurrence': recurrence}
+
+def expand(items, time_min=TIME_MIN, time_max=TIME_MAX):
+    return RecurrenceExpander(TOKYO).expand('a@example.com', items, time_min, time_max)
+
+def test_normalize_until_matches_start_type():
+    # 時刻付きの予定には、日付のみのUNTILをその日の終わり(UTC)にする
+    assert _normalize_until('RRULE:FREQ=DAILY;UNTIL=20261022', all_day=False) == \
+        'RRULE:FREQ=DAILY;UNTIL=20261022T235959Z'
+    assert _normalize_until('RRULE:FREQ=DAILY;UNTIL=20261022T010000', all_day=False) == \
+        'RRULE:FREQ=DAILY;UNTIL=20261022T010000Z'
+    # 終日の予定には、日付と時刻のUNTILを日付のみにする
+    assert _normalize_until('RRULE:FREQ=DAILY;UNTIL=20261022T010000Z', all_day=True) == \
+        'RRULE:FREQ=DAILY;UNTIL=20261022'
+    assert _normalize_until('EXDATE:20261021T010000Z', all_day=True) == 'EXDATE:20261021T010000Z'
+
+def test_until_includes_last_occurrence():
+    timed = expand([master(['RRULE:FREQ=DAILY;UNTIL=20261022'])])
+    assert [e.id for e in timed] == ['m_20261020T010000Z', 'm_20261021T010000Z', 'm_20261022T010000Z']
+
+    all_day = expand([master(['RRULE:FREQ=DAILY;UNTIL=20261022T150000Z'], start='2026-10-20', end='2026-10-21')])
+    assert [e.id for e in all_day] == ['m_20261020', 'm_20261021', 'm_20261022']
+
+def test_exdate_with_tzid_is_skipped():
+    item = master(['RRULE:FREQ=DAILY;COUNT=3', 'EXDATE;TZID=America/New_York:20261021T090000'],
+                  start='2026-10-20T09:00:00-04:00', end='2026-10-20T10:00:00-04:00', timezone='America/New_York')
+    assert [e.id for e in expand([item])] == ['m_20261020T130000Z', 'm_20261022T130000Z']
+
+def test_moved_and_cancelled_exceptions_replace_occurrences():
+    moved = {
+        'id': 'm_20261021T010000Z', 'status': 'confirmed', 'summary': '定例(時間変更)',
+        'recurringEventId': 'm', 'originalStartTime': {'dateTime': '2026-10-21T10:00:00+09:00'},
+        'start': {'dateTime': '2026-10-21T15:00:00+09:00'}, 'end': {'dateTime': '2026-10-21T16:00:00+09:00'},
+    }
+    cancelled = {
+        'id': 'm_20261022T010000Z', 'status': 'cancelled',
+        'recurringEventId': 'm', 'originalStartTime': {'dateTime': '2026-10-22T10:00:00+09:00'},
+    }
+    events = expand([master(['RRULE:FREQ=DAILY;COUNT=4']), moved, cancelled])
+
+    assert [(e.id, e.start) for e in events] == [
+        ('m_20261020T010000Z', '2026-10-20T10:00:00+09:00'),
+        ('m_20261021T010000Z', '2026-10-21T15:00:00+09:00'),
+        ('m_20261023T010000Z', '2026-10-23T10:00:00+09:00'),
+    ]
+    assert events[1].title == '定例(時間変更)'
+
+def test_all_day_weekly_series():
+    # 範囲の開始より前から続いている毎週月曜の終日の予定
+    item = master(['RRULE:FREQ=WEEKLY;BYDAY=MO'], start='2026-10-05', end='2026-10-06')
+    events = expand([item])
+    assert [e.id for e in events] == ['m_20261019', 'm_20261026', 'm_20261102', 'm_20261109']
+    assert all(e.all_day for e in events)
+    assert events[0].start == '2026-10-19' and events[0].end == '2026-10-20'
+
+def test_expansion_keeps_local_time_across_dst_change():
+    # ニューヨークは2026-11-01に夏時間が終わる
+    item = master(['RRULE:FREQ=DAILY;COUNT=4'], start='2026-10-30T09:00:00-04:00',
+                  end='2026-10-30T10:00:00-04:00', timezone='America/New_York')
+    events = expand([item])
+
+    assert [e.start for e in events] == [
+        '2026-10-30T09:00:00-04:00', '2026-10-31T09:00:00-04:00',
+        '2026-11-01T09:00:00-05:00', '2026-11-02T09:00:00-05:00',
+    ]
+    assert [e.id for e in events] == [
+        'm_20261030T130000Z', 'm_20261031T130000Z', 'm_20261101T140000Z', 'm_20261102T140000Z',
+    ]
+
+def test_instance_id_matches_api_format():
+    assert instance_id('abc', {'dateTime': '2026-10-20T10:00:00+09:00'}) == 'abc_20261020T010000Z'
+    assert instance_id('abc', {'dateTime': '2026-10-20T01:00:00Z'}) == 'abc_20261020T010000Z'
+    assert instance_id('abc', {'date': '2026-10-20'}) == 'abc_20261020'
+
+def test_expanded_events_match_server_single_events():
+    data = FakeCalendarData(calendar_count=1, events_per_calendar=0, recurring_per_calendar=5)
+    calendar_id = data.calendar_ids[0]
+    time_min = data._origin
+    time_max = time_min + timedelta(days=14)
+    params = {'timeMin': time_min.isoformat(), 'timeMax': time_max.isoformat(), 'maxResults': '2500'}
+
+    _, single = data.list_events(calendar_id, dict(params, singleEvents='true'))
+    _, masters = data.list_events(calendar_id, params)
+    events = RecurrenceExpander(data.timezone).expand(calendar_id, masters['items'], time_min, time_max)
+
+    expected = sorted((item['id'], datetime.fromisoformat(item['start']['dateTime'])) for item in single['items'])
+    assert sorted((e.id, e.start_dt) for e in events) == expected
+    assert len(expected) == 5 * 14
+
+def test_unparsable_rule_skips_only_that_series(capsys):
+    broken = master(['RRULE:FREQ=SOMETIMES'], event_id='broken')
+    single = {'id': 'single', 'status': 'confirmed', 'summary': '単発',
+              'start': {'dateTime': '2026-10-19T10:00:00+09:00'}, 'end': {'dateTime': '2026-10-19T11:00:00+09:00'}}
+
+    events = expand([broken, master(['RRULE:FREQ=DAILY;COUNT=2']), single])
+
+    assert [e.id for e in events] == ['single', 'm_20261020T010000Z', 'm_20261021T010000Z']
+    assert 'broken' in capsys.readouterr().out
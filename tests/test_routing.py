@@ -0,0 +1,88 @@
+"""ルーティング設定(チャンネルごとの振り分け)のテスト"""
+
+import json
+import os
+import pytest
+from event_diff import EventDiff
+from routing import Route, load_routes
+
+EXAMPLE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'routes.example.json')
+
+def make_event(event_id, title='会議', calendar_id='a@example.com', calendar_ids=None):
+    event = {'id': event_id, 'title': title, 'start': '2026-10-20T10:00:00+09:00',
+             'end': '2026-10-20T11:00:00+09:00', 'calendar_id': calendar_id}
+    if calendar_ids:
+        event['calendar_ids'] = calendar_ids
+    return event
+
+def write_routes(tmp_path, routes):
+    path = tmp_path / 'routes.json'
+    path.write_text(json.dumps({'routes': routes}), encoding='utf-8')
+    return str(path)
+
+def test_filter_by_calendar():
+    route = Route('A', ['a@example.com'], channel_id=1)
+    diff = EventDiff(added=[
+        make_event('1'),
+        make_event('2', calendar_id='b@example.com'),
+        # 重複をまとめた予定は、共有されているいずれかのカレンダーが対象なら通知する
+        make_event('3', calendar_id='b@example.com', calendar_ids=['b@example.com', 'a@example.com']),
+    ])
+    assert [e['id'] for e in route.filter(diff).added] == ['1', '3']
+
+def test_filter_by_keywords():
+    route = Route('A', ['a@example.com'], channel_id=1, include_keywords=['定例', '商談'],
+                  exclude_keywords=['非公開'])
+    diff = EventDiff(
+        added=[make_event('1', '定例会議'), make_event('2', '飲み会'), make_event('3', '非公開の定例')],
+        # 変更前・変更後のどちらかが条件を満たせば通知する
+        updated=[{'event': make_event('4', '打ち合わせ'), 'previous': make_event('4', '商談'),
+                  'changes': {'title': ('商談', '打ち合わせ')}}],
+    )
+    routed = route.filter(diff)
+    assert [e['id'] for e in routed.added] == ['1']
+    assert [u['event']['id'] for u in routed.updated] == ['4']
+
+def test_filter_by_change_types():
+    route = Route('A', ['a@example.com'], channel_id=1, change_types=['removed'])
+    diff = EventDiff(added=[make_event('1')], removed=[make_event('2')])
+    routed = route.filter(diff)
+    assert routed.added == [] and [e['id'] for e in routed.removed] == ['2']
+
+def test_defaults_for_omitted_fields(tmp_path):
+    path = write_routes(tmp_path, [
+        {'channel_id': '123', 'calendar_ids': ['a@example.com']},
+        {'name': 'B', 'webhook_url': 'https://example.com/webhook', 'calendar_ids': ['b@example.com'],
+         'change_types': ['added']},
+    ])
+    default, other = load_routes(path, default_change_types=['added', 'updated'])
+
+    assert default.name == 'route1' and default.channel_id == 123
+    # change_typesを省略したルートはNOTIFY_CHANGE_TYPESに従う
+    assert default.change_types == ['added', 'updated']
+    assert other.change_types == ['added'] and other.webhook_url == 'https://example.com/webhook'
+    assert Route('C', ['a@example.com']).change_types == ['added', 'updated', 'removed']
+
+def test_example_file_loads():
+    routes = load_routes(EXAMPLE_PATH)
+    assert [route.name for route in routes] == ['開発チーム', '営業チーム']
+
+@pytest.mark.parametrize('content, message', [
+    (None, '見つかりません'),
+    ('{"routes": [', '形式が正しくありません'),
+    ('{"routes": []}', 'ルートがありません'),
+    ('[{"name": "A"}]', '形式が正しくありません'),
+    ('{"routes": {"name": "A"}}', '形式が正しくありません'),
+    ('{"routes": ["A"]}', '形式が正しくありません'),
+    ('{"routes": [{"name": "A", "channel_id": 1}]}', 'calendar_ids'),
+    ('{"routes": [{"name": "A", "calendar_ids": ["a@example.com"]}]}', 'channel_idまたはwebhook_url'),
+    ('{"routes": [{"name": "A", "channel_id": "abc", "calendar_ids": ["a@example.com"]}]}', '数値'),
+    ('{"routes": [{"name": "A", "channel_id": 1, "calendar_ids": ["a@example.com"], "change_types": ["deleted"]}]}',
+     'change_types'),
+])
+def test_malformed_routes_file_is_rejected(tmp_path, content, message):
+    path = tmp_path / 'routes.json'
+    if content is not None:
+        path.write_text(content, encoding='utf-8')
+    with pytest.raises(ValueError, match=message):
+        load_routes(str(path))
@@ -0,0 +1,153 @@
+"""スケジューラーの夏時間・停止中の実行(catch-up)・実行履歴の保存のテスト"""
+
+import asyncio
+import os
+from datetime import datetime, time, timedelta
+import pytz
+import pytest
+from scheduler import AdaptiveInterval, Scheduler, ScheduleStateStore, ScheduledJob, localize_wall_time
+
+NEW_YORK = pytz.timezone('America/New_York')
+TOKYO = pytz.timezone('Asia/Tokyo')
+
+async def noop():
+    pass
+
+def test_localize_wall_time_nonexistent_time_moves_forward():
+    # 2026-03-08 2:30は夏時間開始で存在しないため、3:30(EDT)にする
+    result = localize_wall_time(NEW_YORK, datetime(2026, 3, 8).date(), time(2, 30))
+    assert result.isoformat() == '2026-03-08T03:30:00-04:00'
+
+def test_localize_wall_time_ambiguous_time_uses_first():
+    # 2026-11-01 1:30は2回あるため、1回目(EDT)にする
+    result = localize_wall_time(NEW_YORK, datetime(2026, 11, 1).date(), time(1, 30))
+    assert result.isoformat() == '2026-11-01T01:30:00-04:00'
+
+def test_daily_job_keeps_wall_clock_time_across_dst():
+    job = ScheduledJob('朝', noop, timezone='America/New_York', times=['07:00'])
+    before = NEW_YORK.localize(datetime(2026, 3, 7, 8, 0))
+    first = job.get_next_run_time(before)
+    second = job.get_next_run_time(first)
+    assert first.isoformat() == '2026-03-08T07:00:00-04:00'
+    assert second.isoformat() == '2026-03-09T07:00:00-04:00'
+    # 切り替え日は23時間後になる
+    assert first - before == timedelta(hours=22)
+
+def test_daily_job_on_nonexistent_time_runs_once():
+    job = ScheduledJob('深夜', noop, timezone='America/New_York', times=['02:30'])
+    first = job.get_next_run_time(NEW_YORK.localize(datetime(2026, 3, 7, 12, 0)))
+    second = job.get_next_run_time(first)
+    assert first.isoformat() == '2026-03-08T03:30:00-04:00'
+    assert second.isoformat() == '2026-03-09T02:30:00-04:00'
+
+def test_daily_job_multiple_times_in_order():
+    job = ScheduledJob('通知', noop, timezone='Asia/Tokyo', times=['18:00', '07:00'])
+    now = TOKYO.localize(datetime(2026, 2, 1, 8, 0))
+    assert job.get_next_run_time(now).isoformat() == '2026-02-01T18:00:00+09:00'
+    assert job.get_next_run_time(TOKYO.localize(datetime(2026, 2, 1, 18, 0))).isoformat() == '2026-02-02T07:00:00+09:00'
+
+def test_interval_job_skips_missed_runs():
+    job = ScheduledJob('定期', noop, interval=timedelta(minutes=60))
+    job.next_run = pytz.utc.localize(datetime(2026, 3, 1, 0, 0))
+    # 3時間半遅れた場合は、過ぎた回をまとめて飛ばして次の予定時刻にする
+    now = pytz.utc.localize(datetime(2026, 3, 1, 3, 30))
+    assert job.get_next_run_time(now) == pytz.utc.localize(datetime(2026, 3, 1, 4, 0))
+
+def test_interval_job_is_not_shifted_by_dst():
+    job = ScheduledJob('定期', noop, timezone='America/New_York', interval=timedelta(hours=1))
+    job.next_run = NEW_YORK.localize(datetime(2026, 3, 8, 1, 0))
+    next_run = job.get_next_run_time(job.next_run)
+    assert next_run - job.next_run == timedelta(hours=1)
+    assert next_run.astimezone(NEW_YORK).isoformat() == '2026-03-08T03:00:00-04:00'
+
+@pytest.fixture
+def state_store(tmp_path):
+    return ScheduleStateStore(str(tmp_path / 'scheduler_state.json'))
+
+def test_catch_up_runs_missed_schedule_once(state_store):
+    now = datetime.now(pytz.utc)
+    state_store.set_last_run('通知', now - timedelta(days=3))
+    scheduler = Scheduler(state_store=state_store, catch_up=True)
+    job = scheduler.add_daily('通知', noop, '07:00', timezone='Asia/Tokyo')
+    # 3日分過ぎていても、最初に過ぎた予定を1回だけすぐに実行する
+    assert job.next_run <= now
+    assert job.next_run == ScheduledJob('通知', noop, times=['07:00']).get_next_run_time(now - timedelta(days=3))
+    assert len(scheduler._heap) == 1
+
+def test_catch_up_disabled_waits_for_next_schedule(state_store):
+    now = datetime.now(pytz.utc)
+    state_store.set_last_run('通知', now - timedelta(days=3))
+    job = Scheduler(state_store=state_store, catch_up=False).add_daily('通知', noop, '07:00')
+    assert job.next_run > now
+
+def test_no_catch_up_when_last_run_is_recent(state_store):
+    now = datetime.now(pytz.utc)
+    state_store.set_last_run('通知', now)
+    job = Scheduler(state_store=state_store).add_daily('通知', noop, '07:00')
+    assert job.next_run > now
+
+def test_adaptive_job_ignores_state(state_store):
+    now = datetime.now(pytz.utc)
+    state_store.set_last_run('確認', now - timedelta(days=3))
+    job = Scheduler(state_store=state_store).add_adaptive('確認', noop, 1, 60)
+    assert job.next_run > now
+
+def test_state_store_persists_last_run(tmp_path):
+    path = str(tmp_path / 'state' / 'scheduler_state.json')
+    run_time = TOKYO.localize(datetime(2026, 2, 1, 7, 0))
+    ScheduleStateStore(path).set_last_run('通知', run_time)
+    assert ScheduleStateStore(path).get_last_run('通知') == run_time
+    assert ScheduleStateStore(path).get_last_run('不明') is None
+    # 一時ファイルは残らない
+    assert os.listdir(os.path.dirname(path)) == ['scheduler_state.json']
+
+def test_state_store_treats_corrupt_file_as_empty(tmp_path, capsys):
+    path = tmp_path / 'scheduler_state.json'
+    path.write_text('{"通知": "2026-02', encoding='utf-8')
+    store = ScheduleStateStore(str(path))
+    assert store.get_last_run('通知') is None
+    assert '破損しています' in capsys.readouterr().out
+    store.set_last_run('通知', TOKYO.localize(datetime(2026, 2, 1, 7, 0)))
+    assert ScheduleStateStore(str(path)).get_last_run('通知') is not None
+
+def test_failed_run_is_not_recorded_as_last_run(state_store):
+    async def fail():
+        raise RuntimeError('すべてのカレンダーの取得に失敗しました')
+
+    scheduler = Scheduler(state_store=state_store)
+    asyncio.run(scheduler._run_job(scheduler.add_daily('失敗', fail, '07:00')))
+    asyncio.run(scheduler._run_job(scheduler.add_daily('成功', noop, '07:00')))
+
+    assert state_store.get_last_run('失敗') is None
+    assert state_store.get_last_run('成功') is not None
+
+def test_adaptive_interval_backs_off_to_max_when_idle():
+    interval = AdaptiveInterval(timedelta(minutes=1), timedelta(minutes=10), jitter=0)
+    delays = []
+    for _ in range(6):
+        interval.record(False)
+        delays.append(interval.next_delay())
+    assert delays == [timedelta(minutes=m) for m in (2, 4, 8, 10, 10, 10)]
+
+def test_adaptive_interval_shrinks_after_change():
+    interval = AdaptiveInterval(timedelta(minutes=1), timedelta(minutes=10), jitter=0)
+    for _ in range(5):
+        interval.record(False)
+    interval.record(True)
+    assert interval.next_delay() == timedelta(minutes=1)
+
+@pytest.mark.parametrize('factor', [0.9, 1.1])
+def test_adaptive_interval_jitter_is_clamped_to_bounds(monkeypatch, factor):
+    # 揺らぎの最小・最大の倍率を返す
+    monkeypatch.setattr('scheduler.random.uniform', lambda low, high: factor)
+    interval = AdaptiveInterval(timedelta(minutes=1), timedelta(minutes=10), jitter=0.1)
+    assert interval.next_delay() == timedelta(minutes=1 if factor < 1 else 1.1)
+    for _ in range(5):
+        interval.record(False)
+    assert interval.next_delay() == timedelta(minutes=10 if factor > 1 else 9)
+
+def test_adaptive_interval_rejects_invalid_bounds():
+    with pytest.raises(ValueError):
+        AdaptiveInterval(timedelta(0), timedelta(minutes=10))
+    with pytest.raises(ValueError):
+        AdaptiveInterval(timedelta(minutes=10), timedelta(minutes=1))
@@ -0,0 +1,41 @@
+"""同期状態(カレンダーごとのファイル)の保存のテスト"""
+
+import os
+import state_file
+from sync_state import SyncStateStore
+
+def test_set_writes_only_that_calendar(tmp_path, monkeypatch):
+    store = SyncStateStore(str(tmp_path / 'sync_state'))
+    store.set('a@example.com', {'sync_token': 'a1'})
+    store.set('b@example.com', {'sync_token': 'b1'})
+
+    written = []
+    original = state_file.write_atomic
+    monkeypatch.setattr(state_file, 'write_atomic', lambda path, raw: (written.append(path), original(path, raw)))
+    store.set('a@example.com', {'sync_token': 'a2'})
+
+    assert len(written) == 1
+    assert os.path.basename(written[0]) == 'a%40example.com.json'
+
+def test_state_is_reloaded_from_disk(tmp_path):
+    path = str(tmp_path / 'sync_state')
+    SyncStateStore(path).set('team#holiday@group.v.calendar.google.com', {'sync_token': 't'})
+    assert SyncStateStore(path).get('team#holiday@group.v.calendar.google.com') == {'sync_token': 't'}
+    assert not [name for name in os.listdir(path) if name.endswith('.tmp')]
+
+def test_legacy_json_path_is_used_as_directory(tmp_path):
+    store = SyncStateStore(str(tmp_path / 'sync_state.json'))
+    store.set('a@example.com', {'sync_token': 't'})
+    assert os.path.isdir(tmp_path / 'sync_state')
+
+def test_clear_removes_file(tmp_path):
+    store = SyncStateStore(str(tmp_path))
+    store.set('a@example.com', {'sync_token': 't'})
+    store.clear('a@example.com')
+    assert store.get('a@example.com') == {}
+    assert SyncStateStore(str(tmp_path)).get('a@example.com') == {}
+
+def test_corrupt_file_starts_full_sync(tmp_path, capsys):
+    (tmp_path / 'a%40example.com.json').write_text('{broken', encoding='utf-8')
+    assert SyncStateStore(str(tmp_path)).get('a@example.com') == {}
+    assert 'フル同期' in capsys.readouterr().out